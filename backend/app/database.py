@@ -6,6 +6,9 @@ from app.models.category import Category
 from app.models.nomenclature import NomenclatureMapping
 from app.models.coa import COA
 from app.models.formulation import SavedFormulation
+from app.models.extraction_job import ExtractionJob
+from app.models.extraction_cache import ExtractionCacheEntry
+from app.models.quota_bucket import QuotaBucket
 from config.settings import settings
 
 
@@ -19,7 +22,7 @@ class Database:
         cls.client = AsyncIOMotorClient(settings.MONGODB_URL)
         await init_beanie(
             database=cls.client[settings.DATABASE_NAME],
-            document_models=[User, Product, Category, NomenclatureMapping, COA, SavedFormulation]
+            document_models=[User, Product, Category, NomenclatureMapping, COA, SavedFormulation, ExtractionJob, ExtractionCacheEntry, QuotaBucket]
         )
         
         print(f"[OK] Connected to MongoDB database: {settings.DATABASE_NAME}")
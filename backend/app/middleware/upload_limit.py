@@ -0,0 +1,82 @@
+"""
+Upload Limit - cap multipart request bodies while they are received
+
+Starlette parses and spools a whole multipart body before a route sees its
+UploadFiles, so caps checked in the route only bound what is copied into
+memory afterwards. This middleware enforces the largest per-request cap (extract
+uploads or batch archive, plus multipart framing) on the raw byte stream: a
+declared Content-Length over the cap is refused before the body is read, and a
+body that streams past it is cut off with a 413 as soon as it does.
+"""
+import orjson
+from config.settings import settings
+
+
+# Boundaries, part headers and form fields on top of the file bytes
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+def max_upload_request_bytes() -> int:
+    largest_mb = max(settings.UPLOAD_MAX_REQUEST_MB, settings.BATCH_MAX_ARCHIVE_MB)
+    return largest_mb * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES
+
+
+class UploadLimitMiddleware:
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        declared = headers.get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            return await self.too_large(send)
+
+        received = 0
+        responded = False
+
+        async def limited_receive():
+            nonlocal received, responded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Answer now; the parser then sees a disconnect and stops reading
+                    if not responded:
+                        responded = True
+                        await self.too_large(send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not responded:
+                await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    async def too_large(self, send):
+        body = orjson.dumps({
+            "detail": f"Upload too large. Maximum {self.max_bytes // (1024 * 1024)} MB per request"
+        })
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def configure_upload_limit(app):
+    """Register before CORS so the 413 still carries CORS headers"""
+    max_bytes = max_upload_request_bytes()
+    app.add_middleware(UploadLimitMiddleware, max_bytes=max_bytes)
+    print(f"[OK] Multipart uploads capped at {max_bytes // (1024 * 1024)} MB per request")
@@ -1,7 +1,7 @@
 from typing import Optional
 from datetime import datetime
-from beanie import Document
-from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
 
 
 class Category(Document):
@@ -24,6 +24,8 @@ class Category(Document):
         }
 
 
-
-
-
+class CategoryListItem(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+    name: str
+    description: Optional[str] = None
+    created_at: datetime
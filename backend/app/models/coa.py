@@ -1,7 +1,7 @@
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from beanie import Document
-from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
 
 
 class NutrientData(Dict):
@@ -35,6 +35,8 @@ class COA(Document):
     analysis_method: Optional[str] = None
     additional_notes: List[str] = Field(default_factory=list)
     document_images: List[str] = Field(default_factory=list)
+    image_hashes: List[str] = Field(default_factory=list)  # dHash of each image (image_hash.py)
+    image_hash_bands: List[str] = Field(default_factory=list)
     extraction_date: Optional[str] = None
     extraction_cost: Optional[Dict[str, Any]] = None
     processing_status: str = "extracted"
@@ -46,6 +48,7 @@ class COA(Document):
     
     class Settings:
         name = "coa"
+        indexes = ["image_hash_bands"]
         
     class Config:
         json_schema_extra = {
@@ -67,3 +70,34 @@ class COA(Document):
             }
         }
 
+
+class COAListItem(BaseModel):
+    """Fields shown in the COA list; document images are only counted, on the server"""
+    id: PydanticObjectId = Field(alias="_id")
+    ingredient_name: str
+    supplier_name: Optional[str] = None
+    lot_number: Optional[str] = None
+    product_code: Optional[str] = None
+    manufacturing_date: Optional[str] = None
+    expiry_date: Optional[str] = None
+    storage_condition: Optional[str] = None
+    status: str = "active"
+    nutritional_data: List[Dict[str, Any]] = Field(default_factory=list)
+    documents_count: int = 0
+    created_at: datetime
+
+    class Settings:
+        projection = {
+            "_id": 1,
+            "ingredient_name": 1,
+            "supplier_name": 1,
+            "lot_number": 1,
+            "product_code": 1,
+            "manufacturing_date": 1,
+            "expiry_date": 1,
+            "storage_condition": 1,
+            "status": 1,
+            "nutritional_data": 1,
+            "documents_count": {"$size": {"$ifNull": ["$document_images", []]}},
+            "created_at": 1,
+        }
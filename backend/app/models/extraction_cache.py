@@ -0,0 +1,26 @@
+from typing import Optional, Dict, Any
+from datetime import datetime
+from beanie import Document
+from pydantic import Field
+from pymongo import IndexModel, ASCENDING
+from config.settings import settings
+
+
+class ExtractionCacheEntry(Document):
+    key: str
+    kind: str  # "product" | "coa"
+    model: str
+    data: Dict[str, Any] = Field(default_factory=dict)
+    usage: Dict[str, int] = Field(default_factory=dict)
+    size_bytes: int = 0
+    hits: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_hit_at: Optional[datetime] = None
+    
+    class Settings:
+        name = "extraction_cache"
+        indexes = [
+            IndexModel([("key", ASCENDING)], unique=True),
+            IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.EXTRACTION_CACHE_TTL_SECONDS),
+            "last_hit_at",
+        ]
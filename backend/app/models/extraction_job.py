@@ -0,0 +1,50 @@
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+from beanie import Document
+from pydantic import Field
+from pymongo import IndexModel, ASCENDING
+from config.settings import settings
+
+
+class ExtractionJob(Document):
+    kind: str  # "product" | "coa"
+    status: str = "queued"  # queued | running | succeeded | failed
+    stage: str = "queued"
+    progress: List[Dict[str, Any]] = Field(default_factory=list)
+    files: List[Dict[str, Any]] = Field(default_factory=list)
+    options: Dict[str, Any] = Field(default_factory=dict)  # handler keyword arguments
+    result: Optional[Dict[str, Any]] = None
+    cost: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    quota_waits: int = 0  # requeues after a model quota stall (not counted in attempts)
+    worker_id: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    run_after: Optional[datetime] = None  # not claimed before this (set after a quota stall)
+    created_by: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Settings:
+        name = "extraction_jobs"
+        indexes = [
+            IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+            "created_by",
+            # Finished jobs (result, progress log) expire; queued/running ones have no finished_at
+            IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=settings.EXTRACTION_JOB_TTL_SECONDS),
+        ]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "kind": "product",
+                "status": "running",
+                "stage": "model",
+                "progress": [
+                    {"stage": "queued", "at": "2024-01-01T10:00:00"},
+                    {"stage": "model", "at": "2024-01-01T10:00:02", "images": 3}
+                ]
+            }
+        }
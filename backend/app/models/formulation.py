@@ -1,7 +1,7 @@
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from beanie import Document
-from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
 
 
 class FormulationIngredient(Dict):
@@ -41,3 +41,25 @@ class SavedFormulation(Document):
                 "created_by": "admin"
             }
         }
+
+
+class FormulationListItem(BaseModel):
+    """Saved formulation summary; the ingredient array is counted in Mongo, not loaded"""
+    id: PydanticObjectId = Field(alias="_id")
+    name: str
+    ingredients_count: int = 0
+    serve_size: float = 30.0
+    created_by: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Settings:
+        projection = {
+            "_id": 1,
+            "name": 1,
+            "ingredients_count": {"$size": {"$ifNull": ["$ingredients", []]}},
+            "serve_size": 1,
+            "created_by": 1,
+            "created_at": 1,
+            "updated_at": 1,
+        }
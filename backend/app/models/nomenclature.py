@@ -1,7 +1,7 @@
 from typing import List, Optional
 from datetime import datetime
-from beanie import Document
-from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
 
 
 class NomenclatureMapping(Document):
@@ -23,3 +23,9 @@ class NomenclatureMapping(Document):
             }
         }
 
+
+class NomenclatureListItem(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+    standardized_name: str
+    raw_names: List[str] = Field(default_factory=list)
+    created_at: datetime
@@ -1,7 +1,7 @@
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from beanie import Document
-from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
 
 
 class NutritionEntry(Dict):
@@ -51,6 +51,8 @@ class Product(Document):
     other_important_text: List[str] = Field(default_factory=list)
     tags: List[str] = Field(default_factory=list)
     images: List[str] = Field(default_factory=list)
+    image_hashes: List[str] = Field(default_factory=list)  # dHash of each image (image_hash.py)
+    image_hash_bands: List[str] = Field(default_factory=list)
     created_by: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -59,6 +61,7 @@ class Product(Document):
     
     class Settings:
         name = "products"
+        indexes = ["image_hash_bands"]
         
     class Config:
         json_schema_extra = {
@@ -75,3 +78,18 @@ class Product(Document):
         }
 
 
+class ProductListItem(BaseModel):
+    """Fields shown in the product list; loaded with a projection instead of the full document"""
+    id: PydanticObjectId = Field(alias="_id")
+    product_name: str
+    parent_brand: str
+    variant: Optional[str] = None
+    mrp: Optional[float] = None
+    category: Optional[str] = None
+    status: str = "published"
+    pack_size: Optional[str] = None
+    net_weight: Optional[str] = None
+    created_at: datetime
+    manufacturing_date: Optional[str] = None
+    expiry_date: Optional[str] = None
+    images: List[str] = Field(default_factory=list)
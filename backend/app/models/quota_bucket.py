@@ -0,0 +1,19 @@
+from typing import Optional
+from datetime import datetime
+from beanie import Document
+from pymongo import IndexModel, ASCENDING
+
+
+class QuotaBucket(Document):
+    name: str  # e.g. "gemini"
+    requests: float = 0.0  # request tokens currently available
+    tokens: float = 0.0  # model tokens currently available
+    updated_at: Optional[datetime] = None  # last refill, in server time
+    blocked_until: Optional[datetime] = None  # set after a 429/503 so every worker backs off
+    granted: bool = False  # outcome of the last acquire
+    
+    class Settings:
+        name = "quota_buckets"
+        indexes = [
+            IndexModel([("name", ASCENDING)], unique=True),
+        ]
@@ -15,10 +15,11 @@ from app.utils.azure_auth import AzureADAuth
 from app.utils.email import send_login_otp_email, send_password_reset_email, send_user_approval_email
 from app.dependencies.auth import get_current_user
 from config.settings import settings
+from app.utils.fast_json import ORJSONRoute
 
 azure_auth = AzureADAuth()
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=ORJSONRoute)
 
 
 @router.post("/register", response_model=MessageResponse)
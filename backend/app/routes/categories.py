@@ -5,11 +5,13 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
-from app.models.category import Category
+from app.models.category import Category, CategoryListItem
 from app.models.user import User
 from app.dependencies.auth import get_current_user
+from app.utils.projection import fetch_page
+from app.utils.fast_json import ORJSONRoute
 
-router = APIRouter(prefix="/categories", tags=["Categories"])
+router = APIRouter(prefix="/categories", tags=["Categories"], route_class=ORJSONRoute)
 
 
 # Request Schemas
@@ -77,8 +79,7 @@ async def list_categories(
 ):
     """List all categories"""
     try:
-        categories = await Category.find_all().skip(skip).limit(limit).to_list()
-        total = await Category.find_all().count()
+        categories, total = await fetch_page(Category, {}, CategoryListItem, skip, limit)
         
         return {
             "categories": [
@@ -2,22 +2,41 @@
 COA Routes - Certificate of Analysis Extraction and Management
 """
 import os
-import re
 import json
-import fitz  # PyMuPDF for PDF handling
+import math
+import asyncio
+import hashlib
 from io import BytesIO
-from typing import List, Optional
+from typing import List, NamedTuple, Optional, Tuple
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
 from pydantic import BaseModel
 from PIL import Image
 
 from app.models.user import User
-from app.models.coa import COA
+from app.models.coa import COA, COAListItem
 from app.dependencies.auth import get_current_user
+from app.utils.gemini import gemini_executor, clean_model_json
+from app.utils.hedging import CallReport
+from app.utils.quota import QuotaExhausted
+from app.utils.job_queue import extraction_jobs, register_job_handler, job_links
+from app.utils.extraction_cache import extraction_cache
+from app.utils.uploads import read_uploads, sniff_content_type, COA_TYPES
+from app.utils.image_preprocess import preprocess_images, preprocess_signature
+from app.utils.image_hash import screen_images, dedup_signature, stored_image_hashes, DOCUMENT_HASH_SIZE
+from app.utils.blob_store import blob_store
+from app.utils.image_variants import image_variants, variant_urls
+from app.utils.nomenclature import nomenclature_engine
+from app.utils.json_repair import recover_model_json, response_template, template_sections
+from app.utils.units import unit_converter, target_unit, parse_value, to_optional_float, VALUE_KEYS
+from app.utils.pdf_pages import (
+    analyze_pdfs, render_pdfs, render_hash_images, samples_to_image, format_text_page, text_digest, text_signature
+)
+from app.utils.projection import fetch_page
+from app.utils.fast_json import ORJSONRoute, ORJSONResponse, loads
 from config.settings import settings
 
-router = APIRouter(prefix="/coa", tags=["COA"])
+router = APIRouter(prefix="/coa", tags=["COA"], route_class=ORJSONRoute)
 
 # ============================================================
 # CONFIGURATION
@@ -29,215 +48,6 @@ PRICING = {
     "output": 2.50,
 }
 
-# ============================================================
-# NOMENCLATURE MAPPING (COA specific)
-# ============================================================
-NOMENCLATURE_MAP = {
-    # Proteins
-    "protein": "Protein",
-    "proteins": "Protein",
-    "crude protein": "Protein",
-    "total protein": "Protein",
-    "protein (n x 6.25)": "Protein",
-    "protein (dry basis)": "Protein (Dry Basis)",
-    "protein (wet basis)": "Protein (Wet Basis)",
-    # Fats
-    "fat": "Total Fat",
-    "fats": "Total Fat",
-    "total fat": "Total Fat",
-    "crude fat": "Total Fat",
-    "lipids": "Total Fat",
-    "total lipids": "Total Fat",
-    # Saturated Fat
-    "saturated fat": "Saturated Fat",
-    "saturated fatty acids": "Saturated Fat",
-    "sfa": "Saturated Fat",
-    "saturated fats": "Saturated Fat",
-    # Monounsaturated Fat
-    "monounsaturated fat": "Monounsaturated Fat",
-    "monounsaturated fatty acids": "Monounsaturated Fat",
-    "mufa": "Monounsaturated Fat",
-    # Polyunsaturated Fat
-    "polyunsaturated fat": "Polyunsaturated Fat",
-    "polyunsaturated fatty acids": "Polyunsaturated Fat",
-    "pufa": "Polyunsaturated Fat",
-    # Specific PUFAs
-    "linoleic acid": "Linoleic Acid",
-    "alpha linolenic acid": "Alpha-Linolenic Acid",
-    "alpha-linolenic acid": "Alpha-Linolenic Acid",
-    "ala": "Alpha-Linolenic Acid",
-    "dha": "DHA",
-    "docosahexaenoic acid": "DHA",
-    "epa": "EPA",
-    "eicosapentaenoic acid": "EPA",
-    # Trans Fat
-    "trans fat": "Trans Fat",
-    "trans fatty acids": "Trans Fat",
-    "trans fats": "Trans Fat",
-    # Carbohydrates
-    "carbohydrate": "Total Carbohydrates",
-    "carbohydrates": "Total Carbohydrates",
-    "total carbohydrate": "Total Carbohydrates",
-    "total carbohydrates": "Total Carbohydrates",
-    "carbs": "Total Carbohydrates",
-    # Sugars
-    "sugar": "Total Sugars",
-    "sugars": "Total Sugars",
-    "total sugar": "Total Sugars",
-    "total sugars": "Total Sugars",
-    "added sugar": "Added Sugars",
-    "added sugars": "Added Sugars",
-    "sucrose": "Sucrose",
-    "added sucrose": "Added Sucrose",
-    # Fiber
-    "dietary fiber": "Dietary Fiber",
-    "dietary fibre": "Dietary Fiber",
-    "total dietary fiber": "Dietary Fiber",
-    "fiber": "Dietary Fiber",
-    "fibre": "Dietary Fiber",
-    "soluble fiber": "Soluble Fiber",
-    "soluble fibre": "Soluble Fiber",
-    "insoluble fiber": "Insoluble Fiber",
-    "insoluble fibre": "Insoluble Fiber",
-    "fos": "FOS (Fructooligosaccharides)",
-    "fructooligosaccharides": "FOS (Fructooligosaccharides)",
-    # Moisture/Ash
-    "moisture": "Moisture",
-    "moisture content": "Moisture",
-    "ash": "Ash",
-    "total ash": "Ash",
-    # Cholesterol
-    "cholesterol": "Cholesterol",
-    # Energy
-    "energy": "Energy",
-    "calories": "Energy",
-    "calorific value": "Energy",
-    "energy value": "Energy",
-    # Minerals
-    "sodium": "Sodium",
-    "na": "Sodium",
-    "potassium": "Potassium",
-    "k": "Potassium",
-    "calcium": "Calcium",
-    "ca": "Calcium",
-    "iron": "Iron",
-    "fe": "Iron",
-    "zinc": "Zinc",
-    "zn": "Zinc",
-    "magnesium": "Magnesium",
-    "phosphorus": "Phosphorus",
-    "p": "Phosphorus",
-    "chloride": "Chloride",
-    "cl": "Chloride",
-    # Vitamins
-    "vitamin a": "Vitamin A",
-    "vit a": "Vitamin A",
-    "retinol": "Vitamin A",
-    "vitamin d": "Vitamin D",
-    "vit d": "Vitamin D",
-    "vitamin d3": "Vitamin D3",
-    "cholecalciferol": "Vitamin D3",
-    "vitamin e": "Vitamin E",
-    "vit e": "Vitamin E",
-    "tocopherol": "Vitamin E",
-    "alpha tocopherol": "Vitamin E",
-    "vitamin c": "Vitamin C",
-    "vit c": "Vitamin C",
-    "ascorbic acid": "Vitamin C",
-    "vitamin b1": "Vitamin B1",
-    "thiamine": "Vitamin B1",
-    "thiamin": "Vitamin B1",
-    "vitamin b2": "Vitamin B2",
-    "riboflavin": "Vitamin B2",
-    "vitamin b3": "Vitamin B3",
-    "niacin": "Vitamin B3",
-    "nicotinic acid": "Vitamin B3",
-    "vitamin b6": "Vitamin B6",
-    "pyridoxine": "Vitamin B6",
-    "vitamin b12": "Vitamin B12",
-    "cobalamin": "Vitamin B12",
-    "cyanocobalamin": "Vitamin B12",
-    "folic acid": "Folic Acid",
-    "folate": "Folic Acid",
-    "vitamin b9": "Folic Acid",
-    "biotin": "Biotin",
-    "vitamin b7": "Biotin",
-    "pantothenic acid": "Pantothenic Acid",
-    "vitamin b5": "Pantothenic Acid",
-    "vitamin d2": "Vitamin D2",
-    "ergocalciferol": "Vitamin D2",
-    "vitamin k": "Vitamin K",
-    "phylloquinone": "Vitamin K",
-    # Omega Fatty Acids
-    "omega 3": "Omega 3 Fatty Acid",
-    "omega-3": "Omega 3 Fatty Acid",
-    "omega 3 fatty acid": "Omega 3 Fatty Acid",
-    "omega 3 fatty acids": "Omega 3 Fatty Acid",
-    "n-3 fatty acids": "Omega 3 Fatty Acid",
-    "omega 6": "Omega 6 Fatty Acid",
-    "omega-6": "Omega 6 Fatty Acid",
-    "omega 6 fatty acid": "Omega 6 Fatty Acid",
-    "omega 6 fatty acids": "Omega 6 Fatty Acid",
-    "n-6 fatty acids": "Omega 6 Fatty Acid",
-    # Trace Minerals
-    "iodine": "Iodine",
-    "i": "Iodine",
-    "copper": "Copper",
-    "cu": "Copper",
-    "chromium": "Chromium",
-    "cr": "Chromium",
-    "manganese": "Manganese",
-    "mn": "Manganese",
-    "molybdenum": "Molybdenum",
-    "mo": "Molybdenum",
-    "selenium": "Selenium",
-    "se": "Selenium",
-    # Other Nutrients
-    "carnitine": "Carnitine",
-    "l-carnitine": "Carnitine",
-    "choline": "Choline",
-    "inositol": "Inositol",
-    "myo-inositol": "Inositol",
-    "nucleotides": "Nucleotides",
-    "total nucleotides": "Nucleotides",
-    "taurine": "Taurine",
-}
-
-# Target units for normalization
-TARGET_UNITS = {
-    "Protein": "g", "Protein (Dry Basis)": "g", "Protein (Wet Basis)": "g",
-    "Total Fat": "g", "Saturated Fat": "g", "Monounsaturated Fat": "g",
-    "Polyunsaturated Fat": "g", "Linoleic Acid": "g", "Alpha-Linolenic Acid": "g",
-    "DHA": "mg", "EPA": "mg", "Trans Fat": "g",
-    "Total Carbohydrates": "g", "Total Sugars": "g", "Added Sugars": "g",
-    "Sucrose": "g", "Added Sucrose": "g",
-    "Dietary Fiber": "g", "Soluble Fiber": "g", "Insoluble Fiber": "g",
-    "FOS (Fructooligosaccharides)": "g", "Moisture": "g", "Ash": "g",
-    "Cholesterol": "mg", "Energy": "kcal",
-    "Sodium": "mg", "Potassium": "mg", "Calcium": "mg", "Iron": "mg",
-    "Zinc": "mg", "Magnesium": "mg", "Phosphorus": "mg", "Chloride": "mg",
-    "Vitamin A": "mcg", "Vitamin D": "mcg", "Vitamin D2": "mcg", "Vitamin D3": "mcg", 
-    "Vitamin E": "mg", "Vitamin K": "mcg",
-    "Vitamin C": "mg", "Vitamin B1": "mg", "Vitamin B2": "mg", "Vitamin B3": "mg",
-    "Vitamin B6": "mg", "Vitamin B12": "mcg", "Folic Acid": "mcg",
-    "Biotin": "mcg", "Pantothenic Acid": "mg",
-    "Omega 3 Fatty Acid": "g", "Omega 6 Fatty Acid": "g",
-    "Iodine": "mcg", "Copper": "mcg", "Chromium": "mcg", "Manganese": "mg",
-    "Molybdenum": "mcg", "Selenium": "mcg",
-    "Carnitine": "mg", "Choline": "mg", "Inositol": "mg", "Nucleotides": "mg", "Taurine": "mg",
-}
-
-UNIT_CONVERSIONS = {
-    "kg": 1000, "g": 1, "gm": 1, "gram": 1, "grams": 1,
-    "mg": 0.001, "milligram": 0.001, "milligrams": 0.001,
-    "mcg": 0.000001, "μg": 0.000001, "µg": 0.000001, "ug": 0.000001,
-    "microgram": 0.000001, "micrograms": 0.000001,
-    "kcal": 1, "cal": 0.001, "kj": 0.239006,
-    "kilojoule": 0.239006, "kilojoules": 0.239006,
-    "iu": 0.3,  # For Vitamin A: 1 IU = 0.3 mcg retinol
-}
-
-
 # ============================================================
 # HELPER FUNCTIONS
 # ============================================================
@@ -254,33 +64,6 @@ def calculate_cost(input_tokens: int, output_tokens: int) -> dict:
     }
 
 
-def standardize_nutrient_name(raw_name: str) -> str:
-    """Map raw nutrient name to standardized name"""
-    cleaned = raw_name.lower().strip()
-    cleaned = re.sub(r"\s*\(.*?\)\s*", " ", cleaned)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
-    return NOMENCLATURE_MAP.get(cleaned, raw_name.title())
-
-
-def normalize_unit(value: float, from_unit: str, nutrient_name: str) -> tuple:
-    """Convert value from source unit to target unit"""
-    from_unit_lower = from_unit.lower().strip()
-    target_unit = TARGET_UNITS.get(nutrient_name, "g")
-    
-    if from_unit_lower == target_unit.lower():
-        return value, target_unit
-    
-    from_factor = UNIT_CONVERSIONS.get(from_unit_lower, 1)
-    to_factor = UNIT_CONVERSIONS.get(target_unit.lower(), 1)
-    
-    if to_factor != 0:
-        normalized_value = (value * from_factor) / to_factor
-    else:
-        normalized_value = value
-    
-    return round(normalized_value, 6), target_unit
-
-
 def get_nutrient_category(nutrient_name: str) -> str:
     """Categorize nutrient for organization"""
     categories = {
@@ -313,33 +96,46 @@ def process_extracted_coa(raw_data: dict) -> dict:
     if "nutritional_data" not in processed:
         return processed
     
-    normalized_nutrients = []
-    
+    rows = []
     for nutrient in processed["nutritional_data"]:
         raw_name = nutrient.get("nutrient_name_raw", nutrient.get("nutrient_name", ""))
-        std_name = standardize_nutrient_name(raw_name)
+        std_name, confidence, method = nomenclature_engine.resolve(raw_name, "coa")
         raw_unit = nutrient.get("unit", nutrient.get("unit_raw", "g"))
-        
+        rows.append((nutrient, raw_name, std_name, confidence, method, raw_unit))
+    
+    # Convert every value of the COA in one pass
+    raw_values = [[parse_value(row[0].get(key)) for key in VALUE_KEYS] for row in rows]
+    converted, convertible = unit_converter.convert_rows(
+        [row[2] for row in rows], [row[5] for row in rows], raw_values
+    )
+    
+    normalized_nutrients = []
+    unconvertible = []
+    
+    for idx, (nutrient, raw_name, std_name, confidence, method, raw_unit) in enumerate(rows):
         normalized_nutrient = {
             "nutrient_name": std_name,
             "nutrient_name_raw": raw_name,
             "category": get_nutrient_category(std_name),
         }
+        if method == "fuzzy":
+            normalized_nutrient["match_confidence"] = confidence
+        elif method == "review":
+            normalized_nutrient["needs_review"] = True
         
-        # Normalize values
-        for value_key in ["min_value", "max_value", "actual_value"]:
-            if nutrient.get(value_key) is not None:
-                try:
-                    val = float(nutrient[value_key])
-                    norm_val, norm_unit = normalize_unit(val, raw_unit, std_name)
-                    normalized_nutrient[value_key] = norm_val
-                except (ValueError, TypeError):
-                    normalized_nutrient[value_key] = None
-            else:
-                normalized_nutrient[value_key] = None
+        for col, value_key in enumerate(VALUE_KEYS):
+            normalized_nutrient[value_key] = to_optional_float(converted[idx][col])
+        
+        # Keep the values as printed so units can be re-normalized later without re-extracting
+        normalized_nutrient["raw_values"] = dict(zip(VALUE_KEYS, raw_values[idx]))
         
-        # Set target unit
-        normalized_nutrient["unit"] = TARGET_UNITS.get(std_name, "g")
+        if convertible[idx]:
+            normalized_nutrient["unit"] = target_unit(std_name)
+        else:
+            # Leave values in the printed unit rather than mislabel them
+            normalized_nutrient["unit"] = raw_unit
+            normalized_nutrient["unit_error"] = f"Cannot convert '{raw_unit}' for {std_name}"
+            unconvertible.append({"nutrient_name": std_name, "unit": raw_unit})
         normalized_nutrient["unit_raw"] = raw_unit
         normalized_nutrient["basis"] = "per 100g"
         
@@ -358,12 +154,41 @@ def process_extracted_coa(raw_data: dict) -> dict:
         
         normalized_nutrients.append(normalized_nutrient)
     
+    if unconvertible:
+        safe_print(f"[COA EXTRACTION] {len(unconvertible)} nutrients have units that could not be converted")
+    
     processed["nutritional_data"] = normalized_nutrients
+    processed["unconvertible_units"] = unconvertible
     processed["processing_status"] = "normalized"
     
     return processed
 
 
+def build_master_entry(coa_fields, nutritional_data: List[dict]) -> dict:
+    """Per-nutrient lookup used by formulation calculations"""
+    master_entry = {
+        "ingredient_name": coa_fields.ingredient_name,
+        "product_code": coa_fields.product_code,
+        "lot_number": coa_fields.lot_number,
+        "supplier": coa_fields.supplier_name,
+        "nutrients": {}
+    }
+    
+    for nutrient in nutritional_data:
+        name = nutrient.get("nutrient_name", "")
+        if name:
+            master_entry["nutrients"][name] = {
+                "min": nutrient.get("min_value"),
+                "max": nutrient.get("max_value"),
+                "actual": nutrient.get("actual_value"),
+                "average": nutrient.get("average_value"),
+                "unit": nutrient.get("unit"),
+                "category": nutrient.get("category"),
+            }
+    
+    return master_entry
+
+
 # ============================================================
 # COA EXTRACTION PROMPT
 # ============================================================
@@ -479,6 +304,14 @@ RULES:
 Return ONLY the JSON structure above."""
 
 
+# Parts of the JSON STRUCTURE that can be re-asked on their own after a cut-off response
+COA_SECTIONS = template_sections(response_template(COA_EXTRACTION_PROMPT))
+COA_CONTINUE_KEYS = {
+    ("nutritional_data",): "nutrient_name_raw",
+    ("other_parameters",): "parameter_name",
+}
+
+
 # ============================================================
 # SCHEMAS
 # ============================================================
@@ -506,6 +339,7 @@ class COACreate(BaseModel):
     analysis_method: Optional[str] = None
     additional_notes: List[str] = []
     document_images: List[str] = []
+    extraction_cost: Optional[dict] = None
     status: str = "active"
 
 
@@ -519,6 +353,285 @@ class COAResponse(BaseModel):
     created_at: datetime
 
 
+# ============================================================
+# EXTRACTION PIPELINE
+# ============================================================
+def safe_print(msg):
+    """Print that survives Unicode encoding errors on Windows consoles"""
+    try:
+        print(msg)
+    except UnicodeEncodeError:
+        try:
+            print(msg.encode('ascii', 'replace').decode('ascii'))
+        except:
+            print("[LOG] (message contains special characters)")
+
+
+async def _no_progress(stage: str, detail: Optional[dict] = None):
+    return None
+
+
+def check_coa_extraction_request(images: list, max_files: int = 15):
+    """Validate API key and upload count before any work is done"""
+    if not settings.GEMINI_API_KEY:
+        safe_print("[ERROR] Gemini API key not configured")
+        raise HTTPException(
+            status_code=500, 
+            detail="Gemini API key not configured. Please set GEMINI_API_KEY in environment."
+        )
+    if len(images) == 0:
+        raise HTTPException(status_code=400, detail="At least one file is required")
+    if len(images) > max_files:
+        raise HTTPException(status_code=400, detail=f"Maximum {max_files} files allowed")
+
+
+class COAPages(NamedTuple):
+    images: List[Image.Image]  # scanned PDF pages and image files, sent as images
+    image_labels: List[str]
+    image_digests: List[str]  # sha256 of the file / rendered pixels: only exact copies are dropped
+    text_pages: List[str]  # PDF pages with a text layer, sent as text
+    text_images: List[Image.Image]  # small renders of the text pages, for the saved-COA lookup only
+    text_labels: List[str]
+    text_digests: List[str]  # sha256 of the normalized page text
+
+
+async def load_coa_files(files: List[Tuple[str, bytes]]) -> COAPages:
+    """
+    Decode uploaded (filename, bytes) pairs into model inputs
+    
+    PDF pages with a usable text layer are sent as text; only scanned pages and
+    image files are rasterized. Every page gets a content digest for in-request
+    duplicates, and text pages a small render so they can be matched against
+    saved COAs. PDF work runs in the render process pool.
+    """
+    pdf_indexes = [
+        idx for idx, (_, content) in enumerate(files)
+        if sniff_content_type(content[:16]) == "application/pdf"
+    ]
+    
+    analyses = await analyze_pdfs([files[idx][1] for idx in pdf_indexes])
+    for idx, analysis in zip(pdf_indexes, analyses):
+        if isinstance(analysis, Exception):
+            filename = files[idx][0]
+            safe_print(f"[ERROR] Failed to load file {filename}: {str(analysis)}")
+            raise ValueError(f"Invalid file: {filename}. Error: {str(analysis)}")
+    
+    render_jobs = [(files[idx][1], raster_pages) for idx, (_, _, raster_pages) in zip(pdf_indexes, analyses)]
+    hash_jobs = [(files[idx][1], [page for page, _ in text]) for idx, (_, text, _) in zip(pdf_indexes, analyses)]
+    rendered, hash_renders = await asyncio.gather(render_pdfs(render_jobs), render_hash_images(hash_jobs))
+    pdf_results = {
+        idx: (analysis, pages, thumbnails)
+        for idx, analysis, pages, thumbnails in zip(pdf_indexes, analyses, rendered, hash_renders)
+    }
+    
+    pages = COAPages([], [], [], [], [], [], [])
+    for idx, (filename, content) in enumerate(files):
+        try:
+            safe_print(f"[COA EXTRACTION] Loading file {idx + 1}/{len(files)}: {filename}")
+            
+            if idx in pdf_results:
+                (total_pages, pdf_text_pages, raster_pages), rendered_pages, thumbnails = pdf_results[idx]
+                for (page_num, text), thumbnail in zip(pdf_text_pages, thumbnails):
+                    pages.text_pages.append(format_text_page(filename, page_num, total_pages, text))
+                    pages.text_images.append(thumbnail)
+                    pages.text_labels.append(f"{filename} page {page_num + 1}")
+                    pages.text_digests.append(f"text:{text_digest(text)}")
+                safe_print(
+                    f"[COA EXTRACTION] PDF has {total_pages} pages: "
+                    f"{len(pdf_text_pages)} with text layer, {len(raster_pages)} rasterized"
+                )
+                for page in rendered_pages:
+                    pil_img = samples_to_image(page)
+                    pages.images.append(pil_img)
+                    pages.image_labels.append(f"{filename} page {page['page'] + 1}")
+                    pages.image_digests.append(f"pixels:{hashlib.sha256(page['samples']).hexdigest()}")
+                    safe_print(f"[COA EXTRACTION] PDF page {page['page'] + 1}/{total_pages} rendered at {page['dpi']} DPI: {pil_img.size} pixels")
+            else:
+                # Regular image file
+                pil_img = Image.open(BytesIO(content))
+                pages.images.append(pil_img)
+                pages.image_labels.append(filename)
+                pages.image_digests.append(f"file:{file_digest(content)}")
+                safe_print(f"[COA EXTRACTION] Image {idx + 1} loaded: {pil_img.size} pixels")
+                
+        except Exception as e:
+            safe_print(f"[ERROR] Failed to load file {filename}: {str(e)}")
+            raise ValueError(f"Invalid file: {filename}. Error: {str(e)}")
+    return pages
+
+
+def transform_coa_data(coa_data: dict) -> dict:
+    """Post-process parsed model output and reshape it for the frontend"""
+    processed_data = process_extracted_coa(coa_data)
+    ingredient_info = processed_data.get("ingredient_info", {})
+    
+    return {
+        "ingredient_info": {
+            "ingredient_name": ingredient_info.get("ingredient_name", ""),
+            "product_code": ingredient_info.get("product_code"),
+            "lot_number": ingredient_info.get("lot_number"),
+            "manufacturing_date": ingredient_info.get("manufacturing_date"),
+            "expiry_date": ingredient_info.get("expiry_date"),
+            "shelf_life": ingredient_info.get("shelf_life"),
+            "supplier_name": ingredient_info.get("supplier_name"),
+            "supplier_address": ingredient_info.get("supplier_address"),
+            "storage_condition": ingredient_info.get("storage_condition", ""),
+        },
+        "nutritional_data": processed_data.get("nutritional_data", []),
+        "other_parameters": processed_data.get("other_parameters", []),
+        "certifications": processed_data.get("certifications", []),
+        "analysis_method": processed_data.get("analysis_method"),
+        "additional_notes": processed_data.get("additional_notes", []),
+        "raw": coa_data,  # Keep raw data for reference
+    }
+
+
+def file_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+async def run_coa_extraction(
+    pages: COAPages,
+    file_digests: Optional[List[str]] = None,
+    progress=_no_progress
+) -> Tuple[dict, dict]:
+    """
+    Run the prompt -> parse -> post-process pipeline on loaded COA pages
+    
+    Returns (transformed_data, cost_info). Exact duplicate pages (same file,
+    same rendered pixels or same text) are dropped first and listed under
+    transformed_data["dropped_images"]; look-alike pages are all kept, since one
+    supplier template only differs in lot numbers and values. Saved COAs showing
+    near-identical pages are listed under transformed_data["duplicates"]. When `file_digests` are given the parsed
+    model output is served from / stored in the extraction cache. Output that
+    does not parse is salvaged and its missing sections re-asked; raises
+    json.JSONDecodeError only when nothing can be recovered.
+    """
+    # Text pages are looked up through their renders and dropped from the text input
+    image_count = len(pages.images)
+    _, dedup = await screen_images(
+        pages.images + pages.text_images, COA, "ingredient_name", DOCUMENT_HASH_SIZE,
+        pages.image_labels + pages.text_labels, pages.image_digests + pages.text_digests
+    )
+    pil_images = [pages.images[i] for i in dedup["kept"] if i < image_count]
+    text_pages = [pages.text_pages[i - image_count] for i in dedup["kept"] if i >= image_count]
+    if dedup["dropped"]:
+        safe_print(f"[COA EXTRACTION] Dropped {len(dedup['dropped'])} duplicate page(s): {dedup['dropped']}")
+    if dedup["matches"]:
+        safe_print(f"[COA EXTRACTION] Pages match {len(dedup['matches'])} saved COA image(s)")
+    
+    cache_key = None
+    cached = None
+    if file_digests:
+        cache_key = extraction_cache.make_key(
+            "coa", GEMINI_MODEL, COA_EXTRACTION_PROMPT, file_digests,
+            f"{preprocess_signature()}-{text_signature()}{dedup_signature(exact=True)}"
+        )
+        cached = await extraction_cache.get(cache_key)
+    
+    if cached:
+        safe_print(f"[COA EXTRACTION] Cache hit {cache_key[:12]} - skipping Gemini call")
+        await progress("cache_hit")
+        coa_data = cached.data
+        cost_info = calculate_cost(0, 0)
+        cost_info["cached"] = True
+        cost_info["saved_cost"] = calculate_cost(
+            cached.usage.get("prompt_token_count", 0),
+            cached.usage.get("candidates_token_count", 0)
+        )["total_cost"]
+    else:
+        await progress("preprocessing", {"images": len(pil_images)})
+        model_inputs, preprocessing = await asyncio.to_thread(preprocess_images, pil_images)
+        safe_print(
+            f"[COA EXTRACTION] Preprocessed images: ~{preprocessing['estimated_tokens_before']} -> "
+            f"~{preprocessing['estimated_tokens_after']} image tokens"
+        )
+        content = [COA_EXTRACTION_PROMPT] + text_pages + model_inputs
+        
+        safe_print(f"[COA EXTRACTION] Calling Gemini API with model: {GEMINI_MODEL}")
+        safe_print(f"[COA EXTRACTION] Inputs: {len(text_pages)} text pages, {len(pil_images)} images")
+        safe_print(f"[COA EXTRACTION] Extraction queue: {gemini_executor.stats()}")
+        await progress("model", {"images": len(pil_images), "text_pages": len(text_pages)})
+        
+        call_report = CallReport()
+        response = await gemini_executor.generate_content(
+            GEMINI_MODEL, content, image_tokens=preprocessing["estimated_tokens_after"], report=call_report
+        )
+        
+        safe_print("[COA EXTRACTION] Response received from Gemini API")
+        
+        # Calculate cost
+        usage = response.usage_metadata
+        cost_info = calculate_cost(usage.prompt_token_count, usage.candidates_token_count)
+        safe_print(f"[COA EXTRACTION] Estimated cost: ${cost_info['total_cost']:.4f}")
+        cost_info["preprocessing"] = preprocessing
+        cost_info["text_pages"] = len(text_pages)
+        
+        # Parse response
+        await progress("parsing", {"output_tokens": usage.candidates_token_count})
+        raw_json = clean_model_json(response.text)
+        prompt_tokens = usage.prompt_token_count
+        output_tokens = usage.candidates_token_count
+        complete = True
+        try:
+            coa_data = loads(raw_json)
+            safe_print("[COA EXTRACTION] JSON parsed successfully")
+        except json.JSONDecodeError as e:
+            safe_print(f"[ERROR] JSON parsing failed: {str(e)}")
+            await progress("repairing")
+            recovered = await recover_model_json(
+                response.text, COA_EXTRACTION_PROMPT, content[1:], GEMINI_MODEL,
+                COA_SECTIONS, COA_CONTINUE_KEYS, settings.EXTRACTION_REASK_ENABLED, call_report
+            )
+            if recovered is None:
+                raise
+            coa_data = recovered.data
+            complete = not recovered.unresolved
+            
+            # Follow-up tokens are billed on top of the truncated call
+            followup_cost = calculate_cost(recovered.prompt_tokens, recovered.output_tokens)
+            for key in ("input_tokens", "output_tokens", "input_cost", "output_cost", "total_cost"):
+                cost_info[key] += followup_cost[key]
+            cost_info["repair"] = recovered.summary(followup_cost["total_cost"])
+            prompt_tokens += recovered.prompt_tokens
+            output_tokens += recovered.output_tokens
+            safe_print(f"[COA EXTRACTION] Recovered response, follow-up cost: ${followup_cost['total_cost']:.4f}")
+        
+        # Retries and hedges; abandoned duplicates may still be billed for their prompt
+        cost_info["calls"] = call_report.summary(cost_info["input_cost"])
+        if call_report.hedges or call_report.retries:
+            safe_print(f"[COA EXTRACTION] Model calls: {cost_info['calls']}")
+        
+        if cache_key and complete:
+            await extraction_cache.put(cache_key, "coa", GEMINI_MODEL, coa_data, {
+                "prompt_token_count": prompt_tokens,
+                "candidates_token_count": output_tokens,
+            })
+    
+    # Post-process the data
+    await progress("post_processing")
+    await nomenclature_engine.refresh()
+    transformed_data = transform_coa_data(coa_data)
+    transformed_data["duplicates"] = dedup["matches"]
+    transformed_data["dropped_images"] = dedup["dropped"]
+    cost_info["dedup"] = {
+        "dropped": dedup["dropped"],
+        "images_sent": len(pil_images),
+        "text_pages_sent": len(text_pages),
+    }
+    
+    return transformed_data, cost_info
+
+
+async def _run_coa_job(files: List[Tuple[str, bytes]], progress) -> Tuple[dict, dict]:
+    pages = await load_coa_files(files)
+    digests = [file_digest(content) for _, content in files]
+    return await run_coa_extraction(pages, digests, progress)
+
+
+register_job_handler("coa", _run_coa_job)
+
+
 # ============================================================
 # ROUTES
 # ============================================================
@@ -535,15 +648,6 @@ async def extract_coa_from_images(
     - Returns structured nutritional data
     - User can review and edit before saving
     """
-    def safe_print(msg):
-        try:
-            print(msg)
-        except UnicodeEncodeError:
-            try:
-                print(msg.encode('ascii', 'replace').decode('ascii'))
-            except:
-                print("[LOG] (message contains special characters)")
-    
     safe_print("\n" + "="*60)
     safe_print("[COA EXTRACTION] ===== NEW COA EXTRACTION REQUEST =====")
     safe_print("="*60)
@@ -552,139 +656,18 @@ async def extract_coa_from_images(
         safe_print(f"[COA EXTRACTION] User: {current_user.email}")
         safe_print(f"[COA EXTRACTION] Number of images received: {len(images)}")
         
-        # Check API key
-        api_key = settings.GEMINI_API_KEY
-        if not api_key:
-            safe_print("[ERROR] Gemini API key not configured")
-            raise HTTPException(
-                status_code=500, 
-                detail="Gemini API key not configured. Please set GEMINI_API_KEY in environment."
-            )
-        
-        # Validate file count
-        if len(images) == 0:
-            raise HTTPException(status_code=400, detail="At least one file is required")
-        if len(images) > 15:
-            raise HTTPException(status_code=400, detail="Maximum 15 files allowed")
+        check_coa_extraction_request(images)
         
         # Load and validate images (including PDF conversion)
-        pil_images = []
-        for idx, img in enumerate(images):
-            try:
-                safe_print(f"[COA EXTRACTION] Loading file {idx + 1}/{len(images)}: {img.filename}")
-                content = await img.read()
-                
-                # Check if it's a PDF
-                if img.filename.lower().endswith('.pdf'):
-                    safe_print(f"[COA EXTRACTION] Converting PDF to images...")
-                    # Use PyMuPDF to convert PDF pages to images
-                    pdf_document = fitz.open(stream=content, filetype="pdf")
-                    total_pages = len(pdf_document)
-                    
-                    for page_num in range(total_pages):
-                        page = pdf_document[page_num]
-                        # Render page to image at 300 DPI for good quality
-                        mat = fitz.Matrix(300 / 72, 300 / 72)  # 300 DPI
-                        pix = page.get_pixmap(matrix=mat)
-                        
-                        # Convert to PIL Image
-                        img_data = pix.tobytes("png")
-                        pil_img = Image.open(BytesIO(img_data))
-                        pil_images.append(pil_img)
-                        safe_print(f"[COA EXTRACTION] PDF page {page_num + 1}/{total_pages} converted: {pil_img.size} pixels")
-                    
-                    pdf_document.close()
-                    safe_print(f"[COA EXTRACTION] PDF converted successfully: {total_pages} pages")
-                else:
-                    # Regular image file
-                    pil_img = Image.open(BytesIO(content))
-                    pil_images.append(pil_img)
-                    safe_print(f"[COA EXTRACTION] Image {idx + 1} loaded: {pil_img.size} pixels")
-                    
-            except Exception as e:
-                safe_print(f"[ERROR] Failed to load file {img.filename}: {str(e)}")
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Invalid file: {img.filename}. Error: {str(e)}"
-                )
-        
-        # Call Gemini API
-        safe_print("[COA EXTRACTION] Initializing Gemini client...")
-        from google import genai
-        
-        client = genai.Client(api_key=api_key)
-        content = [COA_EXTRACTION_PROMPT] + pil_images
-        
-        safe_print(f"[COA EXTRACTION] Calling Gemini API with model: {GEMINI_MODEL}")
-        
-        response = client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=content,
-            config={
-                "temperature": 0,
-                "top_p": 0.95,
-                "top_k": 40,
-                "response_mime_type": "application/json",
-            },
-        )
-        
-        safe_print("[COA EXTRACTION] Response received from Gemini API")
+        uploads = await read_uploads(images, COA_TYPES)
+        files = [(upload.filename, upload.data) for upload in uploads]
+        try:
+            pages = await load_coa_files(files)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Calculate cost
-        usage = response.usage_metadata
-        cost_info = calculate_cost(usage.prompt_token_count, usage.candidates_token_count)
-        safe_print(f"[COA EXTRACTION] Estimated cost: ${cost_info['total_cost']:.4f}")
-        
-        # Parse response
-        raw_json = response.text.strip()
-        
-        # Clean markdown if present
-        if raw_json.startswith("```"):
-            first_newline = raw_json.find("\n")
-            if first_newline != -1:
-                raw_json = raw_json[first_newline + 1:]
-            if "```" in raw_json:
-                last_fence = raw_json.rfind("```")
-                raw_json = raw_json[:last_fence].rstrip()
-        
-        if not raw_json.startswith("{"):
-            first_brace = raw_json.find("{")
-            if first_brace != -1:
-                raw_json = raw_json[first_brace:]
-        
-        if not raw_json.endswith("}"):
-            last_brace = raw_json.rfind("}")
-            if last_brace != -1:
-                raw_json = raw_json[:last_brace + 1]
-        
-        coa_data = json.loads(raw_json)
-        safe_print("[COA EXTRACTION] JSON parsed successfully")
-        
-        # Post-process the data
-        processed_data = process_extracted_coa(coa_data)
-        
-        # Transform to frontend-friendly format
-        ingredient_info = processed_data.get("ingredient_info", {})
-        
-        transformed_data = {
-            "ingredient_info": {
-                "ingredient_name": ingredient_info.get("ingredient_name", ""),
-                "product_code": ingredient_info.get("product_code"),
-                "lot_number": ingredient_info.get("lot_number"),
-                "manufacturing_date": ingredient_info.get("manufacturing_date"),
-                "expiry_date": ingredient_info.get("expiry_date"),
-                "shelf_life": ingredient_info.get("shelf_life"),
-                "supplier_name": ingredient_info.get("supplier_name"),
-                "supplier_address": ingredient_info.get("supplier_address"),
-                "storage_condition": ingredient_info.get("storage_condition", ""),
-            },
-            "nutritional_data": processed_data.get("nutritional_data", []),
-            "other_parameters": processed_data.get("other_parameters", []),
-            "certifications": processed_data.get("certifications", []),
-            "analysis_method": processed_data.get("analysis_method"),
-            "additional_notes": processed_data.get("additional_notes", []),
-            "raw": coa_data,  # Keep raw data for reference
-        }
+        digests = [upload.sha256 for upload in uploads]
+        transformed_data, cost_info = await run_coa_extraction(pages, digests)
         
         safe_print("[COA EXTRACTION] SUCCESS - Extraction completed!")
         return ExtractedCOAData(
@@ -694,11 +677,17 @@ async def extract_coa_from_images(
         )
         
     except json.JSONDecodeError as e:
-        safe_print(f"[ERROR] JSON parsing failed: {str(e)}")
         return ExtractedCOAData(
             success=False,
             error=f"Failed to parse AI response: {str(e)}"
         )
+    except QuotaExhausted as e:
+        safe_print(f"[ERROR] {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -710,6 +699,27 @@ async def extract_coa_from_images(
         )
 
 
+@router.post("/extract/jobs", response_model=dict, status_code=202)
+async def submit_coa_extraction_job(
+    images: List[UploadFile] = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Queue a COA extraction and return immediately with a job id
+    
+    - Poll GET /api/jobs/{job_id} or stream GET /api/jobs/{job_id}/events
+    - Survives dropped connections and server restarts
+    """
+    check_coa_extraction_request(images)
+    
+    uploads = await read_uploads(images, COA_TYPES)
+    files = [(upload.filename, upload.content_type, upload.data) for upload in uploads]
+    job = await extraction_jobs.submit("coa", files, current_user)
+    safe_print(f"[COA EXTRACTION] Queued job {job.id} for {current_user.email} ({len(files)} files)")
+    
+    return job_links(job)
+
+
 @router.post("", response_model=dict)
 async def create_coa(
     coa: COACreate,
@@ -718,25 +728,10 @@ async def create_coa(
     """Create a new COA entry"""
     try:
         # Build master entry for formulation calculations
-        master_entry = {
-            "ingredient_name": coa.ingredient_name,
-            "product_code": coa.product_code,
-            "lot_number": coa.lot_number,
-            "supplier": coa.supplier_name,
-            "nutrients": {}
-        }
-        
-        for nutrient in coa.nutritional_data:
-            name = nutrient.get("nutrient_name", "")
-            if name:
-                master_entry["nutrients"][name] = {
-                    "min": nutrient.get("min_value"),
-                    "max": nutrient.get("max_value"),
-                    "actual": nutrient.get("actual_value"),
-                    "average": nutrient.get("average_value"),
-                    "unit": nutrient.get("unit"),
-                    "category": nutrient.get("category"),
-                }
+        master_entry = build_master_entry(coa, coa.nutritional_data)
+        # Documents go to the blob store; the entry keeps only references
+        document_images = await asyncio.to_thread(blob_store.externalize, coa.document_images)
+        hashes = await asyncio.to_thread(stored_image_hashes, document_images, DOCUMENT_HASH_SIZE)
         
         new_coa = COA(
             ingredient_name=coa.ingredient_name,
@@ -752,9 +747,12 @@ async def create_coa(
             certifications=coa.certifications,
             analysis_method=coa.analysis_method,
             additional_notes=coa.additional_notes,
-            document_images=coa.document_images,
+            document_images=document_images,
+            image_hashes=hashes["image_hashes"],
+            image_hash_bands=hashes["image_hash_bands"],
             extraction_date=datetime.utcnow().strftime("%Y-%m-%d"),
             master_entry=master_entry,
+            extraction_cost=coa.extraction_cost,
             status=coa.status,
             created_by=str(current_user.id),
             created_at=datetime.utcnow(),
@@ -762,6 +760,7 @@ async def create_coa(
         )
         
         await new_coa.insert()
+        image_variants.schedule(document_images)
         
         return {
             "success": True,
@@ -793,10 +792,9 @@ async def list_coas(
                 {"lot_number": {"$regex": search, "$options": "i"}}
             ]
         
-        coas = await COA.find(query).skip(skip).limit(limit).to_list()
-        total = await COA.find(query).count()
+        coas, total = await fetch_page(COA, query, COAListItem, skip, limit)
         
-        return {
+        return ORJSONResponse({
             "coas": [
                 {
                     "id": str(c.id),
@@ -809,8 +807,8 @@ async def list_coas(
                     "storage_condition": c.storage_condition,
                     "status": c.status,
                     "nutrients_count": len(c.nutritional_data) if c.nutritional_data else 0,
-                    "has_documents": bool(c.document_images and len(c.document_images) > 0),
-                    "documents_count": len(c.document_images) if c.document_images else 0,
+                    "has_documents": c.documents_count > 0,
+                    "documents_count": c.documents_count,
                     "created_at": c.created_at.isoformat(),
                     "nutritional_data": c.nutritional_data,
                 }
@@ -819,7 +817,7 @@ async def list_coas(
             "total": total,
             "skip": skip,
             "limit": limit
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch COAs: {str(e)}")
@@ -838,7 +836,7 @@ async def get_coa(
         if not coa:
             raise HTTPException(status_code=404, detail="COA not found")
         
-        return {
+        return ORJSONResponse({
             "id": str(coa.id),
             "ingredient_name": coa.ingredient_name,
             "product_code": coa.product_code,
@@ -854,11 +852,12 @@ async def get_coa(
             "analysis_method": coa.analysis_method,
             "additional_notes": coa.additional_notes,
             "document_images": coa.document_images,
+            "image_variants": variant_urls(coa.document_images),
             "master_entry": coa.master_entry,
             "status": coa.status,
             "created_at": coa.created_at.isoformat(),
             "updated_at": coa.updated_at.isoformat()
-        }
+        })
         
     except HTTPException:
         raise
@@ -884,27 +883,19 @@ async def update_coa(
         update_data["updated_at"] = datetime.utcnow()
         
         # Rebuild master entry
-        master_entry = {
-            "ingredient_name": coa_update.ingredient_name,
-            "product_code": coa_update.product_code,
-            "lot_number": coa_update.lot_number,
-            "supplier": coa_update.supplier_name,
-            "nutrients": {}
-        }
-        
-        for nutrient in coa_update.nutritional_data:
-            name = nutrient.get("nutrient_name", "")
-            if name:
-                master_entry["nutrients"][name] = {
-                    "min": nutrient.get("min_value"),
-                    "max": nutrient.get("max_value"),
-                    "actual": nutrient.get("actual_value"),
-                    "average": nutrient.get("average_value"),
-                    "unit": nutrient.get("unit"),
-                }
+        master_entry = build_master_entry(coa_update, coa_update.nutritional_data)
         
         update_data["master_entry"] = master_entry
         
+        if "document_images" in update_data:
+            update_data["document_images"] = await asyncio.to_thread(
+                blob_store.externalize, update_data["document_images"]
+            )
+            update_data.update(await asyncio.to_thread(
+                stored_image_hashes, update_data["document_images"], DOCUMENT_HASH_SIZE
+            ))
+            image_variants.schedule(update_data["document_images"])
+        
         for field, value in update_data.items():
             setattr(coa, field, value)
         
@@ -5,9 +5,11 @@ CRUD operations for saved formulation configurations
 from fastapi import APIRouter, HTTPException, status
 from typing import Optional
 from datetime import datetime
-from app.models.formulation import SavedFormulation
+from app.models.formulation import SavedFormulation, FormulationListItem
+from app.utils.projection import fetch_page
+from app.utils.fast_json import ORJSONRoute, ORJSONResponse
 
-router = APIRouter(prefix="/formulations", tags=["Formulations"])
+router = APIRouter(prefix="/formulations", tags=["Formulations"], route_class=ORJSONRoute)
 
 
 @router.post("/save")
@@ -57,30 +59,27 @@ async def save_formulation(data: dict):
 async def list_formulations(skip: int = 0, limit: int = 100):
     """List all saved formulations"""
     try:
-        formulations = await SavedFormulation.find(
-            SavedFormulation.status == "active"
-        ).sort("-created_at").skip(skip).limit(limit).to_list()
-        
-        total = await SavedFormulation.find(
-            SavedFormulation.status == "active"
-        ).count()
+        formulations, total = await fetch_page(
+            SavedFormulation, SavedFormulation.status == "active", FormulationListItem,
+            skip, limit, sort="-created_at"
+        )
         
         result = []
         for f in formulations:
             result.append({
                 "id": str(f.id),
                 "name": f.name,
-                "ingredients_count": len(f.ingredients),
+                "ingredients_count": f.ingredients_count,
                 "serve_size": f.serve_size,
                 "created_by": f.created_by or "admin",
                 "created_at": f.created_at.isoformat() if f.created_at else None,
                 "updated_at": f.updated_at.isoformat() if f.updated_at else None,
             })
         
-        return {
+        return ORJSONResponse({
             "formulations": result,
             "total": total
-        }
+        })
     except Exception as e:
         print(f"[ERROR] List formulations failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -96,7 +95,7 @@ async def get_formulation(formulation_id: str):
         if not formulation:
             raise HTTPException(status_code=404, detail="Formulation not found")
         
-        return {
+        return ORJSONResponse({
             "id": str(formulation.id),
             "name": formulation.name,
             "ingredients": formulation.ingredients,
@@ -106,7 +105,7 @@ async def get_formulation(formulation_id: str):
             "created_by": formulation.created_by or "admin",
             "created_at": formulation.created_at.isoformat() if formulation.created_at else None,
             "updated_at": formulation.updated_at.isoformat() if formulation.updated_at else None,
-        }
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,152 @@
+"""
+Image Routes - serve product and COA images from the blob store
+
+Blob URLs are content-addressed, so a URL's bytes never change. Responses carry
+a strong ETag derived from the hash and `Cache-Control: immutable`, and a
+conditional request is answered with 304 before any file is touched. Byte ranges
+are honoured. Behind nginx (IMAGE_ACCEL_REDIRECT_PREFIX set) the backend only
+checks the request and hands the file to nginx with X-Accel-Redirect; nginx
+then sends it with sendfile and handles the ranges.
+"""
+import asyncio
+import os
+import re
+from typing import Optional, Tuple
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.utils.blob_store import blob_store
+from app.utils.image_variants import image_variants, VARIANTS
+from app.utils.fast_json import ORJSONRoute
+from config.settings import settings
+
+router = APIRouter(prefix="/images", tags=["Images"], route_class=ORJSONRoute)
+
+BLOB_NAME = re.compile(r"^([0-9a-f]{64})(?:\.[a-z0-9]+)?$")
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def blob_sha256(name: str) -> str:
+    match = BLOB_NAME.match(name)
+    if not match:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return match.group(1)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check; weak comparison as RFC 9110 requires for GET"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single "bytes=" range, None to send the whole file
+
+    Raises 416 for a range outside the file. Multi-range requests are answered
+    with the whole file, which RFC 9110 allows.
+    """
+    match = BYTE_RANGE.match(header.strip()) if header else None
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(match.group(2)))
+        end = size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+async def read_range(path: str, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def send_blob(request: Request, path: str, content_type: str, etag: str) -> Response:
+    """Full, partial or X-Accel-Redirect response for a blob file"""
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE, "Accept-Ranges": "bytes"}
+
+    if settings.IMAGE_ACCEL_REDIRECT_PREFIX:
+        relative = os.path.relpath(path, settings.UPLOAD_DIR).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = settings.IMAGE_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + relative
+        return Response(media_type=content_type, headers=headers)
+
+    try:
+        size = (await asyncio.to_thread(os.stat, path)).st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # If-Range: only serve part of the file if the client's copy is this version
+    if_range = request.headers.get("if-range")
+    byte_range = parse_range(request.headers.get("range"), size) if not if_range or if_range == etag else None
+    if byte_range is None:
+        return FileResponse(path, media_type=content_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(read_range(path, start, end), status_code=206, media_type=content_type, headers=headers)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": IMMUTABLE})
+
+
+@router.get("/{name}")
+async def get_image(name: str, request: Request):
+    """
+    Stream a stored image by its content hash
+
+    References are unguessable SHA-256 names handed out with the records, so
+    they can be used directly as <img src> without an Authorization header.
+    """
+    sha256 = blob_sha256(name)
+    etag = f'"{sha256}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    try:
+        content_type = await asyncio.to_thread(blob_store.content_type, sha256)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return await send_blob(request, blob_store.path(sha256), content_type, etag)
+
+
+@router.get("/{variant}/{name}")
+async def get_image_variant(variant: str, name: str, request: Request):
+    """Stream the thumb / medium JPEG of a stored image, rendering it on first use"""
+    if variant not in VARIANTS:
+        raise HTTPException(status_code=404, detail="Image not found")
+    sha256 = blob_sha256(name)
+    etag = f'"{sha256}-{variant}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    if not await asyncio.to_thread(blob_store.exists, sha256):
+        raise HTTPException(status_code=404, detail="Image not found")
+    path = await image_variants.path(sha256, variant)
+    if path is None:
+        # Not an image the renderer can read (e.g. a PDF): fall back to the original
+        content_type = await asyncio.to_thread(blob_store.content_type, sha256)
+        return await send_blob(request, blob_store.path(sha256), content_type, f'"{sha256}"')
+    return await send_blob(request, path, "image/jpeg", etag)
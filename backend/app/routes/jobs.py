@@ -0,0 +1,135 @@
+"""
+Extraction Job Routes - status, results and server-sent progress for queued extractions
+"""
+import asyncio
+import time
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.models.user import User, UserRole
+from app.models.extraction_job import ExtractionJob
+from app.dependencies.auth import get_current_user
+from app.utils.job_queue import FINISHED_STATUSES, job_status
+from app.utils.fast_json import ORJSONRoute, dumps_str
+
+router = APIRouter(prefix="/jobs", tags=["Extraction Jobs"], route_class=ORJSONRoute)
+
+SSE_POLL_SECONDS = 0.5
+SSE_KEEPALIVE_SECONDS = 15
+
+
+async def get_job_for_user(job_id: str, user: User) -> ExtractionJob:
+    """Load a job, hiding other users' jobs from researchers"""
+    try:
+        from bson import ObjectId
+        job = await ExtractionJob.get(ObjectId(job_id))
+    except Exception:
+        job = None
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.created_by != str(user.id) and user.role == UserRole.RESEARCHER:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+def job_result(job: ExtractionJob) -> dict:
+    """Same shape as the synchronous /extract responses"""
+    return {
+        "success": job.status == "succeeded",
+        "data": job.result,
+        "error": job.error,
+        "cost": job.cost,
+    }
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps_str(data)}\n\n"
+
+
+@router.get("", response_model=dict)
+async def list_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """List the current user's most recent extraction jobs"""
+    jobs = await ExtractionJob.find(
+        ExtractionJob.created_by == str(current_user.id)
+    ).sort("-created_at").limit(limit).to_list()
+
+    return {"jobs": [job_status(job) for job in jobs]}
+
+
+@router.get("/{job_id}", response_model=dict)
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get job status and stage progress"""
+    job = await get_job_for_user(job_id, current_user)
+    return job_status(job)
+
+
+@router.get("/{job_id}/result", response_model=dict)
+async def get_job_result(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the extraction result of a finished job"""
+    job = await get_job_for_user(job_id, current_user)
+
+    if job.status not in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}")
+
+    return job_result(job)
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Stream job progress as server-sent events
+
+    - "progress" events replay every stage, including ones before connecting
+    - "partial" events carry fields available before the extraction finishes
+    - A final "done" event carries the status and result
+    """
+    job = await get_job_for_user(job_id, current_user)
+
+    async def event_stream():
+        sent = 0
+        last_write = time.monotonic()
+
+        while True:
+            if await request.is_disconnected():
+                break
+
+            current = await ExtractionJob.get(job.id)
+            if current is None:
+                yield sse_event("done", {"status": "failed", "error": "Job no longer exists"})
+                break
+
+            for entry in current.progress[sent:]:
+                yield sse_event("partial" if entry.get("stage") == "partial" else "progress", entry)
+                last_write = time.monotonic()
+            sent = len(current.progress)
+
+            if current.status in FINISHED_STATUSES:
+                yield sse_event("done", {**job_status(current), **job_result(current)})
+                break
+
+            if time.monotonic() - last_write > SSE_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_write = time.monotonic()
+
+            await asyncio.sleep(SSE_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
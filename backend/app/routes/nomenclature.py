@@ -5,11 +5,14 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
-from app.models.nomenclature import NomenclatureMapping
+from app.models.nomenclature import NomenclatureMapping, NomenclatureListItem
 from app.models.user import User
 from app.dependencies.auth import get_current_user
+from app.utils.nomenclature import nomenclature_engine
+from app.utils.projection import fetch_page, fetch_all
+from app.utils.fast_json import ORJSONRoute
 
-router = APIRouter(prefix="/nomenclature", tags=["Nomenclature"])
+router = APIRouter(prefix="/nomenclature", tags=["Nomenclature"], route_class=ORJSONRoute)
 
 
 # Request Schemas
@@ -57,6 +60,7 @@ async def create_nomenclature(
             created_by=current_user.email
         )
         await mapping.insert()
+        nomenclature_engine.invalidate()
         
         return {
             "id": str(mapping.id),
@@ -84,8 +88,7 @@ async def list_nomenclature(
 ):
     """List all nomenclature mappings"""
     try:
-        mappings = await NomenclatureMapping.find_all().skip(skip).limit(limit).to_list()
-        total = await NomenclatureMapping.find_all().count()
+        mappings, total = await fetch_page(NomenclatureMapping, {}, NomenclatureListItem, skip, limit)
         
         return {
             "mappings": [
@@ -112,7 +115,7 @@ async def list_nomenclature(
 async def get_nomenclature_map():
     """Get all mappings as a dictionary for quick lookup"""
     try:
-        mappings = await NomenclatureMapping.find_all().to_list()
+        mappings = await fetch_all(NomenclatureMapping, NomenclatureListItem)
         
         # Build reverse map: raw_name -> standardized_name
         nomenclature_map = {}
@@ -133,6 +136,35 @@ async def get_nomenclature_map():
         )
 
 
+@router.get("/suggest", response_model=dict)
+async def suggest_nomenclature(name: str, profile: str = "coa", limit: int = 5):
+    """Resolve a raw nutrient name and list the closest standardized names"""
+    if profile not in ("coa", "product"):
+        raise HTTPException(status_code=400, detail="profile must be 'coa' or 'product'")
+    
+    await nomenclature_engine.refresh()
+    standardized_name, confidence, method = nomenclature_engine.resolve(name, profile)
+    return {
+        "raw_name": name,
+        "standardized_name": standardized_name,
+        "confidence": confidence,
+        "method": method,
+        "suggestions": nomenclature_engine.suggest(name, profile, limit)
+    }
+
+
+@router.get("/review", response_model=dict)
+async def list_pending_review():
+    """
+    Names this worker left unmapped because their closest match was not safe
+
+    Each entry carries the closest standard name; /suggest lists alternatives.
+    Adding a mapping for a name resolves it on the next reload.
+    """
+    pending = nomenclature_engine.pending_review()
+    return {"pending": pending, "total": len(pending)}
+
+
 @router.get("/{mapping_id}", response_model=dict)
 async def get_nomenclature(mapping_id: str):
     """Get a specific nomenclature mapping"""
@@ -196,6 +228,7 @@ async def update_nomenclature(
         
         mapping.updated_at = datetime.utcnow()
         await mapping.save()
+        nomenclature_engine.invalidate()
         
         return {
             "id": str(mapping.id),
@@ -238,6 +271,7 @@ async def add_synonym(
         mapping.raw_names.append(synonym_data.raw_name)
         mapping.updated_at = datetime.utcnow()
         await mapping.save()
+        nomenclature_engine.invalidate()
         
         return {
             "id": str(mapping.id),
@@ -280,6 +314,7 @@ async def remove_synonym(
         mapping.raw_names.remove(raw_name)
         mapping.updated_at = datetime.utcnow()
         await mapping.save()
+        nomenclature_engine.invalidate()
         
         return {
             "id": str(mapping.id),
@@ -314,6 +349,7 @@ async def delete_nomenclature(
             raise HTTPException(status_code=404, detail="Nomenclature mapping not found")
         
         await mapping.delete()
+        nomenclature_engine.invalidate()
         
         return {
             "message": f"Nomenclature mapping for '{mapping.standardized_name}' deleted successfully"
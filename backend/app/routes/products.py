@@ -3,20 +3,43 @@ Product Routes - Including AI-Powered Image Extraction
 """
 import os
 import re
+import math
 import json
+import asyncio
 import base64
+import hashlib
+import time
+import zipfile
 from io import BytesIO
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from PIL import Image
 
 from app.models.user import User
-from app.models.product import Product
+from app.models.product import Product, ProductListItem
 from app.dependencies.auth import get_current_user
+from app.utils.gemini import gemini_executor, clean_model_json
+from app.utils.hedging import CallReport
+from app.utils.quota import QuotaExhausted
+from app.utils.job_queue import extraction_jobs, register_job_handler, job_links
+from app.utils.extraction_cache import extraction_cache
+from app.utils.uploads import read_upload, read_uploads, sniff_content_type, IMAGE_TYPES, ARCHIVE_TYPES
+from app.utils.image_preprocess import preprocess_images, preprocess_signature, CROP_MODES
+from app.utils.image_hash import screen_images, dedup_signature, stored_image_hashes
+from app.utils.blob_store import blob_store
+from app.utils.image_variants import image_variants, variant_urls
+from app.utils.json_stream import IncrementalJSONParser
+from app.utils.json_repair import recover_model_json, response_template, template_sections
+from app.utils.nomenclature import nomenclature_engine
+from app.utils.text_scan import scan_label_text
+from app.utils.projection import fetch_page
+from app.utils.fast_json import ORJSONRoute, ORJSONResponse, dumps_str, loads
+from app.routes.jobs import sse_event, SSE_KEEPALIVE_SECONDS
 
-router = APIRouter(prefix="/products", tags=["Products"])
+router = APIRouter(prefix="/products", tags=["Products"], route_class=ORJSONRoute)
 
 # Import settings
 from config.settings import settings
@@ -32,94 +55,11 @@ PRICING = {
     "output": 2.50,
 }
 
-# ============================================================
-# NUTRITION NOMENCLATURE MAP
-# ============================================================
-NOMENCLATURE_MAP = {
-    "protein": "Protein",
-    "proteins": "Protein",
-    "crude protein": "Protein",
-    "total protein": "Protein",
-    "protein (n x 6.25)": "Protein",
-    "protein content": "Protein",
-    "protein (g)": "Protein",
-    "fat": "Total Fat",
-    "total fat": "Total Fat",
-    "crude fat": "Total Fat",
-    "lipids": "Total Fat",
-    "total fat (g)": "Total Fat",
-    "saturated fat": "Saturated Fat",
-    "saturated fatty acids": "Saturated Fat",
-    "sfa": "Saturated Fat",
-    "monounsaturated fat": "Monounsaturated Fat",
-    "mufa": "Monounsaturated Fat",
-    "polyunsaturated fat": "Polyunsaturated Fat",
-    "pufa": "Polyunsaturated Fat",
-    "trans fat": "Trans Fat",
-    "carbohydrate": "Total Carbohydrates",
-    "total carbohydrate": "Total Carbohydrates",
-    "carbs": "Total Carbohydrates",
-    "carbohydrate (g)": "Total Carbohydrates",
-    "available carbohydrates": "Available Carbohydrates",
-    "sugar": "Total Sugars",
-    "total sugar": "Total Sugars",
-    "total sugars": "Total Sugars",
-    "total sugars (g)": "Total Sugars",
-    "added sugar": "Added Sugars",
-    "added sugars": "Added Sugars",
-    "added sugars (g)": "Added Sugars",
-    "sucrose": "Sucrose",
-    "dietary fiber": "Dietary Fiber",
-    "fiber": "Dietary Fiber",
-    "soluble fiber": "Soluble Fiber",
-    "insoluble fiber": "Insoluble Fiber",
-    "fos": "FOS",
-    "moisture": "Moisture",
-    "moisture content": "Moisture",
-    "ash": "Ash",
-    "total ash": "Ash",
-    "cholesterol": "Cholesterol",
-    "cholesterol (mg)": "Cholesterol",
-    "energy (kcal)": "Energy (kcal)",
-    "energy (kj)": "Energy (kJ)",
-    "energy": "Energy (kcal)",
-    "calories": "Energy (kcal)",
-    "sodium": "Sodium (Na)",
-    "sodium (mg)": "Sodium (Na)",
-    "potassium": "Potassium (K)",
-    "calcium": "Calcium (Ca)",
-    "iron": "Iron (Fe)",
-    "zinc": "Zinc (Zn)",
-    "magnesium": "Magnesium (Mg)",
-    "phosphorus": "Phosphorus (P)",
-    "chloride": "Chloride (Cl)",
-    "vitamin a": "Vitamin A",
-    "vitamin a (mcg)": "Vitamin A",
-    "vitamin d": "Vitamin D",
-    "vitamin d₂": "Vitamin D2",
-    "vitamin d2": "Vitamin D2",
-    "vitamin d₂ (mcg)": "Vitamin D2",
-    "vitamin d3": "Vitamin D3",
-    "vitamin e": "Vitamin E",
-    "vitamin e (mg)": "Vitamin E",
-    "vitamin c": "Vitamin C",
-    "vitamin b1": "Vitamin B1",
-    "vitamin b2": "Vitamin B2",
-    "vitamin b3": "Vitamin B3",
-    "vitamin b5": "Vitamin B5",
-    "vitamin b6": "Vitamin B6",
-    "vitamin b7": "Vitamin B7",
-    "vitamin b9": "Vitamin B9",
-    "vitamin b12": "Vitamin B12",
-    "vitamin k": "Vitamin K",
-}
-
-
 # ============================================================
 # HELPER FUNCTIONS
 # ============================================================
 def standardize_nutrition_table(nutrition_table):
-    """Standardize nutrient names using NOMENCLATURE_MAP"""
+    """Standardize nutrient names through the shared nomenclature engine"""
     if not nutrition_table:
         return []
 
@@ -134,17 +74,22 @@ def standardize_nutrition_table(nutrition_table):
         if not original_name:
             continue
             
-        standardized_name = NOMENCLATURE_MAP.get(original_name, original_name_raw)
+        standardized_name, confidence, method = nomenclature_engine.resolve(original_name_raw, "product")
         
         values = nutrient.get("values", {})
         if not values or not any(values.values()):
             continue
             
-        standardized.append({
+        entry = {
             "nutrient_name": standardized_name,
             "values": values,
             "original_name": original_name_raw,
-        })
+        }
+        if method == "fuzzy":
+            entry["match_confidence"] = confidence
+        elif method == "review":
+            entry["needs_review"] = True
+        standardized.append(entry)
 
     return standardized
 
@@ -170,57 +115,6 @@ def extract_numeric_mrp(mrp_value):
     return None
 
 
-def detect_packing_format(text):
-    """Detect packing format from text"""
-    if not isinstance(text, str):
-        text = str(text) if text else ""
-    text_lower = text.lower()
-    formats = {
-        "sachet": ["sachet", "sachets"],
-        "bottle": ["bottle", "bottles"],
-        "pouch": ["pouch", "pouches"],
-        "jar": ["jar", "jars"],
-        "can": ["can", "cans", "tin"],
-        "tetra pack": ["tetra pack", "tetra pak"],
-        "carton": ["carton", "cartons"],
-        "box": ["box", "boxes"],
-        "pack": ["pack", "packet"],
-        "tub": ["tub", "tubs", "container"],
-    }
-    for format_name, keywords in formats.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                return format_name
-    return "not specified"
-
-
-def validate_dates(text):
-    """Extract and validate dates from text"""
-    if not isinstance(text, str):
-        text = str(text) if text else ""
-    date_strings = re.findall(r"\b\d{2}/\d{2}/\d{2,4}\b", text)
-    valid_dates = []
-    for ds in date_strings:
-        try:
-            if len(ds.split("/")[-1]) == 4:
-                dt = datetime.strptime(ds, "%d/%m/%Y")
-            else:
-                dt = datetime.strptime(ds, "%d/%m/%y")
-            valid_dates.append(dt)
-        except ValueError:
-            continue
-    mfg_date = valid_dates[0].strftime("%d/%m/%Y") if valid_dates else None
-    exp_date = valid_dates[-1].strftime("%d/%m/%Y") if len(valid_dates) > 1 else None
-    return mfg_date, exp_date
-
-
-def validate_fssai(text):
-    """Extract FSSAI license numbers"""
-    if not isinstance(text, str):
-        text = str(text) if text else ""
-    return list(set(re.findall(r"\b\d{14}\b", text)))
-
-
 def calculate_cost(input_tokens, output_tokens):
     """Calculate API cost"""
     input_cost = (input_tokens / 1_000_000) * PRICING["input"]
@@ -345,6 +239,14 @@ JSON STRUCTURE:
 Return ONLY the JSON."""
 
 
+# Parts of the JSON STRUCTURE that can be re-asked on their own after a cut-off response
+PRODUCT_SECTIONS = template_sections(response_template(EXTRACTION_PROMPT), split=("parent_product",))
+PRODUCT_CONTINUE_KEYS = {
+    ("parent_product", "nutrition_table"): "nutrient_name",
+    ("child_variants",): "product_name",
+}
+
+
 # ============================================================
 # SCHEMAS
 # ============================================================
@@ -386,6 +288,7 @@ class ProductCreate(BaseModel):
     customer_care: dict = {}
     tags: List[str] = []
     images: List[str] = []
+    extraction_cost: Optional[dict] = None
     status: str = "draft"
 
 
@@ -401,6 +304,398 @@ class ProductResponse(BaseModel):
     created_at: datetime
 
 
+# ============================================================
+# EXTRACTION PIPELINE
+# ============================================================
+def safe_print(msg):
+    """Print that survives Unicode encoding errors on Windows consoles"""
+    try:
+        print(msg)
+    except UnicodeEncodeError:
+        try:
+            print(msg.encode('ascii', 'replace').decode('ascii'))
+        except:
+            print("[LOG] (message contains special characters)")
+
+
+async def _no_progress(stage: str, detail: Optional[dict] = None):
+    return None
+
+
+def check_extraction_request(images: list, max_files: int = 10):
+    """Validate API key and upload count before any work is done"""
+    if not settings.GEMINI_API_KEY:
+        safe_print("[ERROR] Gemini API key not configured")
+        raise HTTPException(
+            status_code=500, 
+            detail="Gemini API key not configured. Please set GEMINI_API_KEY in environment."
+        )
+    if len(images) == 0:
+        raise HTTPException(status_code=400, detail="At least one image is required")
+    if len(images) > max_files:
+        raise HTTPException(status_code=400, detail=f"Maximum {max_files} images allowed")
+
+
+def resolve_crop_mode(crop_mode: Optional[str]) -> str:
+    """Per-request crop mode, falling back to IMAGE_CROP_MODE"""
+    mode = (crop_mode or settings.IMAGE_CROP_MODE).strip().lower()
+    if mode not in CROP_MODES:
+        raise HTTPException(status_code=400, detail=f"crop_mode must be one of: {', '.join(CROP_MODES)}")
+    return mode
+
+
+def load_product_images(files: List[Tuple[str, bytes]]) -> List[Image.Image]:
+    """Decode uploaded (filename, bytes) pairs into PIL images"""
+    pil_images = []
+    for idx, (filename, content) in enumerate(files):
+        try:
+            safe_print(f"[EXTRACTION] Loading image {idx + 1}/{len(files)}: {filename}")
+            pil_img = Image.open(BytesIO(content))
+            safe_print(f"[EXTRACTION] Image {idx + 1} loaded: {pil_img.size} pixels")
+            pil_images.append(pil_img)
+        except Exception as e:
+            safe_print(f"[ERROR] Failed to load image {filename}: {str(e)}")
+            raise ValueError(f"Invalid image file: {filename}. Error: {str(e)}")
+    return pil_images
+
+
+def postprocess_product_data(product_data: dict, raw_json: str) -> dict:
+    """Standardize and validate parsed model output, then reshape it for the frontend"""
+    parent = product_data.get("parent_product", {})
+    
+    # Standardize nutrition
+    if "nutrition_table" in parent:
+        safe_print("[EXTRACTION] Standardizing nutrition table...")
+        parent["nutrition_table"] = standardize_nutrition_table(parent["nutrition_table"])
+    
+    # Extract numeric MRP
+    if "pricing" in parent:
+        mrp_value = parent["pricing"].get("mrp")
+        numeric_mrp = extract_numeric_mrp(mrp_value)
+        if numeric_mrp is not None:
+            parent["pricing"]["mrp"] = numeric_mrp
+    
+    # One scan of the response for packing keywords, dates and FSSAI numbers
+    scan = scan_label_text(raw_json, detect_packing=parent.get("packing_format") == "not specified")
+    
+    # Detect packing format
+    if parent.get("packing_format") == "not specified":
+        parent["packing_format"] = scan.packing_format
+    
+    # Validate dates
+    mfg_date, exp_date = scan.manufacturing_date, scan.expiry_date
+    if "dates" in parent:
+        if mfg_date:
+            parent["dates"]["manufacturing_date"] = mfg_date
+        if exp_date:
+            parent["dates"]["expiry_date"] = exp_date
+    
+    # Get shelf life from extraction or calculate if not provided
+    shelf_life = parent.get("dates", {}).get("shelf_life", "") or parent.get("shelf_life", "")
+    if not shelf_life or shelf_life == "not specified":
+        if mfg_date and exp_date:
+            try:
+                # Try different date formats
+                for date_format in ["%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d"]:
+                    try:
+                        mfg = datetime.strptime(mfg_date, date_format)
+                        exp = datetime.strptime(exp_date, date_format)
+                        days_diff = (exp - mfg).days
+                        months = days_diff // 30
+                        if months > 0:
+                            shelf_life = f"{months} months"
+                        else:
+                            shelf_life = f"{days_diff} days"
+                        break
+                    except ValueError:
+                        continue
+            except:
+                pass
+    
+    # Store shelf_life in both locations for compatibility
+    if shelf_life:
+        parent["shelf_life"] = shelf_life
+        if "dates" in parent:
+            parent["dates"]["shelf_life"] = shelf_life
+    
+    # Extract FSSAI
+    fssai_licenses = list(scan.fssai_numbers)
+    if fssai_licenses and "manufacturer_details" in parent:
+        for manufacturer in parent["manufacturer_details"]:
+            if manufacturer.get("fssai") == "not specified" and fssai_licenses:
+                manufacturer["fssai"] = fssai_licenses.pop(0)
+    
+    # Transform to frontend-friendly format
+    return {
+        "basic": {
+            "productName": parent.get("product_name", ""),
+            "brand": parent.get("brand", {}).get("parent_brand", ""),
+            "subBrand": parent.get("brand", {}).get("sub_brand", ""),
+            "variant": parent.get("variant", ""),
+            "packSize": parent.get("weight_and_size", {}).get("net_weight", ""),
+            "serveSize": parent.get("weight_and_size", {}).get("serving_size", ""),
+            "mrp": parent.get("pricing", {}).get("mrp", ""),
+            "packingFormat": parent.get("packing_format", ""),
+            "manufactured": parent.get("dates", {}).get("manufacturing_date", ""),
+            "expiry": parent.get("dates", {}).get("expiry_date", ""),
+            "shelfLife": parent.get("shelf_life", ""),
+            "vegNonVeg": parent.get("symbols", {}).get("veg_nonveg", ""),
+        },
+        "nutrition": parent.get("nutrition_table", []),
+        "composition": {
+            "ingredients": parent.get("ingredients", ""),
+            "allergenInfo": parent.get("allergen_info", ""),
+            "claims": parent.get("claims", []),
+            "storageInstructions": parent.get("storage_instructions", ""),
+            "instructionsToUse": parent.get("instructions_to_use", ""),
+            "shelfLife": parent.get("shelf_life", ""),
+        },
+        "company": {
+            "manufacturerDetails": parent.get("manufacturer_details", []),
+            "barcode": parent.get("barcode", ""),
+            "certifications": parent.get("certifications", []),
+            "customerCare": parent.get("customer_care", {}),
+        },
+        "dates": parent.get("dates", {}),
+        "other": parent.get("other_important_text", []),
+        "raw": product_data,  # Keep raw data for reference
+    }
+
+
+def file_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+# Model output paths that are shown in the form's basic section, and their frontend names
+STREAMED_BASIC_FIELDS = {
+    ("parent_product", "product_name"): "productName",
+    ("parent_product", "brand", "parent_brand"): "brand",
+    ("parent_product", "brand", "sub_brand"): "subBrand",
+    ("parent_product", "variant"): "variant",
+    ("parent_product", "weight_and_size", "net_weight"): "packSize",
+    ("parent_product", "weight_and_size", "serving_size"): "serveSize",
+    ("parent_product", "pricing", "mrp"): "mrp",
+    ("parent_product", "packing_format"): "packingFormat",
+}
+
+
+async def stream_product_response(content: list, progress=_no_progress, image_tokens: Optional[int] = None,
+                                  report: Optional[CallReport] = None) -> Tuple[str, object, dict]:
+    """
+    Stream the model response, reporting basic fields as soon as each one is complete
+    
+    Returns (response_text, usage_metadata, streaming_stats). Partial fields are sent
+    through `progress` as ("partial", {"basic": {...}}); they are raw model values,
+    the final post-processed data replaces them when extraction finishes.
+    """
+    parser = IncrementalJSONParser()
+    text_parts = []
+    usage = None
+    partial_fields = 0
+    first_chunk_ms = None
+    started = time.perf_counter()
+    
+    async for chunk in gemini_executor.generate_content_stream(
+        GEMINI_MODEL, content, image_tokens=image_tokens, report=report
+    ):
+        if first_chunk_ms is None:
+            first_chunk_ms = round((time.perf_counter() - started) * 1000)
+        if chunk.usage_metadata:
+            usage = chunk.usage_metadata
+        text = chunk.text or ""
+        if not text:
+            continue
+        text_parts.append(text)
+        
+        fields = {}
+        for path, value in parser.feed(text):
+            name = STREAMED_BASIC_FIELDS.get(path)
+            if name is None:
+                continue
+            if name == "mrp":
+                numeric_mrp = extract_numeric_mrp(value)
+                value = numeric_mrp if numeric_mrp is not None else value
+            fields[name] = value
+        if fields:
+            partial_fields += len(fields)
+            await progress("partial", {"basic": fields})
+    
+    return "".join(text_parts), usage, {
+        "first_chunk_ms": first_chunk_ms,
+        "total_ms": round((time.perf_counter() - started) * 1000),
+        "partial_fields": partial_fields,
+    }
+
+
+async def run_product_extraction(
+    pil_images: List[Image.Image],
+    file_digests: Optional[List[str]] = None,
+    progress=_no_progress,
+    crop_mode: str = "full",
+    filenames: Optional[List[str]] = None
+) -> Tuple[dict, dict]:
+    """
+    Run the prompt -> parse -> post-process pipeline on loaded images
+    
+    Returns (transformed_data, cost_info). Near-identical photos are dropped
+    first and listed (by `filenames`) under transformed_data["dropped_images"];
+    saved products showing the same photos are listed under
+    transformed_data["duplicates"]. `crop_mode` "regions" sends text-region
+    crops plus an overview per photo instead of whole images. When `file_digests`
+    are given the parsed model output is served from / stored in the extraction
+    cache. Output that does not parse is salvaged and its missing sections
+    re-asked; raises json.JSONDecodeError only when nothing can be recovered.
+    """
+    pil_images, dedup = await screen_images(pil_images, Product, "product_name", names=filenames)
+    if dedup["dropped"]:
+        safe_print(f"[EXTRACTION] Dropped {len(dedup['dropped'])} near-duplicate image(s): {dedup['dropped']}")
+    if dedup["matches"]:
+        safe_print(f"[EXTRACTION] Images match {len(dedup['matches'])} saved product image(s)")
+    
+    cache_key = None
+    cached = None
+    if file_digests:
+        cache_key = extraction_cache.make_key(
+            "product", GEMINI_MODEL, EXTRACTION_PROMPT, file_digests,
+            preprocess_signature(crop_mode) + dedup_signature()
+        )
+        cached = await extraction_cache.get(cache_key)
+    
+    if cached:
+        safe_print(f"[EXTRACTION] Cache hit {cache_key[:12]} - skipping Gemini call")
+        await progress("cache_hit")
+        product_data = cached.data
+        raw_json = dumps_str(product_data)
+        cost_info = calculate_cost(0, 0)
+        cost_info["cached"] = True
+        cost_info["saved_cost"] = calculate_cost(
+            cached.usage.get("prompt_token_count", 0),
+            cached.usage.get("candidates_token_count", 0)
+        )["total_cost"]
+    else:
+        await progress("preprocessing", {"images": len(pil_images)})
+        model_inputs, preprocessing = await asyncio.to_thread(preprocess_images, pil_images, crop_mode)
+        safe_print(
+            f"[EXTRACTION] Preprocessed images: ~{preprocessing['estimated_tokens_before']} -> "
+            f"~{preprocessing['estimated_tokens_after']} image tokens"
+        )
+        content = [EXTRACTION_PROMPT] + model_inputs
+        
+        safe_print(f"[EXTRACTION] Calling Gemini API with model: {GEMINI_MODEL}")
+        safe_print(f"[EXTRACTION] Extraction queue: {gemini_executor.stats()}")
+        safe_print(f"[EXTRACTION] This may take 10-30 seconds for {len(pil_images)} images...")
+        await progress("model", {"images": len(pil_images)})
+        
+        call_report = CallReport()
+        streamed_text, usage, streaming = await stream_product_response(
+            content, progress, preprocessing["estimated_tokens_after"], call_report
+        )
+        
+        safe_print("[EXTRACTION] Response received from Gemini API")
+        
+        # Calculate cost
+        prompt_tokens = (usage.prompt_token_count or 0) if usage else 0
+        output_tokens = (usage.candidates_token_count or 0) if usage else 0
+        safe_print(f"[EXTRACTION] Token usage - Input: {prompt_tokens}, Output: {output_tokens}")
+        cost_info = calculate_cost(prompt_tokens, output_tokens)
+        safe_print(f"[EXTRACTION] Estimated cost: ${cost_info['total_cost']:.4f}")
+        cost_info["preprocessing"] = preprocessing
+        cost_info["streaming"] = streaming
+        
+        # Parse response
+        await progress("parsing", {"output_tokens": output_tokens})
+        raw_json = clean_model_json(streamed_text)
+        safe_print(f"[EXTRACTION] Response length: {len(raw_json)} characters")
+        
+        safe_print("[EXTRACTION] Parsing JSON response...")
+        complete = True
+        try:
+            product_data = loads(raw_json)
+            safe_print("[EXTRACTION] JSON parsed successfully")
+        except json.JSONDecodeError as e:
+            safe_print(f"[ERROR] JSON parsing failed: {str(e)}")
+            safe_print(f"[ERROR] Raw response preview: {raw_json[:500]}")
+            await progress("repairing")
+            recovered = await recover_model_json(
+                streamed_text, EXTRACTION_PROMPT, model_inputs, GEMINI_MODEL,
+                PRODUCT_SECTIONS, PRODUCT_CONTINUE_KEYS, settings.EXTRACTION_REASK_ENABLED, call_report
+            )
+            if recovered is None:
+                raise
+            product_data = recovered.data
+            raw_json = dumps_str(product_data)
+            complete = not recovered.unresolved
+            
+            # Follow-up tokens are billed on top of the truncated call
+            followup_cost = calculate_cost(recovered.prompt_tokens, recovered.output_tokens)
+            for key in ("input_tokens", "output_tokens", "input_cost", "output_cost", "total_cost"):
+                cost_info[key] += followup_cost[key]
+            cost_info["repair"] = recovered.summary(followup_cost["total_cost"])
+            prompt_tokens += recovered.prompt_tokens
+            output_tokens += recovered.output_tokens
+            safe_print(f"[EXTRACTION] Recovered response, follow-up cost: ${followup_cost['total_cost']:.4f}")
+        
+        # Retries and hedges; abandoned duplicates may still be billed for their prompt
+        cost_info["calls"] = call_report.summary(cost_info["input_cost"])
+        if call_report.hedges or call_report.retries:
+            safe_print(f"[EXTRACTION] Model calls: {cost_info['calls']}")
+        
+        if cache_key and complete:
+            await extraction_cache.put(cache_key, "product", GEMINI_MODEL, product_data, {
+                "prompt_token_count": prompt_tokens,
+                "candidates_token_count": output_tokens,
+            })
+    
+    # Post-process the data
+    safe_print("[EXTRACTION] Post-processing extracted data...")
+    await progress("post_processing")
+    await nomenclature_engine.refresh()
+    transformed_data = postprocess_product_data(product_data, raw_json)
+    transformed_data["duplicates"] = dedup["matches"]
+    transformed_data["dropped_images"] = dedup["dropped"]
+    cost_info["dedup"] = {"dropped": dedup["dropped"], "images_sent": len(pil_images)}
+    
+    return transformed_data, cost_info
+
+
+def group_batch_archive(zip_file: zipfile.ZipFile) -> List[Tuple[str, List[zipfile.ZipInfo]]]:
+    """Group archive entries into products: one per top-level folder or loose file"""
+    max_file_bytes = settings.UPLOAD_MAX_FILE_MB * 1024 * 1024
+    max_total_bytes = settings.BATCH_MAX_UNCOMPRESSED_MB * 1024 * 1024
+    
+    groups = {}
+    total_bytes = 0
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+        parts = [part for part in info.filename.replace("\\", "/").split("/") if part]
+        if not parts or parts[0] == "__MACOSX" or parts[-1].startswith("."):
+            continue
+        
+        # Guard against zip bombs using the sizes declared in the central directory
+        if info.file_size > max_file_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large in archive: {info.filename}")
+        total_bytes += info.file_size
+        if total_bytes > max_total_bytes:
+            raise HTTPException(status_code=413, detail="Archive expands beyond the allowed size")
+        
+        name = parts[0] if len(parts) > 1 else os.path.splitext(parts[0])[0]
+        groups.setdefault(name, []).append(info)
+    
+    return [(name, sorted(entries, key=lambda info: info.filename)) for name, entries in groups.items()]
+
+
+async def _run_product_job(files: List[Tuple[str, bytes]], progress, crop_mode: Optional[str] = None) -> Tuple[dict, dict]:
+    pil_images = load_product_images(files)
+    digests = [file_digest(content) for _, content in files]
+    return await run_product_extraction(
+        pil_images, digests, progress, crop_mode or settings.IMAGE_CROP_MODE, [name for name, _ in files]
+    )
+
+
+register_job_handler("product", _run_product_job)
+
+
 # ============================================================
 # ROUTES
 # ============================================================
@@ -408,25 +703,17 @@ class ProductResponse(BaseModel):
 @router.post("/extract", response_model=ExtractedProductData)
 async def extract_product_from_images(
     images: List[UploadFile] = File(...),
+    crop_mode: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user)
 ):
     """
     Extract product data from uploaded images using Gemini AI
     
     - Accepts up to 10 images
+    - crop_mode: "regions" (text-area crops + overview) or "full" images; defaults to IMAGE_CROP_MODE
     - Returns structured product data
     - User can review and edit before saving
     """
-    # Safe print function to handle Unicode encoding errors on Windows
-    def safe_print(msg):
-        try:
-            print(msg)
-        except UnicodeEncodeError:
-            try:
-                print(msg.encode('ascii', 'replace').decode('ascii'))
-            except:
-                print("[LOG] (message contains special characters)")
-    
     safe_print("\n" + "="*60)
     safe_print("[EXTRACTION] ===== NEW EXTRACTION REQUEST =====")
     safe_print("="*60)
@@ -437,203 +724,23 @@ async def extract_product_from_images(
         for idx, img in enumerate(images):
             safe_print(f"[EXTRACTION] Image {idx + 1}: filename={img.filename}, content_type={img.content_type}")
         
-        # Check API key
-        api_key = settings.GEMINI_API_KEY
-        if not api_key:
-            safe_print("[ERROR] Gemini API key not configured")
-            raise HTTPException(
-                status_code=500, 
-                detail="Gemini API key not configured. Please set GEMINI_API_KEY in environment."
-            )
+        check_extraction_request(images)
+        crop_mode = resolve_crop_mode(crop_mode)
         
-        safe_print(f"[EXTRACTION] API key configured: {api_key[:20]}...")
-        
-        # Validate image count
-        if len(images) == 0:
-            raise HTTPException(status_code=400, detail="At least one image is required")
-        if len(images) > 10:
-            raise HTTPException(status_code=400, detail="Maximum 10 images allowed")
-        
-        safe_print(f"[EXTRACTION] Processing {len(images)} images")
+        safe_print(f"[EXTRACTION] Processing {len(images)} images (crop mode: {crop_mode})")
         
         # Load and validate images
-        pil_images = []
-        for idx, img in enumerate(images):
-            try:
-                safe_print(f"[EXTRACTION] Loading image {idx + 1}/{len(images)}: {img.filename}")
-                content = await img.read()
-                pil_img = Image.open(BytesIO(content))
-                safe_print(f"[EXTRACTION] Image {idx + 1} loaded: {pil_img.size} pixels")
-                pil_images.append(pil_img)
-            except Exception as e:
-                safe_print(f"[ERROR] Failed to load image {img.filename}: {str(e)}")
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Invalid image file: {img.filename}. Error: {str(e)}"
-                )
-        
-        # Call Gemini API
-        safe_print("[EXTRACTION] Initializing Gemini client...")
-        from google import genai
-        
-        client = genai.Client(api_key=api_key)
-        safe_print("[EXTRACTION] Client initialized successfully")
-        
-        content = [EXTRACTION_PROMPT] + pil_images
-        
-        safe_print(f"[EXTRACTION] Calling Gemini API with model: {GEMINI_MODEL}")
-        safe_print(f"[EXTRACTION] This may take 10-30 seconds for {len(images)} images...")
-        
-        response = client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=content,
-            config={
-                "temperature": 0,
-                "top_p": 0.95,
-                "top_k": 40,
-                "response_mime_type": "application/json",
-            },
-        )
-        
-        safe_print("[EXTRACTION] Response received from Gemini API")
+        uploads = await read_uploads(images, IMAGE_TYPES)
+        files = [(upload.filename, upload.data) for upload in uploads]
+        try:
+            pil_images = load_product_images(files)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Calculate cost
-        usage = response.usage_metadata
-        safe_print(f"[EXTRACTION] Token usage - Input: {usage.prompt_token_count}, Output: {usage.candidates_token_count}")
-        cost_info = calculate_cost(
-            usage.prompt_token_count, 
-            usage.candidates_token_count
+        digests = [upload.sha256 for upload in uploads]
+        transformed_data, cost_info = await run_product_extraction(
+            pil_images, digests, crop_mode=crop_mode, filenames=[name for name, _ in files]
         )
-        safe_print(f"[EXTRACTION] Estimated cost: ${cost_info['total_cost']:.4f}")
-        
-        # Parse response
-        raw_json = response.text.strip()
-        safe_print(f"[EXTRACTION] Response length: {len(raw_json)} characters")
-        
-        # Clean markdown if present
-        if raw_json.startswith("```"):
-            safe_print("[EXTRACTION] Cleaning markdown formatting...")
-            first_newline = raw_json.find("\n")
-            if first_newline != -1:
-                raw_json = raw_json[first_newline + 1:]
-            if "```" in raw_json:
-                last_fence = raw_json.rfind("```")
-                raw_json = raw_json[:last_fence].rstrip()
-        
-        if not raw_json.startswith("{"):
-            first_brace = raw_json.find("{")
-            if first_brace != -1:
-                raw_json = raw_json[first_brace:]
-        
-        if not raw_json.endswith("}"):
-            last_brace = raw_json.rfind("}")
-            if last_brace != -1:
-                raw_json = raw_json[:last_brace + 1]
-        
-        safe_print("[EXTRACTION] Parsing JSON response...")
-        product_data = json.loads(raw_json)
-        safe_print("[EXTRACTION] JSON parsed successfully")
-        
-        # Post-process the data
-        safe_print("[EXTRACTION] Post-processing extracted data...")
-        parent = product_data.get("parent_product", {})
-        
-        # Standardize nutrition
-        if "nutrition_table" in parent:
-            safe_print("[EXTRACTION] Standardizing nutrition table...")
-            parent["nutrition_table"] = standardize_nutrition_table(parent["nutrition_table"])
-        
-        # Extract numeric MRP
-        if "pricing" in parent:
-            mrp_value = parent["pricing"].get("mrp")
-            numeric_mrp = extract_numeric_mrp(mrp_value)
-            if numeric_mrp is not None:
-                parent["pricing"]["mrp"] = numeric_mrp
-        
-        # Detect packing format
-        if parent.get("packing_format") == "not specified":
-            combined_text = json.dumps(product_data)
-            parent["packing_format"] = detect_packing_format(combined_text)
-        
-        # Validate dates
-        mfg_date, exp_date = validate_dates(raw_json)
-        if "dates" in parent:
-            if mfg_date:
-                parent["dates"]["manufacturing_date"] = mfg_date
-            if exp_date:
-                parent["dates"]["expiry_date"] = exp_date
-        
-        # Get shelf life from extraction or calculate if not provided
-        shelf_life = parent.get("dates", {}).get("shelf_life", "") or parent.get("shelf_life", "")
-        if not shelf_life or shelf_life == "not specified":
-            if mfg_date and exp_date:
-                try:
-                    from datetime import datetime
-                    # Try different date formats
-                    for date_format in ["%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d"]:
-                        try:
-                            mfg = datetime.strptime(mfg_date, date_format)
-                            exp = datetime.strptime(exp_date, date_format)
-                            days_diff = (exp - mfg).days
-                            months = days_diff // 30
-                            if months > 0:
-                                shelf_life = f"{months} months"
-                            else:
-                                shelf_life = f"{days_diff} days"
-                            break
-                        except ValueError:
-                            continue
-                except:
-                    pass
-        
-        # Store shelf_life in both locations for compatibility
-        if shelf_life:
-            parent["shelf_life"] = shelf_life
-            if "dates" in parent:
-                parent["dates"]["shelf_life"] = shelf_life
-        
-        # Extract FSSAI
-        fssai_licenses = validate_fssai(raw_json)
-        if fssai_licenses and "manufacturer_details" in parent:
-            for manufacturer in parent["manufacturer_details"]:
-                if manufacturer.get("fssai") == "not specified" and fssai_licenses:
-                    manufacturer["fssai"] = fssai_licenses.pop(0)
-        
-        # Transform to frontend-friendly format
-        transformed_data = {
-            "basic": {
-                "productName": parent.get("product_name", ""),
-                "brand": parent.get("brand", {}).get("parent_brand", ""),
-                "subBrand": parent.get("brand", {}).get("sub_brand", ""),
-                "variant": parent.get("variant", ""),
-                "packSize": parent.get("weight_and_size", {}).get("net_weight", ""),
-                "serveSize": parent.get("weight_and_size", {}).get("serving_size", ""),
-                "mrp": parent.get("pricing", {}).get("mrp", ""),
-                "packingFormat": parent.get("packing_format", ""),
-                "manufactured": parent.get("dates", {}).get("manufacturing_date", ""),
-                "expiry": parent.get("dates", {}).get("expiry_date", ""),
-                "shelfLife": parent.get("shelf_life", ""),
-                "vegNonVeg": parent.get("symbols", {}).get("veg_nonveg", ""),
-            },
-            "nutrition": parent.get("nutrition_table", []),
-            "composition": {
-                "ingredients": parent.get("ingredients", ""),
-                "allergenInfo": parent.get("allergen_info", ""),
-                "claims": parent.get("claims", []),
-                "storageInstructions": parent.get("storage_instructions", ""),
-                "instructionsToUse": parent.get("instructions_to_use", ""),
-                "shelfLife": parent.get("shelf_life", ""),
-            },
-            "company": {
-                "manufacturerDetails": parent.get("manufacturer_details", []),
-                "barcode": parent.get("barcode", ""),
-                "certifications": parent.get("certifications", []),
-                "customerCare": parent.get("customer_care", {}),
-            },
-            "dates": parent.get("dates", {}),
-            "other": parent.get("other_important_text", []),
-            "raw": product_data,  # Keep raw data for reference
-        }
         
         safe_print("[EXTRACTION] SUCCESS - Extraction completed successfully!")
         return ExtractedProductData(
@@ -643,31 +750,22 @@ async def extract_product_from_images(
         )
         
     except json.JSONDecodeError as e:
-        safe_print(f"[ERROR] JSON parsing failed: {str(e)}")
-        safe_print(f"[ERROR] Raw response preview: {raw_json[:500] if 'raw_json' in locals() else 'N/A'}")
         return ExtractedProductData(
             success=False,
             error=f"Failed to parse AI response: {str(e)}"
         )
+    except QuotaExhausted as e:
+        safe_print(f"[ERROR] {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     except HTTPException as e:
-        try:
-            print(f"[ERROR] HTTP Exception: {e.detail}")
-            print(f"[ERROR] Status Code: {e.status_code}")
-        except UnicodeEncodeError:
-                print("[ERROR] HTTP Exception (Unicode error in message)")
+        safe_print(f"[ERROR] HTTP Exception: {e.detail}")
+        safe_print(f"[ERROR] Status Code: {e.status_code}")
         raise
     except Exception as e:
-        # Safe print function that handles Unicode encoding errors
-        def safe_print(msg):
-            try:
-                print(msg)
-            except UnicodeEncodeError:
-                # Fallback: print ASCII-only version
-                try:
-                    print(msg.encode('ascii', 'replace').decode('ascii'))
-                except:
-                    print("[ERROR] Could not display error message (encoding error)")
-        
         safe_print("\n[ERROR] ===== EXTRACTION FAILED =====")
         safe_print(f"[ERROR] Exception Type: {type(e).__name__}")
         safe_print(f"[ERROR] Error Message: {str(e)}")
@@ -697,6 +795,196 @@ async def extract_product_from_images(
         )
 
 
+@router.post("/extract/stream")
+async def extract_product_stream(
+    images: List[UploadFile] = File(...),
+    crop_mode: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Extract product data, streaming results as server-sent events
+    
+    - "partial" events carry basic fields (name, brand, net weight...) as the model writes them
+    - "progress" events report pipeline stages
+    - A final "done" event has the same shape as the /extract response
+    """
+    check_extraction_request(images)
+    crop_mode = resolve_crop_mode(crop_mode)
+    
+    uploads = await read_uploads(images, IMAGE_TYPES)
+    files = [(upload.filename, upload.data) for upload in uploads]
+    try:
+        pil_images = load_product_images(files)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    digests = [upload.sha256 for upload in uploads]
+    
+    safe_print(f"[EXTRACTION] Streaming extraction of {len(pil_images)} images for {current_user.email}")
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def progress(stage: str, detail: Optional[dict] = None):
+        await events.put((stage, detail or {}))
+    
+    async def run():
+        try:
+            transformed_data, cost_info = await run_product_extraction(
+                pil_images, digests, progress, crop_mode, [name for name, _ in files]
+            )
+            result = ExtractedProductData(success=True, data=transformed_data, cost=cost_info)
+        except json.JSONDecodeError as e:
+            result = ExtractedProductData(success=False, error=f"Failed to parse AI response: {str(e)}")
+        except Exception as e:
+            safe_print(f"[ERROR] Streaming extraction failed: {type(e).__name__}: {str(e)}")
+            result = ExtractedProductData(success=False, error=f"Extraction failed: {type(e).__name__}: {str(e)}")
+        await events.put(("done", result.model_dump()))
+    
+    async def event_stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                try:
+                    stage, detail = await asyncio.wait_for(events.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                if stage == "done":
+                    yield sse_event("done", detail)
+                    break
+                if stage == "partial":
+                    yield sse_event("partial", detail)
+                else:
+                    yield sse_event("progress", {"stage": stage, **detail})
+        finally:
+            # Client disconnected before the end: don't keep the model call running
+            task.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/extract/jobs", response_model=dict, status_code=202)
+async def submit_product_extraction_job(
+    images: List[UploadFile] = File(...),
+    crop_mode: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Queue a product extraction and return immediately with a job id
+    
+    - Poll GET /api/jobs/{job_id} or stream GET /api/jobs/{job_id}/events
+    - Survives dropped connections and server restarts
+    """
+    check_extraction_request(images)
+    crop_mode = resolve_crop_mode(crop_mode)
+    
+    uploads = await read_uploads(images, IMAGE_TYPES)
+    files = [(upload.filename, upload.content_type, upload.data) for upload in uploads]
+    job = await extraction_jobs.submit("product", files, current_user, {"crop_mode": crop_mode})
+    safe_print(f"[EXTRACTION] Queued job {job.id} for {current_user.email} ({len(files)} images)")
+    
+    return job_links(job)
+
+
+@router.post("/extract/batch")
+async def extract_product_batch(
+    archive: UploadFile = File(...),
+    concurrency: Optional[int] = Form(None),
+    crop_mode: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Extract many products from one zip archive, streaming results as NDJSON
+    
+    - One folder per product, holding up to 10 images each
+    - Loose files at the top level are treated as single-image products
+    - Each line is one product's result, written as soon as it finishes;
+      the last line is a summary
+    """
+    check_extraction_request([archive])
+    crop_mode = resolve_crop_mode(crop_mode)
+    
+    max_archive_bytes = settings.BATCH_MAX_ARCHIVE_MB * 1024 * 1024
+    uploaded = await read_upload(archive, ARCHIVE_TYPES, max_archive_bytes, max_archive_bytes)
+    await archive.close()
+    
+    try:
+        zip_file = zipfile.ZipFile(BytesIO(uploaded.data))
+        groups = group_batch_archive(zip_file)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Invalid zip archive: {str(e)}")
+    
+    if not groups:
+        raise HTTPException(status_code=400, detail="Archive contains no product images")
+    if len(groups) > settings.BATCH_MAX_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"Maximum {settings.BATCH_MAX_PRODUCTS} products per batch")
+    
+    limit = min(max(1, concurrency or settings.BATCH_EXTRACTION_CONCURRENCY), settings.BATCH_EXTRACTION_CONCURRENCY)
+    semaphore = asyncio.Semaphore(limit)
+    safe_print(f"[BATCH] {current_user.email} submitted {len(groups)} products (concurrency {limit})")
+    
+    async def extract_group(index: int, name: str, entries: List[zipfile.ZipInfo]) -> dict:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if len(entries) > 10:
+                    raise ValueError("Maximum 10 images allowed per product")
+                files = [(info.filename, zip_file.read(info)) for info in entries]
+                for filename, content in files:
+                    if sniff_content_type(content[:16]) not in IMAGE_TYPES:
+                        raise ValueError(f"Unsupported file type: {filename}")
+                pil_images = load_product_images(files)
+                digests = [file_digest(content) for _, content in files]
+                data, cost = await run_product_extraction(
+                    pil_images, digests, crop_mode=crop_mode, filenames=[name for name, _ in files]
+                )
+                return {"index": index, "product": name, "success": True, "data": data, "cost": cost,
+                        "elapsed_ms": round((time.perf_counter() - started) * 1000)}
+            except Exception as e:
+                safe_print(f"[BATCH] Product '{name}' failed: {type(e).__name__}: {str(e)}")
+                return {"index": index, "product": name, "success": False,
+                        "error": f"{type(e).__name__}: {str(e)}",
+                        "elapsed_ms": round((time.perf_counter() - started) * 1000)}
+    
+    async def result_lines():
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(extract_group(index, name, entries))
+            for index, (name, entries) in enumerate(groups)
+        ]
+        succeeded = 0
+        total_cost = 0.0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result["success"]:
+                    succeeded += 1
+                    total_cost += result["cost"].get("total_cost", 0.0)
+                yield dumps_str(result) + "\n"
+            
+            yield dumps_str({"summary": {
+                "total": len(tasks),
+                "succeeded": succeeded,
+                "failed": len(tasks) - succeeded,
+                "total_cost": total_cost,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000),
+            }}) + "\n"
+        finally:
+            # Client went away: stop paying for extractions nobody will read
+            for task in tasks:
+                task.cancel()
+            zip_file.close()
+    
+    return StreamingResponse(
+        result_lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("", response_model=dict)
 async def create_product(
     product: ProductCreate,
@@ -704,6 +992,9 @@ async def create_product(
 ):
     """Create a new product"""
     try:
+        # Images go to the blob store; the document keeps only references
+        images = await asyncio.to_thread(blob_store.externalize, product.images)
+        hashes = await asyncio.to_thread(stored_image_hashes, images)
         new_product = Product(
             product_name=product.product_name,
             parent_brand=product.parent_brand,
@@ -732,7 +1023,10 @@ async def create_product(
             fssai_licenses=product.fssai_licenses,
             customer_care=product.customer_care,
             tags=product.tags,
-            images=product.images,
+            images=images,
+            image_hashes=hashes["image_hashes"],
+            image_hash_bands=hashes["image_hash_bands"],
+            extraction_cost=product.extraction_cost,
             status=product.status,
             created_by=str(current_user.id),
             created_at=datetime.utcnow(),
@@ -740,6 +1034,7 @@ async def create_product(
         )
         
         await new_product.insert()
+        image_variants.schedule(images)
         
         return {
             "success": True,
@@ -774,8 +1069,7 @@ async def list_products(
                 {"variant": {"$regex": search, "$options": "i"}}
             ]
         
-        products = await Product.find(query).skip(skip).limit(limit).to_list()
-        total = await Product.find(query).count()
+        products, total = await fetch_page(Product, query, ProductListItem, skip, limit)
 
         # Debug logging
         for p in products:
@@ -784,7 +1078,7 @@ async def list_products(
                 print(f"[API DEBUG] Images count: {len(p.images) if p.images else 0}")
                 print(f"[API DEBUG] Images type: {type(p.images)}")
 
-        return {
+        return ORJSONResponse({
             "products": [
                 {
                     "id": str(p.id),
@@ -799,14 +1093,16 @@ async def list_products(
                     "created_at": p.created_at.isoformat(),
                     "manufacturing_date": p.manufacturing_date,
                     "expiry_date": p.expiry_date,
-                    "images": p.images if p.images else []  # All images for preview
+                    "images": p.images if p.images else [],
+                    # thumb for grids, medium for the preview modal
+                    "image_variants": variant_urls(p.images)
                 }
                 for p in products
             ],
             "total": total,
             "skip": skip,
             "limit": limit
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch products: {str(e)}")
@@ -825,7 +1121,7 @@ async def get_product(
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        return {
+        return ORJSONResponse({
             "id": str(product.id),
             "product_name": product.product_name,
             "parent_brand": product.parent_brand,
@@ -855,10 +1151,11 @@ async def get_product(
             "customer_care": product.customer_care,
             "tags": product.tags,
             "images": product.images,
+            "image_variants": variant_urls(product.images),
             "status": product.status,
             "created_at": product.created_at.isoformat(),
             "updated_at": product.updated_at.isoformat()
-        }
+        })
         
     except HTTPException:
         raise
@@ -884,6 +1181,11 @@ async def update_product(
         update_data = product_update.model_dump(exclude_unset=True)
         update_data["updated_at"] = datetime.utcnow()
         
+        if "images" in update_data:
+            update_data["images"] = await asyncio.to_thread(blob_store.externalize, update_data["images"])
+            update_data.update(await asyncio.to_thread(stored_image_hashes, update_data["images"]))
+            image_variants.schedule(update_data["images"])
+        
         for field, value in update_data.items():
             setattr(product, field, value)
         
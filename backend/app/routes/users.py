@@ -9,9 +9,10 @@ from app.models.user import User, UserRole, ROLE_PERMISSIONS
 from app.schemas.auth import UserResponse, MessageResponse
 from app.dependencies.auth import get_current_user
 from app.utils.security import hash_password, validate_password_strength
+from app.utils.fast_json import ORJSONRoute
 
 
-router = APIRouter(prefix="/users", tags=["User Management"])
+router = APIRouter(prefix="/users", tags=["User Management"], route_class=ORJSONRoute)
 
 
 # Request Schemas
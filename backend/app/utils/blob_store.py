@@ -0,0 +1,129 @@
+"""
+Blob Store - content-addressed image files on the uploads volume
+
+Product and COA images used to be saved in their documents as base64 data
+URLs. Every list call then carried every image of every record, and one
+Products page load ran to hundreds of MB. Images are now written once to
+UPLOAD_DIR/blobs, named by the SHA-256 of their bytes, and the documents
+hold short references ("/api/images/<sha256>.<ext>") that the browser fetches
+from the image endpoint.
+
+Content addressing makes writes idempotent and deduplicates identical uploads
+for free. A blob never changes once written (a write goes to a temporary file
+and is renamed into place), so references can be cached forever.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from typing import List, Optional, Sequence
+from app.utils.uploads import sniff_content_type
+from config.settings import settings
+
+
+REF_PREFIX = "/api/images/"
+REF_PATTERN = re.compile(r"^/api/images/([0-9a-f]{64})(?:\.([a-z0-9]+))?$")
+DATA_URL_PATTERN = re.compile(r"^data:([\w.+-]+/[\w.+-]+)?(;[^,]*)?,", re.S)
+
+EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "image/bmp": "bmp",
+    "image/tiff": "tiff",
+    "application/pdf": "pdf",
+}
+
+
+def parse_ref(value: str) -> Optional[str]:
+    """SHA-256 of a blob reference, or None if `value` is not one"""
+    match = REF_PATTERN.match(value) if isinstance(value, str) else None
+    return match.group(1) if match else None
+
+
+def is_data_url(value) -> bool:
+    return isinstance(value, str) and value.startswith("data:")
+
+
+def decode_data_url(value: str) -> Optional[bytes]:
+    """Bytes of a base64 data URL, or None if it is malformed"""
+    match = DATA_URL_PATTERN.match(value)
+    if not match or "base64" not in (match.group(2) or ""):
+        return None
+    try:
+        return base64.b64decode(value[match.end():], validate=False)
+    except (binascii.Error, ValueError):
+        return None
+
+
+class BlobStore:
+    """Immutable files under `root`, sharded by the first two bytes of their hash"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.isfile(self.path(sha256))
+
+    def put(self, data: bytes) -> str:
+        """Store bytes (no-op if already present); returns their SHA-256"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path(sha256)
+        if os.path.isfile(path):
+            return sha256
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return sha256
+
+    def read(self, sha256: str) -> bytes:
+        with open(self.path(sha256), "rb") as f:
+            return f.read()
+
+    def content_type(self, sha256: str) -> str:
+        with open(self.path(sha256), "rb") as f:
+            return sniff_content_type(f.read(16)) or "application/octet-stream"
+
+    def ref(self, sha256: str, content_type: Optional[str] = None) -> str:
+        extension = EXTENSIONS.get(content_type or "")
+        return f"{REF_PREFIX}{sha256}.{extension}" if extension else f"{REF_PREFIX}{sha256}"
+
+    def store_value(self, value: str) -> str:
+        """Replace a data URL with a blob reference; other values are returned unchanged"""
+        if not is_data_url(value):
+            return value
+        data = decode_data_url(value)
+        if not data:
+            return value
+        return self.ref(self.put(data), sniff_content_type(data[:16]))
+
+    def externalize(self, values: Sequence[str]) -> List[str]:
+        """Move every data URL in a list of images into the store"""
+        return [self.store_value(value) for value in values or []]
+
+    def load(self, value: str) -> Optional[bytes]:
+        """Bytes behind an image value: a data URL or a blob reference"""
+        if is_data_url(value):
+            return decode_data_url(value)
+        sha256 = parse_ref(value)
+        if sha256 and self.exists(sha256):
+            return self.read(sha256)
+        return None
+
+
+blob_store = BlobStore(os.path.join(settings.UPLOAD_DIR, "blobs"))
@@ -0,0 +1,126 @@
+"""
+Extraction Cache - content-addressed store of parsed model output
+
+Entries are keyed on the hashes of the uploaded files (order-independent), the
+prompt and the model, so a repeat upload of the same pack photos or COA returns
+the previous result without another generate_content call. Old entries expire
+through a TTL index; the collection is also trimmed to EXTRACTION_CACHE_MAX_MB
+by evicting the least recently used entries.
+"""
+import hashlib
+from datetime import datetime
+from typing import List, Optional
+from app.models.extraction_cache import ExtractionCacheEntry
+from app.utils.fast_json import dumps
+from config.settings import settings
+
+
+class ExtractionCache:
+    def __init__(self, enabled: bool, max_bytes: int):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @staticmethod
+    def make_key(kind: str, model: str, prompt: str, file_digests: List[str], variant: str = "") -> str:
+        """Stable key for a set of uploads; `variant` covers preprocessing options"""
+        h = hashlib.sha256()
+        for part in [kind, model, hashlib.sha256(prompt.encode("utf-8")).hexdigest(), variant]:
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        for digest in sorted(file_digests):
+            h.update(digest.encode("ascii"))
+        return h.hexdigest()
+
+    async def get(self, key: str) -> Optional[ExtractionCacheEntry]:
+        if not self.enabled:
+            return None
+        try:
+            entry = await ExtractionCacheEntry.find_one(ExtractionCacheEntry.key == key)
+        except Exception as e:
+            self.errors += 1
+            print(f"[WARNING] Extraction cache lookup failed: {e}")
+            return None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        await ExtractionCacheEntry.get_motor_collection().update_one(
+            {"_id": entry.id},
+            {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.utcnow()}}
+        )
+        return entry
+
+    async def put(self, key: str, kind: str, model: str, data: dict, usage: dict):
+        if not self.enabled:
+            return
+        now = datetime.utcnow()
+        size_bytes = len(dumps(data))
+        try:
+            # Upsert so two identical concurrent extractions don't collide on the unique key
+            await ExtractionCacheEntry.get_motor_collection().update_one(
+                {"key": key},
+                {"$setOnInsert": {
+                    "key": key,
+                    "kind": kind,
+                    "model": model,
+                    "data": data,
+                    "usage": usage,
+                    "size_bytes": size_bytes,
+                    "hits": 0,
+                    "created_at": now,
+                    "last_hit_at": now,
+                }},
+                upsert=True
+            )
+            self.stores += 1
+            await self._evict()
+        except Exception as e:
+            self.errors += 1
+            print(f"[WARNING] Extraction cache store failed: {e}")
+
+    async def _evict(self):
+        collection = ExtractionCacheEntry.get_motor_collection()
+        totals = await collection.aggregate([
+            {"$group": {"_id": None, "size": {"$sum": "$size_bytes"}}}
+        ]).to_list(1)
+        total_size = totals[0]["size"] if totals else 0
+        if total_size <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until back under the cap
+        to_delete = []
+        cursor = collection.find({}, {"size_bytes": 1}).sort("last_hit_at", 1)
+        async for doc in cursor:
+            to_delete.append(doc["_id"])
+            total_size -= doc.get("size_bytes", 0)
+            if total_size <= self.max_bytes:
+                break
+
+        if to_delete:
+            result = await collection.delete_many({"_id": {"$in": to_delete}})
+            self.evictions += result.deleted_count
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+extraction_cache = ExtractionCache(
+    enabled=settings.EXTRACTION_CACHE_ENABLED,
+    max_bytes=settings.EXTRACTION_CACHE_MAX_MB * 1024 * 1024,
+)
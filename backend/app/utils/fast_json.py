@@ -0,0 +1,74 @@
+"""
+Fast JSON - orjson-backed parsing and rendering for model output, request bodies and responses
+
+orjson serializes datetimes, UUIDs, dataclasses and NumPy arrays natively and is
+several times faster than the stdlib encoder on the large documents this API
+moves around (base64 image lists, full COA nutrient tables). The few types it
+does not know (ObjectId, sets, pydantic models) go through `_default`.
+
+Routes that return big hand-built dicts should return `ORJSONResponse` directly:
+a returned Response skips FastAPI's response_model validation and
+jsonable_encoder walk, which otherwise costs more than the encoding itself.
+"""
+from typing import Any, Callable
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing handlers still match
+JSONDecodeError = orjson.JSONDecodeError
+
+
+def _default(obj: Any):
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    # ObjectId, Decimal and anything else: the same fallback as json.dumps(default=str)
+    return str(obj)
+
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_default, option=OPTIONS)
+
+
+def dumps_str(data: Any, indent: bool = False) -> str:
+    option = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+    return orjson.dumps(data, default=_default, option=option).decode("utf-8")
+
+
+def loads(data) -> Any:
+    return orjson.loads(data)
+
+
+class ORJSONResponse(JSONResponse):
+    """Default response class for the API"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ORJSONRequest(Request):
+    """Request whose JSON body is parsed with orjson"""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = loads(await self.body())
+        return self._json
+
+
+class ORJSONRoute(APIRoute):
+    """Route class that hands endpoints an ORJSONRequest; set as `route_class` on routers"""
+
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await original_route_handler(ORJSONRequest(request.scope, request.receive))
+
+        return route_handler
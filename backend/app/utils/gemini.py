@@ -0,0 +1,384 @@
+"""
+Gemini Execution Layer - shared async access to the model for all extract routes
+
+One SDK client is created per worker process at startup and reused for every
+call, so its HTTP connection pool (and TLS session) is kept alive between
+requests. Pointing GEMINI_BASE_URL at scripts/gemini_standin.py swaps the real
+API for a local stand-in during load tests and offline development.
+
+Every call first takes room from the cross-worker quota governor (quota.py) and
+is retried with shared, jittered backoff when the provider answers 429/503.
+Calls also run under per-attempt timeouts and an overall deadline, and calls
+slower than the recent p90 are hedged with a duplicate request (hedging.py).
+"""
+import asyncio
+import random
+import time
+from typing import Dict, Optional
+from app.utils.hedging import CallReport, DeadlineExceeded, LatencyWindow, is_transient, race
+from app.utils.quota import gemini_quota, estimate_request_tokens, is_rate_limited, QuotaExhausted
+from config.settings import settings
+
+
+GENERATION_CONFIG = {
+    "temperature": 0,
+    "top_p": 0.95,
+    "top_k": 40,
+    "response_mime_type": "application/json",
+}
+
+
+def clean_model_json(text: str) -> str:
+    """Strip markdown fences and stray text around the JSON object in a model response"""
+    raw_json = (text or "").strip()
+    
+    if raw_json.startswith("```"):
+        first_newline = raw_json.find("\n")
+        if first_newline != -1:
+            raw_json = raw_json[first_newline + 1:]
+        if "```" in raw_json:
+            last_fence = raw_json.rfind("```")
+            raw_json = raw_json[:last_fence].rstrip()
+    
+    if not raw_json.startswith("{"):
+        first_brace = raw_json.find("{")
+        if first_brace != -1:
+            raw_json = raw_json[first_brace:]
+    
+    if not raw_json.endswith("}"):
+        last_brace = raw_json.rfind("}")
+        if last_brace != -1:
+            raw_json = raw_json[:last_brace + 1]
+    
+    return raw_json
+
+
+def usage_tokens(response) -> int:
+    """Prompt + output tokens billed for a response (or the last chunk of a stream)"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0
+    return (usage.prompt_token_count or 0) + (usage.candidates_token_count or 0)
+
+
+class GeminiExecutor:
+    """Runs model calls on the SDK's async client with a per-worker concurrency cap"""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_latency_ms = 0.0
+        self._latency_windows: Dict[str, LatencyWindow] = {}
+        self._client = None
+
+    def start(self):
+        """Create the shared client; called once from the app lifespan"""
+        if self._client is not None:
+            return
+        from google import genai
+        from google.genai import types
+
+        http_options = types.HttpOptions(timeout=int(settings.GEMINI_TIMEOUT_SECONDS * 1000))
+        if settings.GEMINI_BASE_URL:
+            http_options.base_url = settings.GEMINI_BASE_URL
+            print(f"[OK] Gemini client using stand-in at {settings.GEMINI_BASE_URL}")
+
+        self._client = genai.Client(
+            api_key=settings.GEMINI_API_KEY or "standin",
+            http_options=http_options,
+        )
+
+    async def close(self):
+        """Release pooled connections on shutdown"""
+        client, self._client = self._client, None
+        if client is None:
+            return
+        try:
+            aclose = getattr(client.aio, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            close = getattr(client, "close", None)
+            if close is not None:
+                close()
+        except Exception as e:
+            print(f"[WARNING] Gemini client close failed: {e}")
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running uvicorn event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _get_client(self):
+        # Scripts and tests that run extraction outside the app lifespan
+        if self._client is None:
+            self.start()
+        return self._client
+
+    async def _acquire_slot(self, semaphore: asyncio.Semaphore):
+        self.queued += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+    async def _backoff(self, error: Exception, attempt: int):
+        """Sleep before retrying a 429/503, or raise once retries are used up"""
+        if attempt >= settings.GEMINI_RATE_LIMIT_RETRIES:
+            raise QuotaExhausted(
+                f"Model provider is rate limiting ({getattr(error, 'code', '?')}) after {attempt + 1} attempts",
+                retry_after=settings.GEMINI_BACKOFF_MAX_SECONDS,
+            ) from error
+        delay = await gemini_quota.throttle(attempt)
+        print(f"[WARNING] Gemini returned {getattr(error, 'code', '?')}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    def _latency(self, model: str, kind: str) -> LatencyWindow:
+        key = f"{kind}:{model}"
+        if key not in self._latency_windows:
+            self._latency_windows[key] = LatencyWindow(settings.GEMINI_LATENCY_WINDOW)
+        return self._latency_windows[key]
+
+    def _can_hedge(self) -> bool:
+        # Hedges only use idle capacity: a free slot and nobody queued for quota
+        return not self._get_semaphore().locked() and gemini_quota.waiting == 0
+
+    async def _with_retries(self, call, deadline: float, report: CallReport):
+        """Repeat `call` on transient failures while the deadline allows"""
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except Exception as e:
+                remaining = deadline - loop.time()
+                if not is_transient(e) or attempt >= settings.GEMINI_TRANSIENT_RETRIES or remaining <= 0:
+                    raise
+                delay = min(remaining, settings.GEMINI_BACKOFF_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.0))
+                print(f"[WARNING] Gemini call failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                report.retries += 1
+
+    async def _call_once(self, model: str, contents: list, config: Optional[dict],
+                         reserved: int, hedge: bool = False):
+        """One model call under quota and the concurrency cap; 429/503 are retried unless hedging"""
+        client = self._get_client()
+        semaphore = self._get_semaphore()
+
+        attempt = 0
+        while True:
+            # A hedge never waits for quota, it is only worth sending on spare capacity
+            await gemini_quota.acquire(reserved, max_wait=0 if hedge else None)
+            settled = False
+            try:
+                await self._acquire_slot(semaphore)
+                self.in_flight += 1
+                started = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        client.aio.models.generate_content(
+                            model=model,
+                            contents=contents,
+                            config=config or GENERATION_CONFIG,
+                        ),
+                        settings.GEMINI_ATTEMPT_TIMEOUT_SECONDS,
+                    )
+                    self.completed += 1
+                    self.total_latency_ms += (time.perf_counter() - started) * 1000
+                except Exception as e:
+                    if hedge or not is_rate_limited(e):
+                        self.failed += 1
+                        raise
+                    error = e
+                else:
+                    error = None
+                finally:
+                    self.in_flight -= 1
+                    semaphore.release()
+
+                if error is None:
+                    await gemini_quota.settle(reserved, usage_tokens(response))
+                    settled = True
+                    return response
+            finally:
+                # A 429, a failure or a cancelled hedge used none of the reservation;
+                # shielded so a cancellation cannot skip the refund
+                if not settled:
+                    await asyncio.shield(gemini_quota.refund(reserved))
+            try:
+                await self._backoff(error, attempt)
+            except QuotaExhausted:
+                self.failed += 1
+                raise
+            attempt += 1
+
+    async def _stream_once(self, model: str, contents: list, config: Optional[dict],
+                           reserved: int, hedge: bool = False):
+        """One streamed model call; every chunk must arrive within the attempt timeout"""
+        client = self._get_client()
+        semaphore = self._get_semaphore()
+        timeout = settings.GEMINI_ATTEMPT_TIMEOUT_SECONDS
+
+        attempt = 0
+        while True:
+            await gemini_quota.acquire(reserved, max_wait=0 if hedge else None)
+            used = 0
+            settled = False
+            try:
+                await self._acquire_slot(semaphore)
+                self.in_flight += 1
+                started = time.perf_counter()
+                yielded = False
+                error = None
+                try:
+                    stream = await asyncio.wait_for(
+                        client.aio.models.generate_content_stream(
+                            model=model,
+                            contents=contents,
+                            config=config or GENERATION_CONFIG,
+                        ),
+                        timeout,
+                    )
+                    chunks = stream.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        used = usage_tokens(chunk) or used
+                        yielded = True
+                        yield chunk
+                    self.completed += 1
+                    self.total_latency_ms += (time.perf_counter() - started) * 1000
+                except Exception as e:
+                    if yielded or hedge or not is_rate_limited(e):
+                        self.failed += 1
+                        raise
+                    error = e
+                finally:
+                    self.in_flight -= 1
+                    semaphore.release()
+
+                if error is None:
+                    await gemini_quota.settle(reserved, used)
+                    settled = True
+                    return
+            finally:
+                # Charge what a broken-off stream reported so far, refund the rest
+                if not settled:
+                    if used:
+                        await asyncio.shield(gemini_quota.settle(reserved, used))
+                    else:
+                        await asyncio.shield(gemini_quota.refund(reserved))
+            try:
+                await self._backoff(error, attempt)
+            except QuotaExhausted:
+                self.failed += 1
+                raise
+            attempt += 1
+
+    async def generate_content(self, model: str, contents: list, config: Optional[dict] = None,
+                               image_tokens: Optional[int] = None, report: Optional[CallReport] = None):
+        """
+        Await a generate_content call without blocking the event loop
+
+        Waits for room in the shared quota first; `image_tokens` (from
+        preprocessing) sharpens the reservation. 429/503 responses are retried
+        with backoff, then surface as QuotaExhausted. Each attempt is bounded
+        by GEMINI_ATTEMPT_TIMEOUT_SECONDS and the whole call by
+        GEMINI_DEADLINE_SECONDS; slow calls are hedged (see hedging.py) and
+        the counts are added to `report`.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.GEMINI_DEADLINE_SECONDS
+        reserved = estimate_request_tokens(contents, image_tokens)
+        window = self._latency(model, "call")
+        report = report or CallReport()
+
+        async def attempt(hedge: bool):
+            started = loop.time()
+            response = await self._call_once(model, contents, config, reserved, hedge)
+            window.record(loop.time() - started)
+            return response
+
+        return await self._with_retries(
+            lambda: race(attempt, window.hedge_delay(), deadline, report, self._can_hedge),
+            deadline, report,
+        )
+
+    async def generate_content_stream(self, model: str, contents: list, config: Optional[dict] = None,
+                                      image_tokens: Optional[int] = None, report: Optional[CallReport] = None):
+        """
+        Yield response chunks as the model produces them; holds a slot until the stream ends
+
+        Quota, timeouts and retries as in generate_content. Hedging and retries
+        only apply until the first chunk: once a stream has produced output it
+        is the answer, and a failure after that point is raised to the caller.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.GEMINI_DEADLINE_SECONDS
+        reserved = estimate_request_tokens(contents, image_tokens)
+        window = self._latency(model, "first_chunk")
+        report = report or CallReport()
+
+        async def open_stream(hedge: bool):
+            started = loop.time()
+            stream = self._stream_once(model, contents, config, reserved, hedge)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                return None, stream
+            except BaseException:
+                await stream.aclose()
+                raise
+            window.record(loop.time() - started)
+            return first, stream
+
+        async def close_stream(opened):
+            await opened[1].aclose()
+
+        first, stream = await self._with_retries(
+            lambda: race(open_stream, window.hedge_delay(), deadline, report, self._can_hedge, close_stream),
+            deadline, report,
+        )
+        if first is None:
+            return
+        try:
+            yield first
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    report.timeouts += 1
+                    raise DeadlineExceeded(f"Model stream not finished within {settings.GEMINI_DEADLINE_SECONDS:.0f}s")
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_latency_ms": round(self.total_latency_ms / self.completed, 1) if self.completed else 0.0,
+            "client_started": self._client is not None,
+            "base_url": settings.GEMINI_BASE_URL or "default",
+            "quota": gemini_quota.stats(),
+            "latency_p90_s": {
+                key: round(window.percentile(90), 2)
+                for key, window in self._latency_windows.items() if window.samples
+            },
+        }
+
+
+gemini_executor = GeminiExecutor(settings.GEMINI_MAX_CONCURRENCY)
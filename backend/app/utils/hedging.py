@@ -0,0 +1,153 @@
+"""
+Hedged Model Calls - deadline-aware retries and tail-latency hedging
+
+Most Gemini calls finish in a similar time, but a few take several times longer.
+Those slow calls set the latency users see on both extract endpoints. Each call
+is given an overall deadline and per-attempt timeouts, and it is retried on
+transient failures (timeouts, dropped connections, 5xx) while time remains.
+
+When a call is still running past the recent p90 latency, a duplicate (hedge)
+is sent alongside it if the worker has a free slot and spare quota. The first
+good answer wins and the other call is cancelled. A cancelled call may still be
+billed for its prompt, so every hedge, retry and abandoned call is counted in
+the caller's report and ends up in extraction_cost.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config.settings import settings
+
+
+# Errors raised by the HTTP layer under the SDK when a connection drops
+try:
+    import httpx
+    TRANSPORT_ERRORS = (httpx.TransportError,)
+except ImportError:  # pragma: no cover - httpx ships with google-genai
+    TRANSPORT_ERRORS = ()
+
+TRANSIENT_STATUS_CODES = (500, 502, 503, 504)
+
+
+class DeadlineExceeded(Exception):
+    """No answer from the model before the call's overall deadline"""
+
+
+def is_transient(error: Exception) -> bool:
+    """Failures worth another attempt: timeouts, dropped connections, server errors"""
+    if isinstance(error, asyncio.TimeoutError) or isinstance(error, TRANSPORT_ERRORS):
+        return True
+    return getattr(error, "code", None) in TRANSIENT_STATUS_CODES
+
+
+class LatencyWindow:
+    """Rolling window of recent successful call latencies (seconds)"""
+
+    def __init__(self, size: int):
+        self.samples = deque(maxlen=max(1, size))
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None until there are enough samples"""
+        if not settings.GEMINI_HEDGE_ENABLED or len(self.samples) < settings.GEMINI_HEDGE_MIN_SAMPLES:
+            return None
+        return max(settings.GEMINI_HEDGE_MIN_DELAY_SECONDS, self.percentile(settings.GEMINI_HEDGE_PERCENTILE))
+
+
+class CallReport:
+    """What it took to get one answer: attempts, retries, hedges and abandoned calls"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.abandoned = 0
+
+    def summary(self, input_cost: float) -> Dict[str, Any]:
+        """Counts for extraction_cost; abandoned calls are assumed billed for their prompt"""
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "abandoned": self.abandoned,
+            "abandoned_input_cost": round(self.abandoned * input_cost, 6),
+        }
+
+
+async def race(
+    start: Callable[[bool], Awaitable],
+    hedge_after: Optional[float],
+    deadline: float,
+    report: CallReport,
+    can_hedge: Callable[[], bool] = lambda: True,
+    discard: Optional[Callable[[Any], Awaitable]] = None,
+):
+    """
+    Run `start(False)`; if it has not answered after `hedge_after` seconds, run
+    `start(True)` alongside it and return whichever succeeds first
+
+    `deadline` is an event-loop time. The losing call is cancelled; a loser that
+    also finished is handed to `discard` (e.g. to close an open stream). Raises
+    the last error when every call fails, DeadlineExceeded when time runs out.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    pending = {asyncio.ensure_future(start(False))}
+    report.attempts += 1
+    hedge = None
+    error: Optional[BaseException] = None
+
+    try:
+        while pending:
+            now = loop.time()
+            if now >= deadline:
+                report.timeouts += 1
+                raise DeadlineExceeded(f"No model answer within {settings.GEMINI_DEADLINE_SECONDS:.0f}s")
+            timeout = deadline - now
+            if hedge_after is not None:
+                timeout = min(timeout, max(0.0, started + hedge_after - now))
+
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            winner = None
+            for task in done:
+                if task.exception() is None and winner is None:
+                    winner = task
+                elif task.exception() is not None:
+                    error = task.exception()
+                    if isinstance(error, asyncio.TimeoutError):
+                        report.timeouts += 1
+            if winner is not None:
+                if winner is hedge:
+                    report.hedge_wins += 1
+                for task in done:
+                    if task is not winner and task.exception() is None and discard is not None:
+                        await discard(task.result())
+                return winner.result()
+
+            if hedge_after is not None and loop.time() >= started + hedge_after:
+                # One hedge at most, and only while the primary is still out
+                hedge_after = None
+                if pending and can_hedge():
+                    hedge = asyncio.ensure_future(start(True))
+                    pending.add(hedge)
+                    report.hedges += 1
+                    report.attempts += 1
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+            report.abandoned += 1
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
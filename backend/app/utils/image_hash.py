@@ -0,0 +1,219 @@
+"""
+Perceptual Image Hashing - spot near-identical photos before paying for them
+
+Users often upload two or three shots of the same pack face, and every copy adds
+image tokens to the model call. Each image gets a difference hash (dHash): it is
+reduced to a tiny grayscale grid, and each bit records whether a pixel is
+brighter than its right-hand neighbour. Re-encoding, resizing and small
+exposure or framing changes flip only a few bits, so near-duplicates sit within
+a small Hamming distance of each other.
+
+Within a request, later images that are near-duplicates of earlier ones are
+dropped. Every dropped file is listed in the extraction response with the file
+it duplicates, so nothing disappears unannounced. Document pages are the
+exception: pages of one supplier template differ only in lot numbers and values
+and sit within a few bits of each other, so COA pages are only dropped on an
+exact content digest, and their hashes are used just to flag saved records. Hashes of saved images are
+stored on Product / COA records with band keys: the hash is split into 8 bands,
+and any two hashes within 7 bits share at least one band exactly. An indexed
+$in query on the bands finds the candidate records, and the exact distance is
+checked afterwards.
+
+Both pack photos and COA pages use a 16x16 grid (256 bits). On an 8x8 grid,
+different pack faces with a similar layout (flavour variants of one range) fell
+within the threshold. PDF pages, including text-layer pages that are never
+rasterized for the model, are hashed from a small render (pdf_pages).
+"""
+import asyncio
+from io import BytesIO
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image
+from app.utils.blob_store import blob_store
+from app.utils.pdf_pages import pdf_hash_images
+from app.utils.uploads import sniff_content_type
+from config.settings import settings
+
+
+# Grid edge: 16 gives a 256-bit hash
+PRODUCT_HASH_SIZE = 16
+DOCUMENT_HASH_SIZE = 16
+
+# The IMAGE_DEDUP_MAX_DISTANCE validator relies on this: changing it means re-hashing saved records
+BANDS = 8
+
+# Candidate records fetched per lookup before exact distances are checked
+MAX_CANDIDATES = 200
+
+
+class DedupResult(NamedTuple):
+    kept: List[int]  # indexes of the images to send, in order
+    dropped: List[Dict[str, Any]]  # {"image": i, "duplicate_of": j, "distance": d[, "file", "duplicate_of_file"]}
+    hashes: List[str]  # hex hash of every input image
+
+
+def dhash(img: Image.Image, size: int = PRODUCT_HASH_SIZE) -> str:
+    """Difference hash of an image as a hex string of size*size bits"""
+    gray = img.convert("L").resize((size + 1, size), Image.BILINEAR, reducing_gap=2.0)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+def hamming(a: str, b: str) -> int:
+    if len(a) != len(b):
+        return len(a) * 4
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def band_keys(hash_hex: str) -> List[str]:
+    """Exact-match keys for the bands of a hash, prefixed with hash length and band number"""
+    step = len(hash_hex) // BANDS
+    return [f"{len(hash_hex)}:{i}:{hash_hex[i * step:(i + 1) * step]}" for i in range(BANDS)]
+
+
+def distance_matrix(hashes: Sequence[str]) -> np.ndarray:
+    """Pairwise Hamming distances between equal-size hashes"""
+    bits = np.unpackbits(np.array([list(bytes.fromhex(h)) for h in hashes], dtype=np.uint8), axis=1)
+    return (bits[:, None, :] != bits[None, :, :]).sum(axis=2)
+
+
+def hash_hex_length(size: int) -> int:
+    return size * size // 4
+
+
+def dedupe_images(images: Sequence[Image.Image], size: int = PRODUCT_HASH_SIZE,
+                  max_distance: Optional[int] = None, names: Optional[Sequence[str]] = None,
+                  digests: Optional[Sequence[str]] = None) -> DedupResult:
+    """
+    Keep the first of every group of near-identical images; `names` label the dropped ones
+
+    With `digests` (one content digest per image) only exact duplicates are
+    dropped; the hashes are still returned for the saved-record lookup.
+    """
+    max_distance = settings.IMAGE_DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+    hashes = [dhash(img, size) for img in images]
+    if len(hashes) < 2:
+        return DedupResult(list(range(len(hashes))), [], hashes)
+
+    distances = distance_matrix(hashes)
+    kept, dropped = [], []
+    for index in range(len(hashes)):
+        if digests is not None:
+            match = next((k for k in kept if digests[k] == digests[index]), None)
+        else:
+            match = next((k for k in kept if distances[index, k] <= max_distance), None)
+        if match is None:
+            kept.append(index)
+        else:
+            entry = {"image": index, "duplicate_of": match, "distance": int(distances[index, match])}
+            if names:
+                entry["file"] = names[index]
+                entry["duplicate_of_file"] = names[match]
+            dropped.append(entry)
+    return DedupResult(kept, dropped, hashes)
+
+
+def dedup_signature(exact: bool = False) -> str:
+    """Part of the cache key, since the dedup grid and threshold decide which images are sent"""
+    if not settings.IMAGE_DEDUP_ENABLED:
+        return ""
+    if exact:
+        return "-dedupexact"
+    return f"-dedup{PRODUCT_HASH_SIZE}x{settings.IMAGE_DEDUP_MAX_DISTANCE}"
+
+
+def decode_image(value: str) -> Optional[Image.Image]:
+    """Image behind a data URL or blob reference, or None if it is not a decodable image"""
+    data = blob_store.load(value)
+    if not data:
+        return None
+    try:
+        return Image.open(BytesIO(data))
+    except (OSError, ValueError):
+        return None
+
+
+def stored_image_hashes(images: Sequence[str], size: int = PRODUCT_HASH_SIZE) -> Dict[str, List[str]]:
+    """image_hashes / image_hash_bands fields for a record's saved images (one hash per PDF page)"""
+    hashes = []
+    for value in images or []:
+        data = blob_store.load(value)
+        if not data:
+            continue
+        if sniff_content_type(data[:16]) == "application/pdf":
+            try:
+                hashes.extend(dhash(page, size) for page in pdf_hash_images(data))
+            except Exception as e:
+                print(f"[WARNING] Could not hash PDF pages: {e}")
+            continue
+        img = decode_image(value)
+        if img is not None:
+            hashes.append(dhash(img, size))
+    bands = sorted({key for h in hashes for key in band_keys(h)})
+    return {"image_hashes": hashes, "image_hash_bands": bands}
+
+
+async def find_stored_duplicates(document, hashes: Sequence[str], label_field: str,
+                                 max_distance: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Saved records holding an image near-identical to one of `hashes`
+
+    Returns one entry per (image, record) pair, closest first:
+    {"image": i, "id", "label", "distance"}.
+    """
+    max_distance = settings.IMAGE_DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+    keys = sorted({key for h in hashes for key in band_keys(h)})
+    if not keys:
+        return []
+
+    cursor = document.get_motor_collection().find(
+        {"image_hash_bands": {"$in": keys}},
+        {"image_hashes": 1, label_field: 1},
+    ).limit(MAX_CANDIDATES)
+
+    matches = []
+    async for record in cursor:
+        for index, hash_hex in enumerate(hashes):
+            distances = [hamming(hash_hex, stored) for stored in record.get("image_hashes", [])]
+            if distances and min(distances) <= max_distance:
+                matches.append({
+                    "image": index,
+                    "id": str(record["_id"]),
+                    "label": record.get(label_field),
+                    "distance": min(distances),
+                })
+    matches.sort(key=lambda m: (m["distance"], m["image"]))
+    return matches
+
+
+async def screen_images(images: List[Image.Image], document, label_field: str,
+                        size: int = PRODUCT_HASH_SIZE,
+                        names: Optional[Sequence[str]] = None,
+                        digests: Optional[Sequence[str]] = None) -> Tuple[List[Image.Image], dict]:
+    """
+    Drop near-duplicate images and look up saved records showing the same images
+
+    Returns (images to send, report). The report lists the `kept` indexes,
+    dropped images (with their `names`), `matches` against saved records and
+    the hashes, so the UI can say what was skipped and offer to reuse an
+    existing record. With `digests` only exact duplicates are dropped (see
+    dedupe_images). A failed lookup only skips the matches.
+    """
+    if not settings.IMAGE_DEDUP_ENABLED or not images:
+        return images, {"enabled": False, "kept": list(range(len(images))), "dropped": [], "matches": []}
+
+    result = await asyncio.to_thread(dedupe_images, images, size, None, names, digests)
+    try:
+        matches = await find_stored_duplicates(document, result.hashes, label_field)
+    except Exception as e:
+        print(f"[WARNING] Duplicate lookup failed: {e}")
+        matches = []
+
+    return [images[i] for i in result.kept], {
+        "enabled": True,
+        "kept": result.kept,
+        "dropped": result.dropped,
+        "matches": matches,
+        "hashes": result.hashes,
+    }
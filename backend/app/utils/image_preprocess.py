@@ -0,0 +1,223 @@
+"""
+Image Preprocessing - shrink uploads to what the model actually needs
+
+Phone photos arrive at 12 MP or more, and Gemini bills images by 768px tile, so
+sending them as-is inflates prompt tokens, upload size and latency. Each image is
+EXIF-rotated, optionally trimmed of uniform borders, downscaled to IMAGE_MAX_EDGE
+and re-encoded as JPEG before it is sent.
+
+In "regions" crop mode (product labels) a photo is instead sent as one
+low-resolution overview plus full-detail crops of its text-dense regions (see
+label_regions), whenever that is estimated to cost fewer tokens than the whole
+image; "full" keeps the whole-image path for accuracy comparisons.
+"""
+import math
+import time
+from io import BytesIO
+from typing import List, Tuple
+from PIL import Image, ImageChops, ImageOps
+from google.genai import types
+from app.utils.label_regions import detect_text_regions
+from config.settings import settings
+
+
+# Gemini 2.x image tokenization: small images are a flat 258 tokens,
+# larger ones are tiled into 768x768 crops of 258 tokens each
+SMALL_IMAGE_EDGE = 384
+TILE_EDGE = 768
+TOKENS_PER_TILE = 258
+
+BORDER_TOLERANCE = 12
+BORDER_MARGIN = 8
+
+CROP_MODES = ("full", "regions")
+
+# Above this share of the photo the crops are not worth the extra parts
+REGION_MAX_COVERAGE = 0.6
+# A crop edge this far past a tile boundary is shrunk back onto it
+TILE_SNAP_TOLERANCE = 0.15
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Approximate prompt tokens Gemini charges for an image of this size"""
+    if width <= SMALL_IMAGE_EDGE and height <= SMALL_IMAGE_EDGE:
+        return TOKENS_PER_TILE
+    return math.ceil(width / TILE_EDGE) * math.ceil(height / TILE_EDGE) * TOKENS_PER_TILE
+
+
+def preprocess_signature(crop_mode: str = "full") -> str:
+    """Identifies the preprocessing settings, so cached results are not shared across them"""
+    if not settings.IMAGE_PREPROCESS_ENABLED:
+        return "raw"
+    signature = (
+        f"edge{settings.IMAGE_MAX_EDGE}-q{settings.IMAGE_JPEG_QUALITY}"
+        f"-crop{int(settings.IMAGE_CROP_BORDERS)}"
+    )
+    if crop_mode == "regions":
+        signature += f"-regions{settings.IMAGE_MAX_REGIONS}-ov{settings.IMAGE_OVERVIEW_EDGE}"
+    return signature
+
+
+def crop_uniform_border(img: Image.Image) -> Image.Image:
+    """Trim a solid-colour frame (scanner bed, table top) around the content"""
+    rgb = img.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    diff = ImageChops.difference(rgb, background)
+    diff = ImageChops.add(diff, diff, 2.0, -BORDER_TOLERANCE)
+    bbox = diff.getbbox()
+    if not bbox:
+        return img
+
+    left, top, right, bottom = bbox
+    left = max(0, left - BORDER_MARGIN)
+    top = max(0, top - BORDER_MARGIN)
+    right = min(img.width, right + BORDER_MARGIN)
+    bottom = min(img.height, bottom + BORDER_MARGIN)
+
+    # Only crop when it removes a meaningful frame
+    if (right - left) * (bottom - top) > 0.95 * img.width * img.height:
+        return img
+    return img.crop((left, top, right, bottom))
+
+
+def to_rgb(img: Image.Image) -> Image.Image:
+    """Flatten transparency onto white so JPEG encoding keeps labels legible"""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        flattened = Image.new("RGB", rgba.size, (255, 255, 255))
+        flattened.paste(rgba, mask=rgba.split()[-1])
+        return flattened
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    return img
+
+
+def encode_jpeg(img: Image.Image) -> bytes:
+    buffer = BytesIO()
+    to_rgb(img).save(buffer, format="JPEG", quality=settings.IMAGE_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def fit(img: Image.Image, max_edge: int) -> Image.Image:
+    if max(img.size) > max_edge:
+        img = img.copy()
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return img
+
+
+def rescale(img: Image.Image, scale: float) -> Image.Image:
+    if scale >= 1.0:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.LANCZOS)
+
+
+def snap_to_tiles(img: Image.Image) -> Image.Image:
+    """Shrink a crop slightly when an edge just spills into another row/column of tiles"""
+    factor = 1.0
+    for edge in img.size:
+        whole = (math.ceil(edge / TILE_EDGE) - 1) * TILE_EDGE
+        if whole and edge <= whole * (1 + TILE_SNAP_TOLERANCE):
+            factor = min(factor, whole / edge)
+    return rescale(img, factor)
+
+
+def preprocess_image(img: Image.Image, crop_mode: str = "full") -> Tuple[list, dict]:
+    """Orient, crop, downscale and re-encode a single image; returns its model parts"""
+    timing = {}
+    original_size = img.size
+
+    started = time.perf_counter()
+    img = ImageOps.exif_transpose(img)
+    timing["orient_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    if settings.IMAGE_CROP_BORDERS:
+        img = crop_uniform_border(img)
+    timing["crop_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    regions = detect_text_regions(img, settings.IMAGE_MAX_REGIONS) if crop_mode == "regions" else []
+    timing["detect_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    scale = min(1.0, settings.IMAGE_MAX_EDGE / max(img.size))
+    full_tokens = estimate_image_tokens(round(img.width * scale), round(img.height * scale))
+    images = None
+    if regions:
+        overview = fit(img, settings.IMAGE_OVERVIEW_EDGE)
+        # Crops keep the pixel density of the full-image path, so small print is just as legible
+        crops = [snap_to_tiles(rescale(img.crop(box), scale)) for box in regions]
+        region_tokens = estimate_image_tokens(*overview.size) + sum(estimate_image_tokens(*c.size) for c in crops)
+        region_area = sum((r - l) * (b - t) for l, t, r, b in regions)
+        if region_tokens < full_tokens and region_area <= REGION_MAX_COVERAGE * img.width * img.height:
+            images = [overview] + crops
+        else:
+            regions = []
+    if images is None:
+        images = [fit(img, settings.IMAGE_MAX_EDGE)]
+    timing["resize_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    encoded = [encode_jpeg(image) for image in images]
+    timing["encode_ms"] = (time.perf_counter() - started) * 1000
+
+    parts = [types.Part.from_bytes(data=data, mime_type="image/jpeg") for data in encoded]
+    stats = {
+        "original_size": list(original_size),
+        "processed_size": list(images[0].size),
+        "bytes": sum(len(data) for data in encoded),
+        "estimated_tokens_before": estimate_image_tokens(*original_size),
+        "estimated_tokens_after": sum(estimate_image_tokens(*image.size) for image in images),
+        **{k: round(v, 2) for k, v in timing.items()},
+    }
+    if regions:
+        stats["regions"] = [list(box) for box in regions]
+        stats["full_image_tokens"] = full_tokens
+    return parts, stats
+
+
+def preprocess_images(pil_images: List[Image.Image], crop_mode: str = "full") -> Tuple[list, dict]:
+    """
+    Prepare model inputs for a list of images
+
+    Returns (contents, report). When preprocessing is disabled the images are
+    passed through untouched and only the token estimate is reported. Photos
+    sent as regions are introduced by a short text part so the model knows the
+    crops belong to the overview before them.
+    """
+    started = time.perf_counter()
+
+    if not settings.IMAGE_PREPROCESS_ENABLED:
+        estimate = sum(estimate_image_tokens(*img.size) for img in pil_images)
+        return list(pil_images), {
+            "enabled": False,
+            "estimated_tokens_before": estimate,
+            "estimated_tokens_after": estimate,
+        }
+
+    parts = []
+    images = []
+    for number, img in enumerate(pil_images, start=1):
+        image_parts, stats = preprocess_image(img, crop_mode)
+        if "regions" in stats:
+            parts.append(
+                f"Photo {number}: reduced overview, then {len(stats['regions'])} "
+                f"detail crop(s) of its text areas"
+            )
+        parts.extend(image_parts)
+        images.append(stats)
+
+    stage_totals = {
+        key: round(sum(s[key] for s in images), 2)
+        for key in ("orient_ms", "crop_ms", "detect_ms", "resize_ms", "encode_ms")
+    }
+    return parts, {
+        "enabled": True,
+        "crop_mode": crop_mode,
+        "images": images,
+        "timing": {**stage_totals, "total_ms": round((time.perf_counter() - started) * 1000, 2)},
+        "bytes_after": sum(s["bytes"] for s in images),
+        "estimated_tokens_before": sum(s["estimated_tokens_before"] for s in images),
+        "estimated_tokens_after": sum(s["estimated_tokens_after"] for s in images),
+    }
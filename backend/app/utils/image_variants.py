@@ -0,0 +1,158 @@
+"""
+Image Variants - thumbnail and medium derivatives of stored images
+
+Grids, previews and the compare export only show images at a few hundred
+pixels, yet they used to download and decode the full-size originals. When a
+product or COA image is saved, a "thumb" (IMAGE_THUMB_EDGE) and a "medium"
+(IMAGE_MEDIUM_EDGE) JPEG are rendered next to the original blob. The API then
+returns the variant that fits each view.
+
+Rendering runs in a process pool, off the request path: saves return at once,
+and the work spreads across cores without contending for the GIL. A variant
+that is requested before it exists (a fresh save, or an image stored before
+variants existed) is rendered on demand, and concurrent requests for it share
+one render. PDFs have no variants, so their original is served instead.
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+from PIL import Image, ImageOps
+from app.utils.blob_store import blob_store, parse_ref, REF_PREFIX
+from config.settings import settings
+
+
+VARIANTS = ("thumb", "medium")
+VARIANT_QUALITY = 82
+
+
+def variant_edge(variant: str) -> int:
+    return settings.IMAGE_THUMB_EDGE if variant == "thumb" else settings.IMAGE_MEDIUM_EDGE
+
+
+def variant_path(sha256: str, variant: str) -> str:
+    return f"{blob_store.path(sha256)}.{variant}.jpg"
+
+
+def variant_ref(value: str, variant: str) -> str:
+    """URL of a variant of a stored image; data URLs and other values are returned unchanged"""
+    sha256 = parse_ref(value)
+    if not sha256 or value.endswith(".pdf"):
+        return value
+    return f"{REF_PREFIX}{variant}/{sha256}.jpg"
+
+
+def variant_urls(values: Sequence[str]) -> Dict[str, List[str]]:
+    """{"thumb": [...], "medium": [...]} for a record's images, in the same order"""
+    return {variant: [variant_ref(value, variant) for value in values or []] for variant in VARIANTS}
+
+
+def render_variants(source: str, targets: Dict[str, int]) -> List[str]:
+    """Process-pool task: write a JPEG no larger than `edge` for each target path"""
+    written = []
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.split()[-1])
+        else:
+            img = img.convert("RGB")
+
+        # Largest first, so each smaller variant is resized from the previous one
+        for path, edge in sorted(targets.items(), key=lambda item: -item[1]):
+            img.thumbnail((edge, edge), Image.LANCZOS)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    img.save(f, format="JPEG", quality=VARIANT_QUALITY, optimize=True, progressive=True)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            written.append(path)
+    return written
+
+
+class VariantRenderer:
+    """Renders variants in a process pool; one render per blob at a time"""
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._background: set = set()
+        self.rendered = 0
+        self.failed = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that already runs motor/uvicorn threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _missing(self, sha256: str) -> Dict[str, int]:
+        return {
+            variant_path(sha256, variant): variant_edge(variant)
+            for variant in VARIANTS
+            if not os.path.isfile(variant_path(sha256, variant))
+        }
+
+    async def _render(self, sha256: str):
+        targets = await asyncio.to_thread(self._missing, sha256)
+        if not targets:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._get_pool(), render_variants, blob_store.path(sha256), targets)
+            self.rendered += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"[WARNING] Image variants failed for {sha256[:12]}: {e}")
+
+    def render(self, sha256: str) -> asyncio.Future:
+        """Start (or join) rendering the variants of one blob"""
+        future = self._pending.get(sha256)
+        if future is None:
+            future = asyncio.ensure_future(self._render(sha256))
+            self._pending[sha256] = future
+            future.add_done_callback(lambda _: self._pending.pop(sha256, None))
+        return future
+
+    def schedule(self, values: Sequence[str]):
+        """Render variants for newly saved images in the background"""
+        for value in values or []:
+            sha256 = parse_ref(value)
+            if sha256 and not value.endswith(".pdf"):
+                task = self.render(sha256)
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+
+    async def path(self, sha256: str, variant: str) -> Optional[str]:
+        """File of a variant, rendering it first if needed; None if it cannot be made"""
+        path = variant_path(sha256, variant)
+        if not await asyncio.to_thread(os.path.isfile, path):
+            await asyncio.shield(self.render(sha256))
+        return path if await asyncio.to_thread(os.path.isfile, path) else None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": len(self._pending),
+            "rendered": self.rendered,
+            "failed": self.failed,
+        }
+
+
+image_variants = VariantRenderer(settings.IMAGE_VARIANT_WORKERS)
@@ -0,0 +1,341 @@
+"""
+Extraction Job Queue - Mongo-backed background extraction with stage progress
+
+Jobs are persisted in the extraction_jobs collection and claimed by worker tasks
+with an atomic find_one_and_update plus a renewable lease, so any uvicorn worker
+can pick up a job and a crashed or restarted worker's jobs are retried.
+
+A job that stalls on the shared model quota is not failed: it goes back to the
+queue with `run_after` set to when quota should be available. Those waits do
+not count as attempts, but are counted in `quota_waits`: a job the provider
+keeps rate limiting (e.g. a spent daily quota) fails after
+EXTRACTION_JOB_MAX_QUOTA_WAITS of them. Finished jobs are removed by a TTL
+index on `finished_at` (EXTRACTION_JOB_TTL_SECONDS).
+"""
+import asyncio
+import os
+import random
+import re
+import shutil
+import socket
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from beanie import PydanticObjectId
+from pymongo import ReturnDocument
+from app.models.extraction_job import ExtractionJob
+from app.utils.quota import QuotaExhausted
+from config.settings import settings
+
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+# Floor on the requeue delay after a quota stall, so a burst does not spin
+QUOTA_REQUEUE_MIN_SECONDS = 5.0
+
+# kind -> coroutine handler(files: List[(filename, bytes)], progress, **options) -> (result, cost)
+JOB_HANDLERS: Dict[str, Callable] = {}
+
+
+def register_job_handler(kind: str, handler: Callable):
+    """Register the pipeline that runs jobs of the given kind"""
+    JOB_HANDLERS[kind] = handler
+
+
+def job_links(job: ExtractionJob) -> dict:
+    job_id = str(job.id)
+    return {
+        "job_id": job_id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job_id}",
+        "result_url": f"/api/jobs/{job_id}/result",
+        "events_url": f"/api/jobs/{job_id}/events",
+    }
+
+
+def job_status(job: ExtractionJob) -> dict:
+    return {
+        "job_id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "error": job.error,
+        "attempts": job.attempts,
+        "quota_waits": job.quota_waits,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+    }
+
+
+def _safe_filename(filename: Optional[str]) -> str:
+    name = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.basename(filename or ""))
+    return name or "upload"
+
+
+class ExtractionJobQueue:
+    """Pool of asyncio worker tasks draining the extraction_jobs collection"""
+
+    def __init__(self, workers: int, poll_seconds: float, lease_seconds: int, max_attempts: int,
+                 max_quota_waits: int):
+        self.workers = max(0, workers)
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_quota_waits = max_quota_waits
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    async def start(self):
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        os.makedirs(os.path.join(settings.UPLOAD_DIR, "jobs"), exist_ok=True)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"[OK] Extraction job workers started: {self.workers}")
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        print("[*] Extraction job workers stopped")
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------
+    def _job_dir(self, job_id) -> str:
+        return os.path.join(settings.UPLOAD_DIR, "jobs", str(job_id))
+
+    def _write_files(self, job_dir: str, files: List[Tuple[str, str, bytes]]) -> List[dict]:
+        os.makedirs(job_dir, exist_ok=True)
+        stored = []
+        for idx, (filename, content_type, content) in enumerate(files):
+            path = os.path.join(job_dir, f"{idx:02d}_{_safe_filename(filename)}")
+            with open(path, "wb") as f:
+                f.write(content)
+            stored.append({
+                "filename": filename,
+                "content_type": content_type,
+                "path": path,
+                "size": len(content),
+            })
+        return stored
+
+    def _read_files(self, files: List[dict]) -> List[Tuple[str, bytes]]:
+        loaded = []
+        for entry in files:
+            with open(entry["path"], "rb") as f:
+                loaded.append((entry["filename"], f.read()))
+        return loaded
+
+    async def submit(self, kind: str, files: List[Tuple[str, str, bytes]], user,
+                     options: Optional[dict] = None) -> ExtractionJob:
+        """Persist uploaded files and queue a job; returns as soon as it is stored"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown extraction job kind: {kind}")
+
+        now = datetime.utcnow()
+        job = ExtractionJob(
+            id=PydanticObjectId(),
+            kind=kind,
+            created_by=str(user.id),
+            options=options or {},
+            progress=[{"stage": "queued", "at": now.isoformat()}],
+            created_at=now,
+            updated_at=now,
+        )
+        job.files = await asyncio.to_thread(self._write_files, self._job_dir(job.id), files)
+        await job.insert()
+
+        self._wake()
+        return job
+
+    # ------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------
+    async def _claim(self) -> Optional[ExtractionJob]:
+        now = datetime.utcnow()
+        collection = ExtractionJob.get_motor_collection()
+
+        # Jobs whose workers keep dying are failed instead of retried forever
+        await collection.update_many(
+            {"status": "running", "lease_expires_at": {"$lt": now}, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {
+                "status": "failed",
+                "stage": "failed",
+                "error": "Job abandoned after repeated worker failures",
+                "finished_at": now,
+                "updated_at": now,
+            }}
+        )
+
+        doc = await collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_after": {"$not": {"$gt": now}}},
+                {"status": "running", "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                    "updated_at": now,
+                    "run_after": None,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return ExtractionJob.model_validate(doc) if doc else None
+
+    async def _wait_for_work(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self, index: int):
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] Job worker {index} failed to claim a job: {e}")
+                job = None
+
+            if job is None:
+                await self._wait_for_work()
+                continue
+
+            await self._run(job)
+
+    async def _heartbeat(self, job_id):
+        collection = ExtractionJob.get_motor_collection()
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await collection.update_one(
+                {"_id": job_id, "worker_id": self.worker_id, "status": "running"},
+                {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+            )
+
+    async def record_progress(self, job_id, stage: str, detail: Optional[dict] = None):
+        now = datetime.utcnow()
+        entry = {"stage": stage, "at": now.isoformat()}
+        if detail:
+            entry.update(detail)
+        update = {"updated_at": now}
+        # Partial results are appended to the log but do not replace the current stage
+        if stage != "partial":
+            update["stage"] = stage
+        await ExtractionJob.get_motor_collection().update_one(
+            {"_id": job_id},
+            {"$set": update, "$push": {"progress": entry}}
+        )
+
+    async def _finish(self, job: ExtractionJob, status: str, result=None, cost=None, error=None):
+        now = datetime.utcnow()
+        outcome = await ExtractionJob.get_motor_collection().update_one(
+            {"_id": job.id, "worker_id": self.worker_id},
+            {
+                "$set": {
+                    "status": status,
+                    "stage": status,
+                    "result": result,
+                    "cost": cost,
+                    "error": error,
+                    "lease_expires_at": None,
+                    "finished_at": now,
+                    "updated_at": now,
+                },
+                "$push": {"progress": {"stage": status, "at": now.isoformat()}},
+            }
+        )
+        # No match: the lease expired and another worker now owns the job and its files
+        if outcome.matched_count != 1:
+            print(f"[WARNING] {job.kind} job {job.id} was reclaimed by another worker; keeping its files")
+            return
+        await asyncio.to_thread(shutil.rmtree, self._job_dir(job.id), True)
+
+    async def _requeue_for_quota(self, job: ExtractionJob, error: QuotaExhausted):
+        """Put a job back in the queue until quota should be available again, or fail it after too many waits"""
+        if job.quota_waits >= self.max_quota_waits:
+            print(f"[ERROR] {job.kind} job {job.id} failed after {job.quota_waits} quota waits")
+            await self._finish(
+                job, "failed",
+                error=f"QuotaExhausted: model quota still unavailable after {job.quota_waits} waits: {error}"
+            )
+            return
+        delay = max(QUOTA_REQUEUE_MIN_SECONDS, error.retry_after) * random.uniform(1.0, 1.2)
+        now = datetime.utcnow()
+        await ExtractionJob.get_motor_collection().update_one(
+            {"_id": job.id, "worker_id": self.worker_id},
+            {
+                "$set": {
+                    "status": "queued",
+                    "stage": "waiting_for_quota",
+                    "lease_expires_at": None,
+                    "run_after": now + timedelta(seconds=delay),
+                    "updated_at": now,
+                },
+                # A quota stall is not a worker failure: do not use up an attempt
+                "$inc": {"attempts": -1, "quota_waits": 1},
+                "$push": {"progress": {"stage": "waiting_for_quota", "at": now.isoformat(),
+                                       "retry_after": round(delay, 1)}},
+            }
+        )
+
+    async def _run(self, job: ExtractionJob):
+        print(f"[JOB] {self.worker_id} running {job.kind} job {job.id} (attempt {job.attempts})")
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+
+        async def progress(stage: str, detail: Optional[dict] = None):
+            await self.record_progress(job.id, stage, detail)
+
+        try:
+            handler = JOB_HANDLERS[job.kind]
+            files = await asyncio.to_thread(self._read_files, job.files)
+            await progress("loading", {"files": len(files)})
+            result, cost = await handler(files, progress, **job.options)
+            await self._finish(job, "succeeded", result=result, cost=cost)
+            print(f"[JOB] {job.kind} job {job.id} succeeded")
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so another worker picks it up right away
+            await ExtractionJob.get_motor_collection().update_one(
+                {"_id": job.id, "worker_id": self.worker_id},
+                {"$set": {"status": "queued", "stage": "queued", "lease_expires_at": None}}
+            )
+            raise
+        except QuotaExhausted as e:
+            print(f"[JOB] {job.kind} job {job.id} waiting for model quota: {e}")
+            await self._requeue_for_quota(job, e)
+        except Exception as e:
+            print(f"[ERROR] {job.kind} job {job.id} failed: {type(e).__name__}: {e}")
+            traceback.print_exc()
+            await self._finish(job, "failed", error=f"{type(e).__name__}: {str(e)}")
+        finally:
+            heartbeat.cancel()
+
+
+extraction_jobs = ExtractionJobQueue(
+    workers=settings.EXTRACTION_JOB_WORKERS,
+    poll_seconds=settings.EXTRACTION_JOB_POLL_SECONDS,
+    lease_seconds=settings.EXTRACTION_JOB_LEASE_SECONDS,
+    max_attempts=settings.EXTRACTION_JOB_MAX_ATTEMPTS,
+    max_quota_waits=settings.EXTRACTION_JOB_MAX_QUOTA_WAITS,
+)
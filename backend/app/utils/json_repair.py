@@ -0,0 +1,370 @@
+"""
+Model JSON Repair - salvage truncated or malformed model output and re-ask only what is missing
+
+When a response is cut off (or breaks mid-document) the strict parser rejects the
+whole answer. The tolerant parser here keeps every value that was completely
+received: objects keep their finished members, arrays keep their finished
+elements, and parsing stops at the first point it cannot make sense of (the
+"cut path"). Trailing commas, Python literals and raw newlines inside strings
+are accepted along the way.
+
+The extraction prompts describe their output as a JSON template. Sections of that
+template (root keys, or the keys of a split object such as parent_product) that
+were cut or never arrived are requested again in one small follow-up call that
+reuses the same inputs but asks for just those keys, so the retry pays for a
+fraction of the output tokens instead of a full extraction. Long arrays that
+were cut part-way (child variants, COA nutrient rows) are continued: the model
+is told which entries it already returned and only the rest are appended.
+"""
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from app.utils.fast_json import dumps_str, loads, JSONDecodeError
+from app.utils.gemini import gemini_executor, clean_model_json
+from app.utils.hedging import CallReport
+
+
+Path = Tuple[Any, ...]
+
+WHITESPACE = " \t\r\n"
+
+# Body of a JSON string after its opening quote, up to and including the closing quote
+STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+
+# A bare token: number or literal
+BARE_TOKEN = re.compile(r'[^\s,:\]\}"]+')
+
+LITERALS = {
+    "true": True, "false": False, "null": None,
+    "True": True, "False": False, "None": None,
+    "NaN": None, "undefined": None,
+}
+
+MISSING = object()
+
+REASK_PROMPT = """{prompt}
+
+FOLLOW-UP REQUEST:
+An earlier answer for these same documents was cut off. Do NOT return the whole structure again.
+Return ONLY the JSON object below, filled in following the rules above:
+{skeleton}
+{continuations}"""
+
+
+class SalvagedJSON(NamedTuple):
+    data: Optional[dict]
+    cut_path: Optional[Path]  # where parsing stopped; None if the root object closed
+
+
+class RecoveredJSON(NamedTuple):
+    data: dict
+    salvaged_sections: int
+    reasked: List[str]
+    unresolved: List[str]
+    prompt_tokens: int
+    output_tokens: int
+
+    def summary(self, followup_cost: float) -> dict:
+        return {
+            "salvaged_sections": self.salvaged_sections,
+            "reasked": self.reasked,
+            "unresolved": self.unresolved,
+            "followup_cost": followup_cost,
+        }
+
+
+class _Stop(Exception):
+    """Parsing cannot continue; `partial` is what the failing container had so far"""
+
+    def __init__(self, partial=None):
+        self.partial = partial
+
+
+class _Salvager:
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.cut_path: Optional[Path] = None
+
+    def _stop(self, path: Path):
+        if self.cut_path is None:
+            self.cut_path = path
+        raise _Stop()
+
+    def _skip_whitespace(self):
+        text, pos = self.text, self.pos
+        while pos < len(text) and text[pos] in WHITESPACE:
+            pos += 1
+        self.pos = pos
+
+    def _string(self, path: Path) -> str:
+        match = STRING_BODY.match(self.text, self.pos + 1)
+        if match is None:
+            self._stop(path)
+        token = self.text[self.pos:match.end()]
+        self.pos = match.end()
+        try:
+            return loads(token)
+        except JSONDecodeError:
+            pass
+        # Raw control characters (unescaped newlines) are the usual culprit
+        try:
+            return loads(re.sub(r"[\x00-\x1f]", lambda m: "\\u%04x" % ord(m.group()), token))
+        except JSONDecodeError:
+            self._stop(path)
+
+    def _bare(self, path: Path):
+        match = BARE_TOKEN.match(self.text, self.pos)
+        # A token touching the end of the text may itself be cut ("4.5" of "4.57")
+        if match is None or match.end() >= len(self.text):
+            self._stop(path)
+        token = match.group()
+        self.pos = match.end()
+        if token in LITERALS:
+            return LITERALS[token]
+        try:
+            return loads(token)
+        except JSONDecodeError:
+            self._stop(path)
+
+    def value(self, path: Path):
+        self._skip_whitespace()
+        if self.pos >= len(self.text):
+            self._stop(path)
+        char = self.text[self.pos]
+        if char == "{":
+            return self._object(path)
+        if char == "[":
+            return self._array(path)
+        if char == '"':
+            return self._string(path)
+        return self._bare(path)
+
+    def _object(self, path: Path) -> dict:
+        self.pos += 1
+        result = {}
+        key = None
+        try:
+            while True:
+                self._skip_whitespace()
+                if self.pos >= len(self.text):
+                    self._stop(path)
+                char = self.text[self.pos]
+                if char == "}":
+                    self.pos += 1
+                    return result
+                if char == ",":
+                    self.pos += 1
+                    continue
+                if char != '"':
+                    self._stop(path)
+                key = self._string(path)
+                self._skip_whitespace()
+                if self.text[self.pos:self.pos + 1] != ":":
+                    self._stop(path)
+                self.pos += 1
+                result[key] = self.value(path + (key,))
+                key = None
+        except _Stop as stop:
+            # Keep finished parts of a cut container member; drop cut scalars
+            if key is not None and stop.partial:
+                result[key] = stop.partial
+            raise _Stop(result)
+
+    def _array(self, path: Path) -> list:
+        self.pos += 1
+        result = []
+        try:
+            while True:
+                self._skip_whitespace()
+                if self.pos >= len(self.text):
+                    self._stop(path)
+                char = self.text[self.pos]
+                if char == "]":
+                    self.pos += 1
+                    return result
+                if char == ",":
+                    self.pos += 1
+                    continue
+                result.append(self.value(path + (len(result),)))
+        except _Stop:
+            # Elements are all-or-nothing: a half nutrient row is worse than none
+            raise _Stop(result)
+
+
+def salvage_json(text: str) -> SalvagedJSON:
+    """Parse the first JSON object in `text`, keeping everything received before a cut or error"""
+    text = text or ""
+    start = text.find("{")
+    if start == -1:
+        return SalvagedJSON(None, ())
+    salvager = _Salvager(text)
+    salvager.pos = start
+    try:
+        return SalvagedJSON(salvager.value(()), None)
+    except _Stop as stop:
+        return SalvagedJSON(stop.partial if isinstance(stop.partial, dict) else {}, salvager.cut_path or ())
+
+
+def response_template(prompt: str) -> dict:
+    """The JSON STRUCTURE example of an extraction prompt"""
+    return salvage_json(prompt[prompt.index("JSON STRUCTURE:"):]).data
+
+
+def template_sections(template: dict, split: Sequence[str] = ()) -> List[Path]:
+    """Re-askable sections: root keys, with the keys listed in `split` broken into their members"""
+    sections = []
+    for key, value in template.items():
+        if key in split and isinstance(value, dict):
+            sections.extend((key, member) for member in value)
+        else:
+            sections.append((key,))
+    return sections
+
+
+def get_path(data, path: Path):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return MISSING
+        data = data[key]
+    return data
+
+
+def set_path(data: dict, path: Path, value):
+    for key in path[:-1]:
+        if not isinstance(data.get(key), dict):
+            data[key] = {}
+        data = data[key]
+    data[path[-1]] = value
+
+
+def section_name(path: Path) -> str:
+    return ".".join(str(key) for key in path)
+
+
+def sections_to_reask(salvaged: SalvagedJSON, sections: List[Path]) -> List[Path]:
+    """
+    Sections the cut went through, plus sections that never arrived
+
+    A missing section only counts when its parent object was itself cut; keys
+    absent from an object that closed normally were left out by the model.
+    """
+    if salvaged.cut_path is None:
+        return []
+    cut = salvaged.cut_path
+    return [
+        section for section in sections
+        if cut[:len(section)] == section
+        or (cut[:len(section) - 1] == section[:-1] and get_path(salvaged.data, section) is MISSING)
+    ]
+
+
+def build_reask_prompt(prompt: str, template: dict, sections: List[Path], data: dict,
+                       continue_keys: Dict[Path, str]) -> str:
+    skeleton = {}
+    continuations = []
+    for section in sections:
+        set_path(skeleton, section, get_path(template, section))
+        item_key = continue_keys.get(section)
+        existing = get_path(data, section)
+        if item_key and isinstance(existing, list) and existing:
+            names = [item.get(item_key) for item in existing if isinstance(item, dict)]
+            continuations.append(
+                f'"{section_name(section)}": these entries were already returned, '
+                f"list ONLY the remaining ones: {dumps_str(names)}"
+            )
+    return REASK_PROMPT.format(
+        prompt=prompt,
+        skeleton=dumps_str(skeleton, indent=True),
+        continuations="\n".join(continuations),
+    )
+
+
+def merge_reask(data: dict, followup: SalvagedJSON, sections: List[Path],
+                continue_keys: Dict[Path, str]) -> List[str]:
+    """Merge follow-up sections into the salvaged data; returns the sections still unresolved"""
+    unresolved = []
+    for section in sections:
+        value = get_path(followup.data, section)
+        cut = followup.cut_path is not None and followup.cut_path[:len(section)] == section
+        if value is MISSING:
+            unresolved.append(section_name(section))
+            continue
+
+        item_key = continue_keys.get(section)
+        existing = get_path(data, section)
+        if item_key and isinstance(existing, list) and isinstance(value, list):
+            seen = {item.get(item_key) for item in existing if isinstance(item, dict)}
+            value = existing + [
+                item for item in value
+                if not (isinstance(item, dict) and item.get(item_key) in seen)
+            ]
+        elif cut and existing is not MISSING:
+            # A cut replacement is no better than what was salvaged
+            unresolved.append(section_name(section))
+            continue
+
+        set_path(data, section, value)
+        if cut:
+            unresolved.append(section_name(section))
+    return unresolved
+
+
+async def recover_model_json(
+    text: str,
+    prompt: str,
+    inputs: list,
+    model: str,
+    sections: List[Path],
+    continue_keys: Optional[Dict[Path, str]] = None,
+    reask: bool = True,
+    report: Optional[CallReport] = None,
+) -> Optional[RecoveredJSON]:
+    """
+    Salvage an unparseable model response and fill its gaps with one follow-up call
+
+    `inputs` are the documents sent with the original prompt; the follow-up
+    call's retries and hedges are added to `report`. Returns None when the
+    response holds no JSON object at all.
+    """
+    continue_keys = continue_keys or {}
+    salvaged = salvage_json(text)
+    if not salvaged.data:
+        return None
+
+    data = salvaged.data
+    missing = sections_to_reask(salvaged, sections)
+    recovered = sum(1 for s in sections if s not in missing and get_path(data, s) is not MISSING)
+    print(f"[REPAIR] Salvaged {recovered}/{len(sections)} sections, cut at "
+          f"{section_name(salvaged.cut_path) if salvaged.cut_path else 'nothing'}")
+
+    if not missing:
+        return RecoveredJSON(data, recovered, [], [], 0, 0)
+    reasked = [section_name(section) for section in missing]
+    if not reask:
+        return RecoveredJSON(data, recovered, [], reasked, 0, 0)
+
+    template = response_template(prompt)
+    followup_prompt = build_reask_prompt(prompt, template, missing, data, continue_keys)
+    print(f"[REPAIR] Re-asking for {', '.join(reasked)}")
+    try:
+        response = await gemini_executor.generate_content(model, [followup_prompt] + list(inputs), report=report)
+    except Exception as e:
+        print(f"[WARNING] Follow-up request failed: {type(e).__name__}: {e}")
+        return RecoveredJSON(data, recovered, reasked, reasked, 0, 0)
+
+    usage = response.usage_metadata
+    prompt_tokens = (usage.prompt_token_count or 0) if usage else 0
+    output_tokens = (usage.candidates_token_count or 0) if usage else 0
+
+    raw_json = clean_model_json(response.text)
+    try:
+        followup = SalvagedJSON(loads(raw_json), None)
+    except JSONDecodeError:
+        followup = salvage_json(response.text)
+    if not isinstance(followup.data, dict):
+        followup = SalvagedJSON({}, ())
+
+    unresolved = merge_reask(data, followup, missing, continue_keys)
+    if unresolved:
+        print(f"[WARNING] Still missing after follow-up: {', '.join(unresolved)}")
+    return RecoveredJSON(data, recovered, reasked, unresolved, prompt_tokens, output_tokens)
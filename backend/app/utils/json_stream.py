@@ -0,0 +1,123 @@
+"""
+Incremental JSON Parsing - pick completed values out of a JSON document as it streams in
+
+The model streams its JSON answer in arbitrary text chunks. The parser keeps only
+a small scanner state between chunks and reports every scalar value as soon as
+its closing quote or delimiter arrives, together with its path from the root
+(object keys and array indexes), so callers can act on early fields long before
+the document is complete.
+"""
+from typing import Any, List, Optional, Tuple
+from app.utils.fast_json import loads
+
+
+Path = Tuple[Any, ...]
+
+WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """Feed text chunks, get back (path, value) for every scalar completed so far"""
+
+    def __init__(self):
+        self._started = False
+        self.done = False
+        # One frame per open container: kind ("obj"/"arr"), current key or index, expected token
+        self._stack: List[dict] = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._token: Optional[List[str]] = None
+
+    def _path(self) -> Path:
+        return tuple(frame["key"] for frame in self._stack)
+
+    def _push(self, kind: str):
+        if kind == "obj":
+            self._stack.append({"kind": "obj", "key": None, "state": "key"})
+        else:
+            self._stack.append({"kind": "arr", "key": 0, "state": "value"})
+
+    def _finish_primitive(self, completed: list):
+        text = "".join(self._token)
+        self._token = None
+        try:
+            value = loads(text)
+        except ValueError:
+            value = text
+        completed.append((self._path(), value))
+        self._stack[-1]["state"] = "comma"
+
+    def feed(self, text: str) -> List[Tuple[Path, Any]]:
+        completed = []
+        for char in text:
+            if self.done:
+                break
+
+            # Skip anything before the root object (markdown fences, stray prose)
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._push("obj")
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._token.append(char)
+                elif char == "\\":
+                    self._escape = True
+                    self._token.append(char)
+                elif char == '"':
+                    self._in_string = False
+                    raw = "".join(self._token)
+                    self._token = None
+                    try:
+                        value = loads(f'"{raw}"')
+                    except ValueError:
+                        value = raw
+                    frame = self._stack[-1]
+                    if self._string_is_key:
+                        frame["key"] = value
+                        frame["state"] = "colon"
+                    else:
+                        completed.append((self._path(), value))
+                        frame["state"] = "comma"
+                else:
+                    self._token.append(char)
+                continue
+
+            if self._token is not None:
+                if char not in WHITESPACE and char not in ",}]":
+                    self._token.append(char)
+                    continue
+                self._finish_primitive(completed)
+
+            if char in WHITESPACE:
+                continue
+
+            frame = self._stack[-1]
+            if char == '"':
+                self._in_string = True
+                self._token = []
+                self._string_is_key = frame["kind"] == "obj" and frame["state"] == "key"
+            elif char == ":":
+                frame["state"] = "value"
+            elif char == ",":
+                if frame["kind"] == "obj":
+                    frame["state"] = "key"
+                else:
+                    frame["key"] += 1
+                    frame["state"] = "value"
+            elif char in "{[":
+                self._push("obj" if char == "{" else "arr")
+            elif char in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                else:
+                    self._stack[-1]["state"] = "comma"
+            else:
+                self._token = [char]
+
+        return completed
@@ -0,0 +1,144 @@
+"""
+Label Region Detection - find the text-dense parts of a pack photo on the CPU
+
+The data the extractor needs (nutrition table, ingredients, manufacturer and
+licence fine print) sits in small, dense blocks of text, while most of a pack
+photo is artwork, background and large marketing type. The photo is reduced to
+a grayscale analysis copy and cut into a grid of cells. A cell counts as text
+when a large share of its pixels are sharp intensity edges, or when it holds a
+long horizontal or vertical rule (table lines). Text cells are joined into
+connected regions whose boxes, mapped back to full resolution, are sent as
+high-resolution crops next to one low-resolution overview of the whole photo.
+"""
+from typing import List, Tuple
+import numpy as np
+from PIL import Image
+
+
+Box = Tuple[int, int, int, int]  # left, top, right, bottom in image pixels
+
+ANALYSIS_EDGE = 1024
+CELL = 16
+
+# Intensity step (0-255) between neighbouring pixels that counts as an edge
+EDGE_THRESHOLD = 40
+# Share of edge pixels that makes a cell look like small print
+TEXT_DENSITY = 0.14
+# Share of a cell's width (or height) a single pixel row (or column) must cover to be a rule
+RULE_COVERAGE = 0.9
+# Regions smaller than this many cells are left to the overview
+MIN_REGION_CELLS = 12
+
+
+def _edge_maps(gray: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Boolean maps of horizontal-running and vertical-running edges, same shape"""
+    # Step between rows marks a horizontal edge, step between columns a vertical one
+    horizontal = np.abs(np.diff(gray, axis=0))[:, :-1] > EDGE_THRESHOLD
+    vertical = np.abs(np.diff(gray, axis=1))[:-1, :] > EDGE_THRESHOLD
+    return horizontal, vertical
+
+
+def _cell_view(values: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    return values[:rows * CELL, :cols * CELL].reshape(rows, CELL, cols, CELL)
+
+
+def text_cell_mask(gray: np.ndarray) -> np.ndarray:
+    """(rows, cols) boolean grid of cells that hold small print or table rules"""
+    horizontal, vertical = _edge_maps(gray)
+    rows, cols = horizontal.shape[0] // CELL, horizontal.shape[1] // CELL
+    if rows == 0 or cols == 0:
+        return np.zeros((0, 0), dtype=bool)
+
+    h_cells = _cell_view(horizontal, rows, cols)
+    v_cells = _cell_view(vertical, rows, cols)
+
+    density = (h_cells | v_cells).mean(axis=(1, 3))
+    dense = density > TEXT_DENSITY
+
+    # Rules: one pixel row spanning the cell (h) or one pixel column spanning it (v)
+    h_rules = (h_cells.mean(axis=3) > RULE_COVERAGE).any(axis=1)
+    v_rules = (v_cells.mean(axis=1) > RULE_COVERAGE).any(axis=2)
+
+    return dense | h_rules | v_rules
+
+
+def _dilate(mask: np.ndarray) -> np.ndarray:
+    """Grow the mask by one cell in every direction so lines of text join up"""
+    padded = np.pad(mask, 1)
+    grown = np.zeros_like(mask)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            grown |= padded[dy:dy + mask.shape[0], dx:dx + mask.shape[1]]
+    return grown
+
+
+def _components(mask: np.ndarray) -> List[Tuple[int, Box]]:
+    """(cell count, cell-grid box) for each 4-connected component"""
+    seen = np.zeros_like(mask)
+    rows, cols = mask.shape
+    found = []
+    for start_y, start_x in zip(*np.nonzero(mask)):
+        if seen[start_y, start_x]:
+            continue
+        seen[start_y, start_x] = True
+        stack = [(start_y, start_x)]
+        count = 0
+        top, left, bottom, right = start_y, start_x, start_y, start_x
+        while stack:
+            y, x = stack.pop()
+            count += 1
+            top, bottom = min(top, y), max(bottom, y)
+            left, right = min(left, x), max(right, x)
+            for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                if 0 <= ny < rows and 0 <= nx < cols and mask[ny, nx] and not seen[ny, nx]:
+                    seen[ny, nx] = True
+                    stack.append((ny, nx))
+        found.append((count, (int(left), int(top), int(right) + 1, int(bottom) + 1)))
+    return found
+
+
+def _overlaps(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _merge_overlapping(boxes: List[Box]) -> List[Box]:
+    merged = list(boxes)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                if _overlaps(merged[i], merged[j]):
+                    a, b = merged[i], merged.pop(j)
+                    merged[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def detect_text_regions(img: Image.Image, max_regions: int) -> List[Box]:
+    """Boxes (full-resolution pixels) around the largest text-dense regions, largest first"""
+    scale = min(1.0, ANALYSIS_EDGE / max(img.size))
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    gray = np.asarray(img.convert("L").resize(size, Image.BILINEAR), dtype=np.int16)
+
+    mask = text_cell_mask(gray)
+    if not mask.any():
+        return []
+
+    components = [c for c in _components(_dilate(mask)) if c[0] >= MIN_REGION_CELLS]
+    components.sort(key=lambda c: c[0], reverse=True)
+
+    # Back to full resolution with one cell of padding
+    step = CELL / scale
+    boxes = []
+    for _, (left, top, right, bottom) in components[:max_regions]:
+        boxes.append((
+            max(0, int((left - 1) * step)),
+            max(0, int((top - 1) * step)),
+            min(img.width, int((right + 1) * step)),
+            min(img.height, int((bottom + 1) * step)),
+        ))
+    return _merge_overlapping(boxes)
@@ -0,0 +1,681 @@
+"""
+Nomenclature Engine - one normalization of nutrient names for products and COAs
+
+Names resolve through three layers, highest priority first:
+  1. NomenclatureMapping documents that admins maintain through /api/nomenclature
+  2. For product labels, exact label spellings (PRODUCT_LABEL_NAMES), whose
+     standard names keep the element symbol or unit ("Sodium (Na)", "Energy (kJ)")
+  3. Built-in defaults (DEFAULT_NUTRIENT_NAMES), matched after stripping
+     parenthesised qualifiers and extra whitespace
+
+Names that miss every table go through a fuzzy stage: a character-trigram index
+over all known spellings shortlists candidates by Dice overlap, the shortlist is
+re-scored by edit distance, and the best candidate is used when its similarity
+reaches NOMENCLATURE_FUZZY_THRESHOLD and beats the best other standard name by
+NOMENCLATURE_FUZZY_MARGIN. This catches typos and abbreviations such as
+"Protien" or "Vit. B-12".
+
+Similar spelling is not the same nutrient. A candidate is never used if its
+numbers or vitamin letters differ ("Omega 9" / "Omega 3", "Vitamin K2" /
+"Vitamin K" or "Vitamin B2"), if a word differs only by a negating prefix ("Unsaturated" / "Saturated"), or if it
+differs only by an ion suffix ("Iodide" / "Iodine"). Names that have a close
+candidate but are not mapped resolve with method "review". They are kept for
+admins, who can look up suggestions through /api/nomenclature/suggest.
+
+Tables are built once per mapping version and every resolved name is memoized,
+so normalizing a row is a single dict lookup. The collection version (document
+count and latest updated_at) is re-checked at most every
+NOMENCLATURE_REFRESH_SECONDS, and immediately after edits made in this worker.
+"""
+import asyncio
+import heapq
+import re
+import time
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from app.models.nomenclature import NomenclatureMapping
+from config.settings import settings
+
+
+PAREN_PATTERN = re.compile(r"\s*\(.*?\)\s*")
+SPACE_PATTERN = re.compile(r"\s+")
+
+FUZZY_STRIP_PATTERN = re.compile(r"[^a-z0-9]+")
+# Numbers with the letter before them: "b12", "k2", the "a3" of "omega3fattyacid"
+CODE_PATTERN = re.compile(r"[a-z]?\d+")
+
+# Energy unit named in a raw label ("Energy (kJ per 100 g)") or a standard name
+ENERGY_UNIT_PATTERN = re.compile(r"\b(kj|kcal)\b")
+
+# Abbreviations expanded before fuzzy matching
+FUZZY_ABBREVIATIONS = {
+    "vit": "vitamin",
+    "carb": "carbohydrate",
+    "carbs": "carbohydrates",
+    "tot": "total",
+    "sat": "saturated",
+}
+
+# Words that name a different nutrient when prefixed or re-suffixed
+NEGATING_PREFIXES = ("un", "non", "in")
+ION_SUFFIXES = ("ide", "ine", "ate", "ite")
+
+# Names shorter than this are element symbols or acronyms; never guess those
+FUZZY_MIN_LENGTH = 4
+FUZZY_SHORTLIST = 8
+
+# Unmapped names whose closest candidate scores this high are queued for review
+FUZZY_REVIEW_MIN = 0.6
+MAX_REVIEW_ENTRIES = 500
+
+# Memoized names per profile are dropped past this size (unbounded input from model output)
+MAX_MEMO_ENTRIES = 20000
+
+
+DEFAULT_NUTRIENT_NAMES = {
+    # Proteins
+    "protein": "Protein",
+    "proteins": "Protein",
+    "crude protein": "Protein",
+    "total protein": "Protein",
+    "protein (n x 6.25)": "Protein",
+    "protein (dry basis)": "Protein (Dry Basis)",
+    "protein (wet basis)": "Protein (Wet Basis)",
+    # Fats
+    "fat": "Total Fat",
+    "fats": "Total Fat",
+    "total fat": "Total Fat",
+    "crude fat": "Total Fat",
+    "lipids": "Total Fat",
+    "total lipids": "Total Fat",
+    # Saturated Fat
+    "saturated fat": "Saturated Fat",
+    "saturated fatty acids": "Saturated Fat",
+    "sfa": "Saturated Fat",
+    "saturated fats": "Saturated Fat",
+    # Monounsaturated Fat
+    "monounsaturated fat": "Monounsaturated Fat",
+    "monounsaturated fatty acids": "Monounsaturated Fat",
+    "mufa": "Monounsaturated Fat",
+    # Polyunsaturated Fat
+    "polyunsaturated fat": "Polyunsaturated Fat",
+    "polyunsaturated fatty acids": "Polyunsaturated Fat",
+    "pufa": "Polyunsaturated Fat",
+    # Specific PUFAs
+    "linoleic acid": "Linoleic Acid",
+    "alpha linolenic acid": "Alpha-Linolenic Acid",
+    "alpha-linolenic acid": "Alpha-Linolenic Acid",
+    "ala": "Alpha-Linolenic Acid",
+    "dha": "DHA",
+    "docosahexaenoic acid": "DHA",
+    "epa": "EPA",
+    "eicosapentaenoic acid": "EPA",
+    # Trans Fat
+    "trans fat": "Trans Fat",
+    "trans fatty acids": "Trans Fat",
+    "trans fats": "Trans Fat",
+    # Carbohydrates
+    "carbohydrate": "Total Carbohydrates",
+    "carbohydrates": "Total Carbohydrates",
+    "total carbohydrate": "Total Carbohydrates",
+    "total carbohydrates": "Total Carbohydrates",
+    "carbs": "Total Carbohydrates",
+    # Sugars
+    "sugar": "Total Sugars",
+    "sugars": "Total Sugars",
+    "total sugar": "Total Sugars",
+    "total sugars": "Total Sugars",
+    "added sugar": "Added Sugars",
+    "added sugars": "Added Sugars",
+    "sucrose": "Sucrose",
+    "added sucrose": "Added Sucrose",
+    # Fiber
+    "dietary fiber": "Dietary Fiber",
+    "dietary fibre": "Dietary Fiber",
+    "total dietary fiber": "Dietary Fiber",
+    "fiber": "Dietary Fiber",
+    "fibre": "Dietary Fiber",
+    "soluble fiber": "Soluble Fiber",
+    "soluble fibre": "Soluble Fiber",
+    "insoluble fiber": "Insoluble Fiber",
+    "insoluble fibre": "Insoluble Fiber",
+    "fos": "FOS (Fructooligosaccharides)",
+    "fructooligosaccharides": "FOS (Fructooligosaccharides)",
+    # Moisture/Ash
+    "moisture": "Moisture",
+    "moisture content": "Moisture",
+    "ash": "Ash",
+    "total ash": "Ash",
+    # Cholesterol
+    "cholesterol": "Cholesterol",
+    # Energy
+    "energy": "Energy",
+    "calories": "Energy",
+    "calorific value": "Energy",
+    "energy value": "Energy",
+    # Minerals
+    "sodium": "Sodium",
+    "na": "Sodium",
+    "potassium": "Potassium",
+    "k": "Potassium",
+    "calcium": "Calcium",
+    "ca": "Calcium",
+    "iron": "Iron",
+    "fe": "Iron",
+    "zinc": "Zinc",
+    "zn": "Zinc",
+    "magnesium": "Magnesium",
+    "phosphorus": "Phosphorus",
+    "p": "Phosphorus",
+    "chloride": "Chloride",
+    "cl": "Chloride",
+    # Vitamins
+    "vitamin a": "Vitamin A",
+    "vit a": "Vitamin A",
+    "retinol": "Vitamin A",
+    "vitamin d": "Vitamin D",
+    "vit d": "Vitamin D",
+    "vitamin d3": "Vitamin D3",
+    "cholecalciferol": "Vitamin D3",
+    "vitamin e": "Vitamin E",
+    "vit e": "Vitamin E",
+    "tocopherol": "Vitamin E",
+    "alpha tocopherol": "Vitamin E",
+    "vitamin c": "Vitamin C",
+    "vit c": "Vitamin C",
+    "ascorbic acid": "Vitamin C",
+    "vitamin b1": "Vitamin B1",
+    "thiamine": "Vitamin B1",
+    "thiamin": "Vitamin B1",
+    "vitamin b2": "Vitamin B2",
+    "riboflavin": "Vitamin B2",
+    "vitamin b3": "Vitamin B3",
+    "niacin": "Vitamin B3",
+    "nicotinic acid": "Vitamin B3",
+    "vitamin b6": "Vitamin B6",
+    "pyridoxine": "Vitamin B6",
+    "vitamin b12": "Vitamin B12",
+    "cobalamin": "Vitamin B12",
+    "cyanocobalamin": "Vitamin B12",
+    "folic acid": "Folic Acid",
+    "folate": "Folic Acid",
+    "vitamin b9": "Folic Acid",
+    "biotin": "Biotin",
+    "vitamin b7": "Biotin",
+    "pantothenic acid": "Pantothenic Acid",
+    "vitamin b5": "Pantothenic Acid",
+    "vitamin d2": "Vitamin D2",
+    "ergocalciferol": "Vitamin D2",
+    "vitamin k": "Vitamin K",
+    "phylloquinone": "Vitamin K",
+    # Omega Fatty Acids
+    "omega 3": "Omega 3 Fatty Acid",
+    "omega-3": "Omega 3 Fatty Acid",
+    "omega 3 fatty acid": "Omega 3 Fatty Acid",
+    "omega 3 fatty acids": "Omega 3 Fatty Acid",
+    "n-3 fatty acids": "Omega 3 Fatty Acid",
+    "omega 6": "Omega 6 Fatty Acid",
+    "omega-6": "Omega 6 Fatty Acid",
+    "omega 6 fatty acid": "Omega 6 Fatty Acid",
+    "omega 6 fatty acids": "Omega 6 Fatty Acid",
+    "n-6 fatty acids": "Omega 6 Fatty Acid",
+    # Trace Minerals
+    "iodine": "Iodine",
+    "i": "Iodine",
+    "copper": "Copper",
+    "cu": "Copper",
+    "chromium": "Chromium",
+    "cr": "Chromium",
+    "manganese": "Manganese",
+    "mn": "Manganese",
+    "molybdenum": "Molybdenum",
+    "mo": "Molybdenum",
+    "selenium": "Selenium",
+    "se": "Selenium",
+    # Other Nutrients
+    "carnitine": "Carnitine",
+    "l-carnitine": "Carnitine",
+    "choline": "Choline",
+    "inositol": "Inositol",
+    "myo-inositol": "Inositol",
+    "nucleotides": "Nucleotides",
+    "total nucleotides": "Nucleotides",
+    "taurine": "Taurine",
+}
+
+PRODUCT_LABEL_NAMES = {
+    "protein": "Protein",
+    "proteins": "Protein",
+    "crude protein": "Protein",
+    "total protein": "Protein",
+    "protein (n x 6.25)": "Protein",
+    "protein content": "Protein",
+    "protein (g)": "Protein",
+    "fat": "Total Fat",
+    "total fat": "Total Fat",
+    "crude fat": "Total Fat",
+    "lipids": "Total Fat",
+    "total fat (g)": "Total Fat",
+    "saturated fat": "Saturated Fat",
+    "saturated fatty acids": "Saturated Fat",
+    "sfa": "Saturated Fat",
+    "monounsaturated fat": "Monounsaturated Fat",
+    "mufa": "Monounsaturated Fat",
+    "polyunsaturated fat": "Polyunsaturated Fat",
+    "pufa": "Polyunsaturated Fat",
+    "trans fat": "Trans Fat",
+    "carbohydrate": "Total Carbohydrates",
+    "total carbohydrate": "Total Carbohydrates",
+    "carbs": "Total Carbohydrates",
+    "carbohydrate (g)": "Total Carbohydrates",
+    "available carbohydrates": "Available Carbohydrates",
+    "sugar": "Total Sugars",
+    "total sugar": "Total Sugars",
+    "total sugars": "Total Sugars",
+    "total sugars (g)": "Total Sugars",
+    "added sugar": "Added Sugars",
+    "added sugars": "Added Sugars",
+    "added sugars (g)": "Added Sugars",
+    "sucrose": "Sucrose",
+    "dietary fiber": "Dietary Fiber",
+    "fiber": "Dietary Fiber",
+    "soluble fiber": "Soluble Fiber",
+    "insoluble fiber": "Insoluble Fiber",
+    "fos": "FOS",
+    "moisture": "Moisture",
+    "moisture content": "Moisture",
+    "ash": "Ash",
+    "total ash": "Ash",
+    "cholesterol": "Cholesterol",
+    "cholesterol (mg)": "Cholesterol",
+    "energy (kcal)": "Energy (kcal)",
+    "energy (kj)": "Energy (kJ)",
+    "energy": "Energy (kcal)",
+    "calories": "Energy (kcal)",
+    "sodium": "Sodium (Na)",
+    "sodium (mg)": "Sodium (Na)",
+    "potassium": "Potassium (K)",
+    "calcium": "Calcium (Ca)",
+    "iron": "Iron (Fe)",
+    "zinc": "Zinc (Zn)",
+    "magnesium": "Magnesium (Mg)",
+    "phosphorus": "Phosphorus (P)",
+    "chloride": "Chloride (Cl)",
+    "vitamin a": "Vitamin A",
+    "vitamin a (mcg)": "Vitamin A",
+    "vitamin d": "Vitamin D",
+    "vitamin d₂": "Vitamin D2",
+    "vitamin d2": "Vitamin D2",
+    "vitamin d₂ (mcg)": "Vitamin D2",
+    "vitamin d3": "Vitamin D3",
+    "vitamin e": "Vitamin E",
+    "vitamin e (mg)": "Vitamin E",
+    "vitamin c": "Vitamin C",
+    "vitamin b1": "Vitamin B1",
+    "vitamin b2": "Vitamin B2",
+    "vitamin b3": "Vitamin B3",
+    "vitamin b5": "Vitamin B5",
+    "vitamin b6": "Vitamin B6",
+    "vitamin b7": "Vitamin B7",
+    "vitamin b9": "Vitamin B9",
+    "vitamin b12": "Vitamin B12",
+    "vitamin k": "Vitamin K",
+}
+
+# Product labels show the element symbol / energy unit next to the standard name
+PRODUCT_DISPLAY_NAMES = {
+    "Energy": "Energy (kcal)",
+    "Sodium": "Sodium (Na)",
+    "Potassium": "Potassium (K)",
+    "Calcium": "Calcium (Ca)",
+    "Iron": "Iron (Fe)",
+    "Zinc": "Zinc (Zn)",
+    "Magnesium": "Magnesium (Mg)",
+    "Phosphorus": "Phosphorus (P)",
+    "Chloride": "Chloride (Cl)",
+    "FOS (Fructooligosaccharides)": "FOS",
+}
+
+# Product energy rows keep the unit printed on the label
+PRODUCT_ENERGY_NAMES = {
+    "kcal": "Energy (kcal)",
+    "kj": "Energy (kJ)",
+}
+
+
+def clean_nutrient_name(raw_name: str) -> str:
+    """Lowercase, drop parenthesised qualifiers and collapse whitespace"""
+    cleaned = PAREN_PATTERN.sub(" ", raw_name.lower().strip())
+    return SPACE_PATTERN.sub(" ", cleaned).strip()
+
+
+def energy_unit(name: str) -> Optional[str]:
+    """"kj" / "kcal" if a name states an energy unit"""
+    match = ENERGY_UNIT_PATTERN.search(name.lower())
+    return match.group(1) if match else None
+
+
+def keep_energy_unit(raw_name: str, name: str) -> str:
+    """
+    Product name that does not contradict the energy unit on the label
+
+    Cleaning drops "(kJ per 100 g)", and the display name of plain "Energy" is
+    "Energy (kcal)". Without this, kJ values would be stored under a kcal name.
+    """
+    raw_unit = energy_unit(raw_name)
+    name_unit = energy_unit(name)
+    if raw_unit and name_unit and raw_unit != name_unit:
+        return PRODUCT_ENERGY_NAMES[raw_unit]
+    return name
+
+
+def fuzzy_words(raw_name: str) -> List[str]:
+    """Lowercase words of a name, with common abbreviations expanded"""
+    words = FUZZY_STRIP_PATTERN.split(clean_nutrient_name(raw_name))
+    return [FUZZY_ABBREVIATIONS.get(word, word) for word in words if word]
+
+
+def fuzzy_key(raw_name: str) -> str:
+    """Letters and digits only, with common abbreviations expanded"""
+    return "".join(fuzzy_words(raw_name))
+
+
+def opposite_words(a: str, b: str) -> bool:
+    """Different single letters, or words that differ only by a negating prefix or an ion suffix"""
+    if a == b:
+        return False
+    if len(a) == 1 and len(b) == 1 and a.isalpha() and b.isalpha():
+        return True
+    if any(a == prefix + b or b == prefix + a for prefix in NEGATING_PREFIXES):
+        return True
+    return (
+        len(a) > 4 and a[:-3] == b[:-3]
+        and a[-3:] in ION_SUFFIXES and b[-3:] in ION_SUFFIXES
+    )
+
+
+def conflicting(query_words: List[str], candidate_words: List[str]) -> bool:
+    """True if a candidate names a different nutrient however close its spelling is"""
+    query_key, candidate_key = "".join(query_words), "".join(candidate_words)
+    if CODE_PATTERN.findall(query_key) != CODE_PATTERN.findall(candidate_key):
+        return True
+    return any(opposite_words(q, c) for q in query_words for c in candidate_words)
+
+
+def trigrams(key: str) -> List[str]:
+    padded = f"^{key}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def edit_similarity(a: str, b: str, min_score: float = 0.0) -> float:
+    """
+    1 - (optimal string alignment distance / longer length); transpositions cost 1
+
+    Returns 0.0 as soon as the score is certain to fall below `min_score`.
+    """
+    if a == b:
+        return 1.0
+    longest = max(len(a), len(b))
+    max_distance = int((1.0 - min_score) * longest)
+    if abs(len(a) - len(b)) > max_distance:
+        return 0.0
+
+    cols = len(b) + 1
+    previous2 = None
+    previous = list(range(cols))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * (cols - 1)
+        char_a = a[i - 1]
+        for j in range(1, cols):
+            cost = 0 if char_a == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+        if min(current) > max_distance:
+            return 0.0
+        previous2, previous = previous, current
+    if previous[-1] > max_distance:
+        return 0.0
+    return 1.0 - previous[-1] / longest
+
+
+class FuzzyMatch(NamedTuple):
+    name: str  # closest standard name
+    score: float
+    accepted: bool  # safe to map automatically
+
+
+class FuzzyIndex:
+    """Trigram inverted index over known spellings, scored by Dice then edit distance"""
+
+    def __init__(self, names: Dict[str, str], margin: float = 0.0):
+        self.margin = margin
+        self.keys: List[str] = []
+        self.words: List[List[str]] = []
+        self.names: List[str] = []
+        self.sizes: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+
+        seen = set()
+        for raw, name in names.items():
+            words = fuzzy_words(raw)
+            key = "".join(words)
+            if len(key) < FUZZY_MIN_LENGTH or key in seen:
+                continue
+            seen.add(key)
+            entry_id = len(self.keys)
+            grams = set(trigrams(key))
+            self.keys.append(key)
+            self.words.append(words)
+            self.names.append(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(entry_id)
+
+    def match(self, raw_name: str, min_score: float = 0.0) -> Optional[FuzzyMatch]:
+        """
+        Closest standard name for a raw name, or None if nothing scores FUZZY_REVIEW_MIN
+
+        The match is `accepted` when it reaches `min_score`, does not conflict
+        with the name (numbers, negation, ion suffix) and beats the best other
+        standard name by `margin`.
+        """
+        words = fuzzy_words(raw_name)
+        key = "".join(words)
+        if len(key) < FUZZY_MIN_LENGTH:
+            return None
+
+        grams = set(trigrams(key))
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        if not shared:
+            return None
+
+        query_size = len(grams)
+        sizes = self.sizes
+        shortlist = heapq.nlargest(
+            FUZZY_SHORTLIST,
+            shared.items(),
+            key=lambda item: 2 * item[1] / (query_size + sizes[item[0]])
+        )
+
+        # Best score per standard name, conflicting spellings excluded
+        floor = min(min_score - self.margin, FUZZY_REVIEW_MIN)
+        best: Dict[str, float] = {}
+        closest: Optional[Tuple[float, str]] = None
+        for entry_id, _ in shortlist:
+            score = edit_similarity(key, self.keys[entry_id], floor)
+            if score <= 0:
+                continue
+            name = self.names[entry_id]
+            if closest is None or score > closest[0]:
+                closest = (score, name)
+            if not conflicting(words, self.words[entry_id]) and score > best.get(name, 0.0):
+                best[name] = score
+
+        if closest is None or closest[0] < FUZZY_REVIEW_MIN:
+            return None
+        ranked = sorted(best.items(), key=lambda item: -item[1])
+        if not ranked or ranked[0][1] < closest[0]:
+            # The closest spelling is a different nutrient: never map, only review
+            return FuzzyMatch(closest[1], round(closest[0], 3), False)
+
+        name, score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        accepted = score >= min_score and score - runner_up >= self.margin
+        return FuzzyMatch(name, round(score, 3), accepted)
+
+
+class NomenclatureEngine:
+    def __init__(self, refresh_seconds: float, fuzzy_threshold: float, fuzzy_margin: float = 0.0):
+        self.refresh_seconds = refresh_seconds
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_margin = fuzzy_margin
+        # (profile, raw name) -> closest candidate, for names left unmapped
+        self.review: Dict[Tuple[str, str], dict] = {}
+        self.version: Optional[Tuple[int, str]] = None
+        self.mapping_count = 0
+        self._checked_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._build({})
+
+    def _build(self, db_names: Dict[str, str]):
+        """Compile lookup tables from DB mappings (lowercase raw name -> standard name)"""
+        db_cleaned = {clean_nutrient_name(raw): std for raw, std in db_names.items()}
+
+        coa_table = {**DEFAULT_NUTRIENT_NAMES, **db_cleaned}
+
+        product_exact = {**PRODUCT_LABEL_NAMES, **db_names}
+        product_cleaned = {
+            key: PRODUCT_DISPLAY_NAMES.get(name, name)
+            for key, name in DEFAULT_NUTRIENT_NAMES.items()
+        }
+        product_cleaned.update(db_cleaned)
+
+        self._tables = {
+            "coa": ({}, coa_table),
+            "product": (product_exact, product_cleaned),
+        }
+        self._fuzzy = {
+            "coa": FuzzyIndex(coa_table, self.fuzzy_margin),
+            "product": FuzzyIndex({**product_cleaned, **product_exact}, self.fuzzy_margin),
+        }
+        self._memo: Dict[str, Dict[str, Tuple[str, float, str]]] = {"coa": {}, "product": {}}
+        self.review = {}
+
+    def resolve(self, raw_name: str, profile: str = "coa") -> Tuple[str, float, str]:
+        """
+        (standard_name, confidence, method) for a raw nutrient name
+
+        method is "exact", "fuzzy", "review" or "none". Unknown names fall back
+        to the raw name for product labels and to title case for COAs, with
+        confidence 0. "review" means a close candidate exists but was not safe
+        to map; it is listed by `pending_review`.
+        """
+        memo = self._memo[profile]
+        resolved = memo.get(raw_name)
+        if resolved is not None:
+            return resolved
+
+        exact, cleaned = self._tables[profile]
+        lowered = raw_name.strip().lower()
+        name = exact.get(lowered) or cleaned.get(clean_nutrient_name(raw_name))
+        if name is not None:
+            if profile == "product":
+                name = keep_energy_unit(raw_name, name)
+            resolved = (name, 1.0, "exact")
+        else:
+            match = self._fuzzy[profile].match(raw_name, self.fuzzy_threshold)
+            fallback = raw_name if profile == "product" else raw_name.title()
+            if match and match.accepted:
+                name = keep_energy_unit(raw_name, match.name) if profile == "product" else match.name
+                resolved = (name, match.score, "fuzzy")
+            elif match:
+                resolved = (fallback, 0.0, "review")
+                if len(self.review) < MAX_REVIEW_ENTRIES:
+                    self.review[(profile, raw_name)] = {"closest": match.name, "confidence": match.score}
+            else:
+                resolved = (fallback, 0.0, "none")
+
+        if len(memo) >= MAX_MEMO_ENTRIES:
+            memo.clear()
+        memo[raw_name] = resolved
+        return resolved
+
+    def standardize(self, raw_name: str, profile: str = "coa") -> str:
+        """Standard name for a raw nutrient name"""
+        return self.resolve(raw_name, profile)[0]
+
+    def suggest(self, raw_name: str, profile: str = "coa", limit: int = 5) -> List[dict]:
+        """Closest known spellings regardless of threshold, for the admin UI"""
+        key = fuzzy_key(raw_name)
+        index = self._fuzzy[profile]
+        scored = sorted(
+            ((edit_similarity(key, candidate), name) for candidate, name in zip(index.keys, index.names)),
+            reverse=True
+        )
+        suggestions = []
+        for score, name in scored:
+            if name not in {s["standardized_name"] for s in suggestions}:
+                suggestions.append({"standardized_name": name, "confidence": round(score, 3)})
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    def pending_review(self) -> List[dict]:
+        """Names seen since the last reload that had a close but unsafe candidate"""
+        return [
+            {"raw_name": raw_name, "profile": profile, **candidate}
+            for (profile, raw_name), candidate in sorted(self.review.items())
+        ]
+
+    def invalidate(self):
+        """Force a version check on the next refresh (after edits through the API)"""
+        self._checked_at = 0.0
+
+    async def refresh(self):
+        """Reload mappings from the database if the collection changed"""
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.refresh_seconds:
+                return
+            try:
+                collection = NomenclatureMapping.get_motor_collection()
+                summary = await collection.aggregate([
+                    {"$group": {"_id": None, "count": {"$sum": 1}, "updated": {"$max": "$updated_at"}}}
+                ]).to_list(1)
+                version = (summary[0]["count"], str(summary[0]["updated"])) if summary else (0, "")
+
+                if version != self.version:
+                    db_names = {}
+                    async for doc in collection.find({}, {"standardized_name": 1, "raw_names": 1}):
+                        for raw_name in doc.get("raw_names", []):
+                            db_names[raw_name.strip().lower()] = doc["standardized_name"]
+                    self._build(db_names)
+                    self.version = version
+                    self.mapping_count = version[0]
+                    print(f"[OK] Nomenclature loaded: {version[0]} mappings, {len(db_names)} raw names")
+            except Exception as e:
+                print(f"[WARNING] Nomenclature reload failed, keeping current tables: {e}")
+            self._checked_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "mappings": self.mapping_count,
+            "version": list(self.version) if self.version else None,
+            "memoized": {profile: len(memo) for profile, memo in self._memo.items()},
+            "pending_review": len(self.review),
+        }
+
+
+nomenclature_engine = NomenclatureEngine(
+    settings.NOMENCLATURE_REFRESH_SECONDS,
+    settings.NOMENCLATURE_FUZZY_THRESHOLD,
+    settings.NOMENCLATURE_FUZZY_MARGIN,
+)
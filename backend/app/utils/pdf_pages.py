@@ -0,0 +1,287 @@
+"""
+PDF Page Handling - use the text layer of digital COAs and rasterize only scanned pages
+
+Most supplier COAs are generated digitally and carry a complete text layer, so
+their pages are sent to the model as layout-preserving text instead of 300 DPI
+renders. Pages without usable text (scans, photos pasted into a PDF) are still
+rendered to images.
+
+PDF parsing and rendering run in a process pool so they neither block the event
+loop nor serialize on the GIL; pages are rendered in parallel at a DPI chosen per
+page and handed back as raw pixmap samples (no PNG encode/decode round trip).
+"""
+import asyncio
+import hashlib
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import fitz  # PyMuPDF
+from PIL import Image
+from config.settings import settings
+
+
+# Pages where embedded images cover more than this share of the page are treated
+# as scans even if they carry a little text (headers, OCR fragments, stamps)
+MAX_IMAGE_COVERAGE = 0.6
+
+# Words closer than this (in points) belong to the same cell; wider gaps become
+# column separators so tables keep their row structure
+COLUMN_GAP = 12.0
+ROW_TOLERANCE = 3.0
+
+
+def text_signature() -> str:
+    """Identifies the text-layer settings, so cached results are not shared across them"""
+    if not settings.PDF_TEXT_LAYER_ENABLED:
+        return "pdfraster"
+    return f"pdftext{settings.PDF_TEXT_MIN_CHARS}"
+
+
+def image_coverage(page) -> float:
+    page_area = abs(page.rect.width * page.rect.height) or 1.0
+    covered = 0.0
+    for info in page.get_image_info():
+        x0, y0, x1, y1 = info["bbox"]
+        covered += abs((x1 - x0) * (y1 - y0))
+    return min(covered / page_area, 1.0)
+
+
+def layout_text(page) -> str:
+    """Rebuild the page as text lines, joining table cells with ' | '"""
+    words = page.get_text("words", sort=True)
+    if not words:
+        return ""
+
+    rows: List[List[tuple]] = []
+    for word in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        center = (word[1] + word[3]) / 2
+        if rows:
+            last = rows[-1]
+            last_center = (last[0][1] + last[0][3]) / 2
+            if abs(center - last_center) <= ROW_TOLERANCE:
+                last.append(word)
+                continue
+        rows.append([word])
+
+    lines = []
+    for row in rows:
+        row.sort(key=lambda w: w[0])
+        line = row[0][4]
+        for prev, word in zip(row, row[1:]):
+            separator = " | " if word[0] - prev[2] > COLUMN_GAP else " "
+            line += separator + word[4]
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def page_text_layer(page) -> str:
+    """Return layout text for pages with a usable text layer, or '' for scanned pages"""
+    if not settings.PDF_TEXT_LAYER_ENABLED:
+        return ""
+    if len(page.get_text("text").strip()) < settings.PDF_TEXT_MIN_CHARS:
+        return ""
+    if image_coverage(page) > MAX_IMAGE_COVERAGE:
+        return ""
+    return layout_text(page)
+
+
+def split_pdf_pages(pdf_document) -> Tuple[List[Tuple[int, str]], List[int]]:
+    """
+    Classify pages of an open PDF
+
+    Returns ([(page_number, text), ...] for text pages, [page_number, ...] for pages
+    that need rendering). Page numbers are 0-based.
+    """
+    text_pages = []
+    raster_pages = []
+    for page_num in range(len(pdf_document)):
+        text = page_text_layer(pdf_document[page_num])
+        if text:
+            text_pages.append((page_num, text))
+        else:
+            raster_pages.append(page_num)
+    return text_pages, raster_pages
+
+
+def text_digest(text: str) -> str:
+    """
+    Identity of a text page for duplicate detection: sha256 of its normalized text
+
+    Pages of one supplier template render almost identically and only differ in
+    lot numbers and values, so they are compared on their text, not their looks.
+    """
+    normalized = " ".join(text.split()).casefold()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def format_text_page(filename: str, page_num: int, total_pages: int, text: str) -> str:
+    return f"=== {filename} - page {page_num + 1} of {total_pages} (PDF text layer) ===\n{text}"
+
+
+# ============================================================
+# RENDERING
+# ============================================================
+# Vector-only pages render crisply at any resolution; keep enough for small print
+VECTOR_PAGE_MIN_DPI = 150
+
+# Renders used only for duplicate hashing, and how many pages of a stored PDF get one
+HASH_RENDER_DPI = 24
+MAX_HASH_PAGES = 20
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        # spawn: forking a process that already runs motor/uvicorn threads is unsafe
+        _render_pool = ProcessPoolExecutor(
+            max_workers=settings.PDF_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _render_pool
+
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+def choose_dpi(page) -> int:
+    """
+    Pick a render resolution for one page
+
+    Rendering past what preprocessing keeps (IMAGE_MAX_EDGE on the long side) is
+    wasted work, and a scanned page holds no more detail than its embedded image.
+    """
+    long_edge_pt = max(page.rect.width, page.rect.height) or 842.0
+    dpi = settings.IMAGE_MAX_EDGE * 72 / long_edge_pt
+
+    images = page.get_image_info()
+    if images:
+        largest = max(images, key=lambda info: abs((info["bbox"][2] - info["bbox"][0]) * (info["bbox"][3] - info["bbox"][1])))
+        bbox_width_pt = abs(largest["bbox"][2] - largest["bbox"][0])
+        if bbox_width_pt > 0 and largest.get("width"):
+            native_dpi = largest["width"] * 72 / bbox_width_pt
+            dpi = min(dpi, native_dpi)
+    else:
+        dpi = max(dpi, VECTOR_PAGE_MIN_DPI)
+
+    return int(min(max(dpi, settings.PDF_MIN_DPI), settings.PDF_MAX_DPI))
+
+
+def analyze_pdf(content: bytes) -> Tuple[int, List[Tuple[int, str]], List[int]]:
+    """Process-pool task: (total_pages, text_pages, raster_pages) for a PDF"""
+    pdf_document = fitz.open(stream=content, filetype="pdf")
+    try:
+        text_pages, raster_pages = split_pdf_pages(pdf_document)
+        return len(pdf_document), text_pages, raster_pages
+    finally:
+        pdf_document.close()
+
+
+def render_pdf_pages(content: bytes, page_numbers: List[int]) -> List[dict]:
+    """Process-pool task: render pages to raw RGB samples"""
+    pdf_document = fitz.open(stream=content, filetype="pdf")
+    rendered = []
+    try:
+        for page_num in page_numbers:
+            page = pdf_document[page_num]
+            dpi = choose_dpi(page)
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+            rendered.append({
+                "page": page_num,
+                "dpi": dpi,
+                "size": (pix.width, pix.height),
+                "stride": pix.stride,
+                "samples": pix.samples,
+            })
+    finally:
+        pdf_document.close()
+    return rendered
+
+
+def render_hash_pages(content: bytes, page_numbers: Optional[List[int]] = None) -> List[dict]:
+    """
+    Render pages small, for perceptual hashing only (image_hash.py)
+
+    Text-layer pages are never rasterized for the model, but they still need a
+    hash to be matched against saved COAs; a 24 DPI render is plenty for a 16x16
+    dHash.
+    """
+    pdf_document = fitz.open(stream=content, filetype="pdf")
+    rendered = []
+    try:
+        if page_numbers is None:
+            page_numbers = range(min(len(pdf_document), MAX_HASH_PAGES))
+        for page_num in page_numbers:
+            pix = pdf_document[page_num].get_pixmap(dpi=HASH_RENDER_DPI, colorspace=fitz.csRGB, alpha=False)
+            rendered.append({
+                "page": page_num,
+                "dpi": HASH_RENDER_DPI,
+                "size": (pix.width, pix.height),
+                "stride": pix.stride,
+                "samples": pix.samples,
+            })
+    finally:
+        pdf_document.close()
+    return rendered
+
+
+def pdf_hash_images(content: bytes) -> List[Image.Image]:
+    """Small renders of a stored PDF's pages, in this process (called from a thread)"""
+    return [samples_to_image(page) for page in render_hash_pages(content)]
+
+
+def samples_to_image(rendered: dict) -> Image.Image:
+    return Image.frombuffer("RGB", rendered["size"], rendered["samples"], "raw", "RGB", rendered["stride"], 1)
+
+
+async def analyze_pdfs(contents: List[bytes]) -> list:
+    """Analyze several PDFs in parallel; unreadable files come back as their exception"""
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    return await asyncio.gather(*[
+        loop.run_in_executor(pool, analyze_pdf, content) for content in contents
+    ], return_exceptions=True)
+
+
+async def render_pdfs(jobs: List[Tuple[bytes, List[int]]]) -> List[List[dict]]:
+    """
+    Render the given pages of several PDFs in parallel
+
+    Each document's pages are split into chunks across the pool's workers. Returns
+    one list of rendered pages per job, in page order.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    workers = max(1, settings.PDF_RENDER_WORKERS)
+
+    futures = []
+    owners = []
+    for job_idx, (content, page_numbers) in enumerate(jobs):
+        if not page_numbers:
+            continue
+        chunk_size = math.ceil(len(page_numbers) / workers)
+        for start in range(0, len(page_numbers), chunk_size):
+            chunk = page_numbers[start:start + chunk_size]
+            futures.append(loop.run_in_executor(pool, render_pdf_pages, content, chunk))
+            owners.append(job_idx)
+
+    results: List[List[dict]] = [[] for _ in jobs]
+    for job_idx, pages in zip(owners, await asyncio.gather(*futures)):
+        results[job_idx].extend(pages)
+    return results
+
+
+async def render_hash_images(jobs: List[Tuple[bytes, List[int]]]) -> List[List[Image.Image]]:
+    """Small renders of the given pages of several PDFs, in the render pool"""
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    rendered = await asyncio.gather(*[
+        loop.run_in_executor(pool, render_hash_pages, content, pages) for content, pages in jobs
+    ])
+    return [[samples_to_image(page) for page in pages] for pages in rendered]
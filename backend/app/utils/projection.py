@@ -0,0 +1,44 @@
+"""
+Projected Pages - list endpoints that load only the fields they return
+
+List views used to load full documents: nutrition tables, manufacturer details,
+ingredient arrays and image lists. Most of that was thrown away to build a row
+of a dozen fields. Each list now has a small projection model (a plain pydantic
+model next to its Document). Mongo returns only those fields, and pydantic
+validates only those fields. A count that is shown in a row (ingredients,
+documents) is computed in the projection with $size, so the array never leaves
+the database.
+"""
+import asyncio
+from typing import Any, List, Optional, Tuple, Type, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T", bound=BaseModel)
+
+
+async def fetch_page(
+    document,
+    query: Any,
+    projection: Type[T],
+    skip: int = 0,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+) -> Tuple[List[T], int]:
+    """
+    (one page of `projection` items, total matching) for a Beanie query
+
+    `query` is a filter dict or a Beanie expression. The page and the count run
+    concurrently.
+    """
+    find = document.find(query, projection_model=projection)
+    if sort:
+        find = find.sort(sort)
+    find = find.skip(skip)
+    if limit is not None:
+        find = find.limit(limit)
+    return tuple(await asyncio.gather(find.to_list(), document.find(query).count()))
+
+
+async def fetch_all(document, projection: Type[T], query: Any = None) -> List[T]:
+    """Every matching document as `projection` items"""
+    return await document.find(query or {}, projection_model=projection).to_list()
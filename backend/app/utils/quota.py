@@ -0,0 +1,228 @@
+"""
+Model Quota Governor - one requests/tokens-per-minute budget shared by every worker
+
+Each uvicorn worker used to call Gemini on its own, so a burst across the four
+workers overshot the provider's per-minute quota and came back as 429s. The
+budget now lives in a single MongoDB document: a token bucket with one pool for
+requests and one for model tokens, both refilled continuously up to one minute
+of quota. Every acquire is one atomic find_one_and_update (an update pipeline
+that refills by the time elapsed on the server clock, then deducts if both pools
+can cover the call), so workers never disagree about what is left.
+
+Callers that do not fit wait instead of failing: within a worker they line up
+FIFO behind an asyncio lock and only the head of the line polls the bucket,
+sleeping exactly as long as the refill needs. A 429/503 from the provider marks
+the bucket blocked for a jittered, exponentially growing delay, which every
+worker honours before its next call. If MongoDB is unreachable the governor
+lets calls through rather than stopping extraction.
+"""
+import asyncio
+import random
+import time
+from typing import Optional
+from pymongo import ReturnDocument
+from app.models.quota_bucket import QuotaBucket
+from config.settings import settings
+
+
+# Upper bound on a single sleep, so waiters re-check after other workers' refunds
+MAX_POLL_SECONDS = 5.0
+POLL_JITTER_SECONDS = 0.05
+
+# Text tokens are estimated from characters; images fall back to four tiles each
+CHARS_PER_TOKEN = 4
+DEFAULT_IMAGE_TOKENS = 4 * 258
+
+
+class QuotaExhausted(Exception):
+    """The model quota could not be obtained within the caller's patience"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_request_tokens(contents: list, image_tokens: Optional[int] = None) -> int:
+    """Rough prompt + output tokens of a call, used to reserve quota before it is made"""
+    text_tokens = sum(len(part) // CHARS_PER_TOKEN for part in contents if isinstance(part, str))
+    if image_tokens is None:
+        image_tokens = DEFAULT_IMAGE_TOKENS * sum(1 for part in contents if not isinstance(part, str))
+    return text_tokens + image_tokens + settings.GEMINI_OUTPUT_TOKEN_ESTIMATE
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """429 (quota) and 503 (overloaded) responses from the provider"""
+    return getattr(error, "code", None) in (429, 503)
+
+
+class QuotaGovernor:
+    def __init__(self, name: str, rpm: int, tpm: int, enabled: bool = True):
+        self.name = name
+        self.rpm = max(1, rpm)
+        self.tpm = max(1, tpm)
+        self.enabled = enabled
+        self._lock: Optional[asyncio.Lock] = None
+        self.waiting = 0
+        self.granted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.errors = 0
+        self.total_wait_ms = 0.0
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Created lazily so it binds to the running uvicorn event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _acquire_pipeline(self, cost: int) -> list:
+        elapsed = {"$max": [0, {"$divide": [
+            {"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000
+        ]}]}
+        return [
+            {"$set": {
+                "requests": {"$min": [self.rpm, {"$add": [
+                    {"$ifNull": ["$requests", self.rpm]}, {"$multiply": [elapsed, self.rpm / 60.0]}
+                ]}]},
+                "tokens": {"$min": [self.tpm, {"$add": [
+                    {"$ifNull": ["$tokens", self.tpm]}, {"$multiply": [elapsed, self.tpm / 60.0]}
+                ]}]},
+                "updated_at": "$$NOW",
+            }},
+            {"$set": {"granted": {"$and": [
+                {"$gte": ["$requests", 1]},
+                {"$gte": ["$tokens", cost]},
+                {"$lte": [{"$ifNull": ["$blocked_until", "$$NOW"]}, "$$NOW"]},
+            ]}}},
+            {"$set": {
+                "requests": {"$cond": ["$granted", {"$subtract": ["$requests", 1]}, "$requests"]},
+                "tokens": {"$cond": ["$granted", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+            }},
+        ]
+
+    def _wait_seconds(self, bucket: dict, cost: int) -> float:
+        """Time until the bucket (as just refilled) can cover the call"""
+        waits = [0.0]
+        if bucket["requests"] < 1:
+            waits.append((1 - bucket["requests"]) / (self.rpm / 60.0))
+        if bucket["tokens"] < cost:
+            waits.append((cost - bucket["tokens"]) / (self.tpm / 60.0))
+        blocked_until = bucket.get("blocked_until")
+        if blocked_until and blocked_until > bucket["updated_at"]:
+            waits.append((blocked_until - bucket["updated_at"]).total_seconds())
+        return max(waits)
+
+    async def acquire(self, cost: int, max_wait: Optional[float] = None) -> float:
+        """
+        Wait for room for one call of about `cost` tokens; returns seconds waited
+
+        Raises QuotaExhausted when the wait would exceed `max_wait`
+        (GEMINI_QUOTA_MAX_WAIT_SECONDS by default).
+        """
+        if not self.enabled:
+            return 0.0
+        cost = min(cost, self.tpm)
+        max_wait = settings.GEMINI_QUOTA_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        collection = QuotaBucket.get_motor_collection()
+        started = time.perf_counter()
+
+        self.waiting += 1
+        try:
+            async with self._get_lock():
+                while True:
+                    try:
+                        bucket = await collection.find_one_and_update(
+                            {"name": self.name},
+                            self._acquire_pipeline(cost),
+                            upsert=True,
+                            return_document=ReturnDocument.AFTER,
+                        )
+                    except Exception as e:
+                        self.errors += 1
+                        print(f"[WARNING] Quota bucket unavailable, not throttling: {e}")
+                        break
+                    if bucket.get("granted"):
+                        break
+
+                    wait = self._wait_seconds(bucket, cost)
+                    waited = time.perf_counter() - started
+                    if waited + wait > max_wait:
+                        self.rejected += 1
+                        raise QuotaExhausted(
+                            f"Model quota busy, no capacity within {max_wait:.0f}s", retry_after=wait
+                        )
+                    await asyncio.sleep(min(wait, MAX_POLL_SECONDS) + random.uniform(0, POLL_JITTER_SECONDS))
+        finally:
+            self.waiting -= 1
+
+        waited = time.perf_counter() - started
+        self.granted += 1
+        self.total_wait_ms += waited * 1000
+        return waited
+
+    async def settle(self, reserved: int, used: int):
+        """Refund (or charge) the difference between the reservation and actual usage"""
+        if not self.enabled or not used or used == reserved:
+            return
+        await self._credit(min(reserved, self.tpm) - used)
+
+    async def refund(self, reserved: int):
+        """Give back a whole reservation for an attempt that was not billed (429, timeout, cancelled)"""
+        if not self.enabled:
+            return
+        await self._credit(min(reserved, self.tpm))
+
+    async def _credit(self, tokens: int):
+        try:
+            await QuotaBucket.get_motor_collection().update_one(
+                {"name": self.name}, {"$inc": {"tokens": tokens}}
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"[WARNING] Quota settle failed: {e}")
+
+    async def throttle(self, attempt: int) -> float:
+        """
+        Back off after a 429/503; returns the delay to sleep before retrying
+
+        Exponential with jitter (half to full of base * 2^attempt, capped), and
+        shared: the bucket stays blocked for that long for every worker.
+        """
+        self.throttled += 1
+        ceiling = min(settings.GEMINI_BACKOFF_MAX_SECONDS, settings.GEMINI_BACKOFF_BASE_SECONDS * 2 ** attempt)
+        delay = ceiling * random.uniform(0.5, 1.0)
+        if self.enabled:
+            try:
+                await QuotaBucket.get_motor_collection().update_one(
+                    {"name": self.name},
+                    [{"$set": {"blocked_until": {"$max": [
+                        {"$ifNull": ["$blocked_until", "$$NOW"]},
+                        {"$add": ["$$NOW", int(delay * 1000)]},
+                    ]}}}],
+                    upsert=True,
+                )
+            except Exception as e:
+                self.errors += 1
+                print(f"[WARNING] Quota throttle failed: {e}")
+        return delay
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "waiting": self.waiting,
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.total_wait_ms / self.granted, 1) if self.granted else 0.0,
+        }
+
+
+gemini_quota = QuotaGovernor(
+    "gemini",
+    settings.GEMINI_QUOTA_RPM,
+    settings.GEMINI_QUOTA_TPM,
+    enabled=settings.GEMINI_QUOTA_ENABLED,
+)
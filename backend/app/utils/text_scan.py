@@ -0,0 +1,102 @@
+"""
+Label Text Scanner - packing format, dates and FSSAI numbers from model output in one scan
+
+Post-processing used to re-serialize the parsed document for the packing-format
+check and run separate regexes for dates and licence numbers. The scanner works on
+the raw response text: one compiled regex pass collects dd/mm/yy(yy) dates and
+14-digit FSSAI numbers together, and packing keywords are checked in priority
+order against the same lowercased text.
+
+Keywords are matched as substrings, as before ("tin" inside "container" counts);
+the first format in PACKING_FORMATS with any keyword present wins.
+"""
+import re
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+
+
+PACKING_FORMATS = {
+    "sachet": ["sachet", "sachets"],
+    "bottle": ["bottle", "bottles"],
+    "pouch": ["pouch", "pouches"],
+    "jar": ["jar", "jars"],
+    "can": ["can", "cans", "tin"],
+    "tetra pack": ["tetra pack", "tetra pak"],
+    "carton": ["carton", "cartons"],
+    "box": ["box", "boxes"],
+    "pack": ["pack", "packet"],
+    "tub": ["tub", "tubs", "container"],
+}
+
+# Flattened once, in priority order
+PACKING_KEYWORDS: List[Tuple[str, str]] = [
+    (keyword, format_name)
+    for format_name, keywords in PACKING_FORMATS.items()
+    for keyword in keywords
+]
+
+# dd/mm/yy(yy) or a 14-digit licence number; the leading word boundary is checked
+# in code, which lets the engine skip straight to digit pairs
+NUMBER_PATTERN = re.compile(r"\d\d(?:/\d\d/\d{2,4}|\d{12})(?!\w)")
+
+
+class LabelScan(NamedTuple):
+    packing_format: str
+    dates: List[datetime]
+    fssai_numbers: List[str]
+
+    @property
+    def manufacturing_date(self) -> Optional[str]:
+        return self.dates[0].strftime("%d/%m/%Y") if self.dates else None
+
+    @property
+    def expiry_date(self) -> Optional[str]:
+        return self.dates[-1].strftime("%d/%m/%Y") if len(self.dates) > 1 else None
+
+
+def parse_label_date(text: str) -> Optional[datetime]:
+    try:
+        if len(text.split("/")[-1]) == 4:
+            return datetime.strptime(text, "%d/%m/%Y")
+        return datetime.strptime(text, "%d/%m/%y")
+    except ValueError:
+        return None
+
+
+def detect_packing_format(text_lower: str) -> str:
+    for keyword, format_name in PACKING_KEYWORDS:
+        if keyword in text_lower:
+            return format_name
+    return "not specified"
+
+
+def scan_label_text(text, detect_packing: bool = True) -> LabelScan:
+    """Scan model output once for packing format, valid dates (in order) and FSSAI numbers"""
+    if not isinstance(text, str):
+        text = str(text) if text else ""
+
+    dates = []
+    fssai_numbers = []
+    seen_fssai = set()
+    position = 0
+    while True:
+        match = NUMBER_PATTERN.search(text, position)
+        if match is None:
+            break
+        start = match.start()
+        if start and (text[start - 1].isalnum() or text[start - 1] == "_"):
+            # Not at a word boundary; a valid match may still start inside this one
+            position = start + 1
+            continue
+        position = match.end()
+        value = match.group()
+        if "/" in value:
+            parsed = parse_label_date(value)
+            if parsed:
+                dates.append(parsed)
+        elif value not in seen_fssai:
+            seen_fssai.add(value)
+            fssai_numbers.append(value)
+
+    packing_format = detect_packing_format(text.lower()) if detect_packing else "not specified"
+    return LabelScan(packing_format, dates, fssai_numbers)
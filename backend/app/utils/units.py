@@ -0,0 +1,156 @@
+"""
+Unit Conversion Engine - nutrient-aware conversion of COA values to target units
+
+Conversion factors are resolved per (nutrient, unit) pair rather than per unit,
+because some units only make sense for particular nutrients: an International
+Unit is 0.3 mcg of vitamin A but 0.025 mcg of vitamin D. Values are converted as
+NumPy arrays, a whole COA (or a batch of stored COAs) in one call, and cells that
+cannot be converted are reported instead of silently passed through.
+
+All values are on a per 100 g basis, so "%" is read as g/100g and ppm as mg/kg.
+"""
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+# Target units for normalization
+TARGET_UNITS = {
+    "Protein": "g", "Protein (Dry Basis)": "g", "Protein (Wet Basis)": "g",
+    "Total Fat": "g", "Saturated Fat": "g", "Monounsaturated Fat": "g",
+    "Polyunsaturated Fat": "g", "Linoleic Acid": "g", "Alpha-Linolenic Acid": "g",
+    "DHA": "mg", "EPA": "mg", "Trans Fat": "g",
+    "Total Carbohydrates": "g", "Total Sugars": "g", "Added Sugars": "g",
+    "Sucrose": "g", "Added Sucrose": "g",
+    "Dietary Fiber": "g", "Soluble Fiber": "g", "Insoluble Fiber": "g",
+    "FOS (Fructooligosaccharides)": "g", "Moisture": "g", "Ash": "g",
+    "Cholesterol": "mg", "Energy": "kcal",
+    "Sodium": "mg", "Potassium": "mg", "Calcium": "mg", "Iron": "mg",
+    "Zinc": "mg", "Magnesium": "mg", "Phosphorus": "mg", "Chloride": "mg",
+    "Vitamin A": "mcg", "Vitamin D": "mcg", "Vitamin D2": "mcg", "Vitamin D3": "mcg",
+    "Vitamin E": "mg", "Vitamin K": "mcg",
+    "Vitamin C": "mg", "Vitamin B1": "mg", "Vitamin B2": "mg", "Vitamin B3": "mg",
+    "Vitamin B6": "mg", "Vitamin B12": "mcg", "Folic Acid": "mcg",
+    "Biotin": "mcg", "Pantothenic Acid": "mg",
+    "Omega 3 Fatty Acid": "g", "Omega 6 Fatty Acid": "g",
+    "Iodine": "mcg", "Copper": "mcg", "Chromium": "mcg", "Manganese": "mg",
+    "Molybdenum": "mcg", "Selenium": "mcg",
+    "Carnitine": "mg", "Choline": "mg", "Inositol": "mg", "Nucleotides": "mg", "Taurine": "mg",
+}
+
+DEFAULT_TARGET_UNIT = "g"
+
+# Spellings of the same unit, after lowercasing and dropping a "/100g" basis suffix
+UNIT_ALIASES = {
+    "gm": "g", "gms": "g", "gram": "g", "grams": "g", "%": "g", "% w/w": "g", "%w/w": "g",
+    "milligram": "mg", "milligrams": "mg",
+    "μg": "mcg", "µg": "mcg", "ug": "mcg", "microgram": "mcg", "micrograms": "mcg",
+    "mg/kg": "ppm", "mcg/kg": "ppb", "µg/kg": "ppb", "μg/kg": "ppb",
+    "kilocalorie": "kcal", "kilocalories": "kcal", "calories": "kcal",
+    "kilojoule": "kj", "kilojoules": "kj",
+    "i.u.": "iu", "i.u": "iu", "international units": "iu",
+}
+
+BASIS_SUFFIXES = ("/100g", "/100 g", "per 100g", "per 100 g")
+
+# Mass units in grams (per 100 g basis, so ppm = mg/kg = 0.1 mg/100g)
+MASS_FACTORS = {
+    "kg": 1000.0, "g": 1.0, "mg": 1e-3, "mcg": 1e-6,
+    "ppm": 1e-4, "ppb": 1e-7,
+}
+
+# Energy units in kcal
+ENERGY_FACTORS = {"kcal": 1.0, "cal": 1e-3, "kj": 0.239006}
+
+# International Units in grams of the reference compound, per nutrient
+IU_FACTORS = {
+    "Vitamin A": 0.3e-6,    # retinol
+    "Vitamin D": 0.025e-6,  # cholecalciferol / ergocalciferol
+    "Vitamin D2": 0.025e-6,
+    "Vitamin D3": 0.025e-6,
+    "Vitamin E": 0.67e-3,   # d-alpha-tocopherol
+}
+
+
+# Value columns of a COA nutrient row
+VALUE_KEYS = ("min_value", "max_value", "actual_value")
+
+
+def parse_value(value) -> Optional[float]:
+    """Numeric cell value, or None for missing / non-numeric text"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def to_optional_float(value) -> Optional[float]:
+    """Back from an array cell to JSON: NaN becomes None"""
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def canonical_unit(unit: Optional[str]) -> str:
+    """Lowercase, strip the per-100g basis and map aliases to one spelling"""
+    cleaned = (unit or "").strip().lower()
+    for suffix in BASIS_SUFFIXES:
+        if cleaned.endswith(suffix) and cleaned != suffix:
+            cleaned = cleaned[:-len(suffix)].strip()
+            break
+    return UNIT_ALIASES.get(cleaned, cleaned)
+
+
+def target_unit(nutrient_name: str) -> str:
+    return TARGET_UNITS.get(nutrient_name, DEFAULT_TARGET_UNIT)
+
+
+class UnitConverter:
+    """Resolves and caches conversion factors keyed by (nutrient, unit)"""
+
+    def __init__(self):
+        self._factors: Dict[Tuple[str, str], Optional[float]] = {}
+
+    def _base(self, nutrient_name: str, unit: str) -> Optional[Tuple[str, float]]:
+        """(dimension, factor to the dimension's base unit) or None"""
+        if unit in MASS_FACTORS:
+            return "mass", MASS_FACTORS[unit]
+        if unit in ENERGY_FACTORS:
+            return "energy", ENERGY_FACTORS[unit]
+        if unit == "iu" and nutrient_name in IU_FACTORS:
+            return "mass", IU_FACTORS[nutrient_name]
+        return None
+
+    def factor(self, nutrient_name: str, unit: Optional[str]) -> Optional[float]:
+        """Multiplier from `unit` to the nutrient's target unit, or None if not convertible"""
+        key = (nutrient_name, canonical_unit(unit))
+        if key in self._factors:
+            return self._factors[key]
+
+        source = self._base(nutrient_name, key[1])
+        target = self._base(nutrient_name, canonical_unit(target_unit(nutrient_name)))
+        factor = None
+        if source and target and source[0] == target[0]:
+            factor = source[1] / target[1]
+        self._factors[key] = factor
+        return factor
+
+    def convert_rows(self, nutrient_names: List[str], units: List[Optional[str]], values) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert a table of values in one vectorized pass
+
+        `values` is an (n, k) array (NaN for missing cells) with one row per
+        nutrient. Returns (converted, convertible) where rows that cannot be
+        converted keep their original values and are False in `convertible`.
+        """
+        array = np.asarray(values, dtype=float)
+        if array.size == 0:
+            return array, np.zeros(len(nutrient_names), dtype=bool)
+
+        factors = np.array([self.factor(name, unit) for name, unit in zip(nutrient_names, units)], dtype=float)
+        convertible = ~np.isnan(factors)
+        scaled = np.round(array * np.where(convertible, factors, 1.0)[:, None], 6)
+        return np.where(convertible[:, None], scaled, array), convertible
+
+
+unit_converter = UnitConverter()
@@ -0,0 +1,130 @@
+"""
+Upload Handling - bounded reads of multipart files for the extract endpoints
+
+By the time a route runs, Starlette has already parsed the multipart body and
+spooled each file. The raw body is capped while it streams in by
+UploadLimitMiddleware (app/middleware/upload_limit.py). Here each spooled file
+is checked against the per-file cap and the route's remaining per-request
+budget before it is copied into memory. It is then copied in chunks, with a
+SHA-256 computed along the way (used as the cache/dedup key), and its type is
+checked from its magic bytes before anything is decoded.
+"""
+import hashlib
+from typing import List, Optional, Sequence
+from fastapi import HTTPException, UploadFile
+from config.settings import settings
+
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+SNIFF_BYTES = 16
+
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff")
+COA_TYPES = IMAGE_TYPES + ("application/pdf",)
+ARCHIVE_TYPES = ("application/zip",)
+
+MAGIC_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"%PDF-", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+]
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Identify a file from its first bytes, ignoring the client-supplied type"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+class UploadedFile:
+    """An upload read into memory together with its verified type and hash"""
+
+    __slots__ = ("filename", "content_type", "data", "sha256")
+
+    def __init__(self, filename: str, content_type: str, data: bytes, sha256: str):
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+        self.sha256 = sha256
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+async def read_upload(
+    upload: UploadFile,
+    allowed_types: Sequence[str],
+    max_file_bytes: int,
+    remaining_request_bytes: int,
+) -> UploadedFile:
+    """Copy one spooled upload into memory, stopping as soon as a size cap or type check fails"""
+    filename = upload.filename or "upload"
+    limit = min(max_file_bytes, remaining_request_bytes)
+
+    # The spooled size is known after parsing: reject before copying anything
+    declared_size = getattr(upload, "size", None)
+    if declared_size is not None and declared_size > limit:
+        raise_too_large(filename, declared_size > max_file_bytes)
+
+    hasher = hashlib.sha256()
+    chunks = []
+    total = 0
+    content_type = None
+
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+
+        if content_type is None:
+            content_type = sniff_content_type(chunk[:SNIFF_BYTES])
+            if content_type not in allowed_types:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unsupported file type: {filename}. Allowed: {', '.join(allowed_types)}"
+                )
+
+        total += len(chunk)
+        if total > limit:
+            raise_too_large(filename, total > max_file_bytes)
+
+        hasher.update(chunk)
+        chunks.append(chunk)
+
+    if total == 0:
+        raise HTTPException(status_code=400, detail=f"Empty file: {filename}")
+
+    return UploadedFile(filename, content_type, b"".join(chunks), hasher.hexdigest())
+
+
+def raise_too_large(filename: str, file_limit_hit: bool):
+    if file_limit_hit:
+        detail = f"File too large: {filename}. Maximum {settings.UPLOAD_MAX_FILE_MB} MB per file"
+    else:
+        detail = f"Upload too large. Maximum {settings.UPLOAD_MAX_REQUEST_MB} MB per request"
+    raise HTTPException(status_code=413, detail=detail)
+
+
+async def read_uploads(uploads: List[UploadFile], allowed_types: Sequence[str]) -> List[UploadedFile]:
+    """Read all files of a request within the configured per-file and per-request caps"""
+    max_file_bytes = settings.UPLOAD_MAX_FILE_MB * 1024 * 1024
+    remaining = settings.UPLOAD_MAX_REQUEST_MB * 1024 * 1024
+
+    files = []
+    for upload in uploads:
+        uploaded = await read_upload(upload, allowed_types, max_file_bytes, remaining)
+        remaining -= uploaded.size
+        files.append(uploaded)
+        # Release the spooled temp file as soon as its bytes are in hand
+        await upload.close()
+    return files
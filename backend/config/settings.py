@@ -31,6 +31,63 @@ class Settings(BaseSettings):
     DEBUG: bool = False
     LOG_LEVEL: str = "INFO"
     GEMINI_API_KEY: Optional[str] = None
+    GEMINI_MAX_CONCURRENCY: int = 4
+    GEMINI_BASE_URL: Optional[str] = None
+    GEMINI_TIMEOUT_SECONDS: float = 120.0
+    GEMINI_QUOTA_ENABLED: bool = True
+    GEMINI_QUOTA_RPM: int = 1000
+    GEMINI_QUOTA_TPM: int = 1_000_000
+    GEMINI_QUOTA_MAX_WAIT_SECONDS: float = 120.0
+    GEMINI_OUTPUT_TOKEN_ESTIMATE: int = 4000
+    GEMINI_RATE_LIMIT_RETRIES: int = 4
+    GEMINI_BACKOFF_BASE_SECONDS: float = 1.0
+    GEMINI_BACKOFF_MAX_SECONDS: float = 30.0
+    GEMINI_ATTEMPT_TIMEOUT_SECONDS: float = 90.0
+    GEMINI_DEADLINE_SECONDS: float = 180.0
+    GEMINI_TRANSIENT_RETRIES: int = 2
+    GEMINI_HEDGE_ENABLED: bool = True
+    GEMINI_HEDGE_PERCENTILE: float = 90.0
+    GEMINI_HEDGE_MIN_SAMPLES: int = 20
+    GEMINI_HEDGE_MIN_DELAY_SECONDS: float = 2.0
+    GEMINI_LATENCY_WINDOW: int = 200
+    UPLOAD_DIR: str = "uploads"
+    UPLOAD_MAX_FILE_MB: int = 15
+    UPLOAD_MAX_REQUEST_MB: int = 45
+    BATCH_EXTRACTION_CONCURRENCY: int = 4
+    BATCH_MAX_PRODUCTS: int = 100
+    BATCH_MAX_ARCHIVE_MB: int = 45
+    BATCH_MAX_UNCOMPRESSED_MB: int = 500
+    EXTRACTION_JOB_WORKERS: int = 2
+    EXTRACTION_JOB_POLL_SECONDS: float = 2.0
+    EXTRACTION_JOB_LEASE_SECONDS: int = 120
+    EXTRACTION_JOB_MAX_ATTEMPTS: int = 3
+    EXTRACTION_JOB_MAX_QUOTA_WAITS: int = 12
+    EXTRACTION_JOB_TTL_SECONDS: int = 7 * 24 * 3600
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+    EXTRACTION_CACHE_MAX_MB: int = 512
+    EXTRACTION_REASK_ENABLED: bool = True
+    NOMENCLATURE_REFRESH_SECONDS: float = 30.0
+    NOMENCLATURE_FUZZY_THRESHOLD: float = 0.85
+    NOMENCLATURE_FUZZY_MARGIN: float = 0.05
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 2048
+    IMAGE_JPEG_QUALITY: int = 90
+    IMAGE_CROP_BORDERS: bool = False
+    IMAGE_CROP_MODE: str = "full"
+    IMAGE_MAX_REGIONS: int = 4
+    IMAGE_OVERVIEW_EDGE: int = 768
+    IMAGE_DEDUP_ENABLED: bool = True
+    IMAGE_DEDUP_MAX_DISTANCE: int = 6
+    IMAGE_THUMB_EDGE: int = 320
+    IMAGE_MEDIUM_EDGE: int = 1280
+    IMAGE_VARIANT_WORKERS: int = 2
+    IMAGE_ACCEL_REDIRECT_PREFIX: Optional[str] = None
+    PDF_TEXT_LAYER_ENABLED: bool = True
+    PDF_TEXT_MIN_CHARS: int = 200
+    PDF_RENDER_WORKERS: int = 2
+    PDF_MIN_DPI: int = 100
+    PDF_MAX_DPI: int = 300
     
     @field_validator('DEBUG', mode='before')
     @classmethod
@@ -44,6 +101,15 @@ class Settings(BaseSettings):
                 return False
         return bool(v)
     
+    @field_validator('IMAGE_DEDUP_MAX_DISTANCE')
+    @classmethod
+    def check_dedup_distance(cls, v):
+        # Hashes are stored as 8 exact-match bands (image_hash.BANDS); the indexed
+        # lookup only finds every stored duplicate within BANDS - 1 bits
+        if not 0 <= v <= 7:
+            raise ValueError("IMAGE_DEDUP_MAX_DISTANCE must be between 0 and 7")
+        return v
+    
     def get_azure_authority(self) -> str:
         if self.AZURE_AUTHORITY:
             return self.AZURE_AUTHORITY
@@ -1,9 +1,16 @@
 from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from app.database import Database
-from app.routes import auth, users, products, categories, nomenclature, coa, formulations
+from app.routes import auth, users, products, categories, nomenclature, coa, formulations, jobs, images
 from app.middleware.security import configure_cors, configure_rate_limiting
+from app.middleware.upload_limit import configure_upload_limit
+from app.utils.gemini import gemini_executor
+from app.utils.job_queue import extraction_jobs
+from app.utils.extraction_cache import extraction_cache
+from app.utils.nomenclature import nomenclature_engine
+from app.utils.pdf_pages import shutdown_render_pool
+from app.utils.image_variants import image_variants
+from app.utils.fast_json import ORJSONResponse
 from config.settings import settings
 
 
@@ -13,6 +20,9 @@ async def lifespan(app: FastAPI):
     print("=" * 60)
     print("Starting NutriEyeQ Backend...")
     await Database.connect_db()
+    gemini_executor.start()
+    await nomenclature_engine.refresh()
+    await extraction_jobs.start()
     print(f"[OK] Server ready at http://localhost:8000")
     print(f"[OK] API Documentation: http://localhost:8000/docs")
     print("=" * 60)
@@ -20,6 +30,10 @@ async def lifespan(app: FastAPI):
     yield
     
     print("\nShutting down...")
+    await extraction_jobs.stop()
+    await gemini_executor.close()
+    shutdown_render_pool()
+    image_variants.shutdown()
     await Database.close_db()
     print("Server stopped")
 
@@ -29,11 +43,13 @@ app = FastAPI(
     description="Product packaging data extraction and benchmarking API",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None
 )
 
 
+configure_upload_limit(app)
 configure_cors(app)
 configure_rate_limiting(app)
 
@@ -75,6 +91,8 @@ app.include_router(categories.router, prefix="/api")
 app.include_router(nomenclature.router, prefix="/api")
 app.include_router(coa.router, prefix="/api")
 app.include_router(formulations.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(images.router, prefix="/api")
 
 
 @app.get("/")
@@ -92,14 +110,18 @@ async def health():
     return {
         "status": "healthy",
         "app": settings.APP_NAME,
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "extraction": gemini_executor.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "nomenclature": nomenclature_engine.stats(),
+        "image_variants": image_variants.stats()
     }
 
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     if settings.DEBUG:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "detail": str(exc),
@@ -108,7 +130,7 @@ async def global_exception_handler(request: Request, exc: Exception):
             }
         )
     else:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"detail": "Internal server error"}
         )
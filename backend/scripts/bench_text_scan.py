@@ -0,0 +1,99 @@
+"""
+Benchmark the label text scanner against the previous three-pass post-processing
+
+Builds a synthetic multi-variant model response (or reads one from --file) and
+times json.dumps + substring packing check + separate date and FSSAI regexes
+versus scan_label_text over the raw response, checking both give the same result.
+
+    python -m scripts.bench_text_scan --variants 40 --iterations 500
+    python -m scripts.bench_text_scan --file response.json
+"""
+import argparse
+import json
+import re
+import time
+from datetime import datetime
+
+from app.utils.text_scan import PACKING_FORMATS, scan_label_text
+
+
+def legacy_scan(product_data: dict, raw_json: str):
+    text_lower = json.dumps(product_data).lower()
+    packing = "not specified"
+    for format_name, keywords in PACKING_FORMATS.items():
+        if any(keyword in text_lower for keyword in keywords):
+            packing = format_name
+            break
+
+    dates = []
+    for ds in re.findall(r"\b\d{2}/\d{2}/\d{2,4}\b", raw_json):
+        try:
+            fmt = "%d/%m/%Y" if len(ds.split("/")[-1]) == 4 else "%d/%m/%y"
+            dates.append(datetime.strptime(ds, fmt))
+        except ValueError:
+            continue
+
+    fssai = set(re.findall(r"\b\d{14}\b", raw_json))
+    return packing, dates, fssai
+
+
+def sample_response(variants: int) -> dict:
+    def product(name: str) -> dict:
+        return {
+            "product_name": name,
+            "packing_format": "not specified",
+            "nutrition_table": [
+                {"nutrient_name": f"Nutrient {i}", "values": {"Per 100g": f"{i}.5 g", "Per Serve (30g)": f"{i * 0.3:.1f} g"}}
+                for i in range(25)
+            ],
+            "manufacturer_details": [
+                {"type": "Manufactured by", "name": "Sample Foods Pvt Ltd", "address": "Plot 12, Industrial Area", "fssai": "10012345678901"}
+            ],
+            "dates": {"manufacturing_date": "01/02/2024", "expiry_date": "01/08/2024", "shelf_life": "6 months"},
+            "other_important_text": ["Store in a cool and dry place", "Best before 6 months from manufacture"],
+        }
+
+    return {
+        "product_type": "parent_child",
+        "parent_product": product("Sample Assorted Biscuits"),
+        "child_variants": [product(f"Variant {i}") for i in range(variants)],
+    }
+
+
+def bench(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-pass label scanning")
+    parser.add_argument("--file", help="Raw model response to scan")
+    parser.add_argument("--variants", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            raw_json = f.read()
+        product_data = json.loads(raw_json)
+    else:
+        product_data = sample_response(args.variants)
+        raw_json = json.dumps(product_data, indent=2)
+
+    legacy = legacy_scan(product_data, raw_json)
+    scan = scan_label_text(raw_json)
+    assert legacy[1] == scan.dates and legacy[2] == set(scan.fssai_numbers), "scanner disagrees with legacy regexes"
+
+    legacy_us = bench(lambda: legacy_scan(product_data, raw_json), args.iterations)
+    scan_us = bench(lambda: scan_label_text(raw_json), args.iterations)
+
+    print(f"Response: {len(raw_json)} chars, packing={scan.packing_format}, "
+          f"{len(scan.dates)} dates, {len(scan.fssai_numbers)} FSSAI numbers")
+    print(f"legacy (dumps + 3 passes): {legacy_us:8.1f} us")
+    print(f"scan_label_text:           {scan_us:8.1f} us  ({legacy_us / scan_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Gemini Stand-in - a local HTTP server that answers like the generateContent API
+
+Used for load tests and offline development. Start it, then point the backend
+at it with GEMINI_BASE_URL:
+
+    python -m scripts.gemini_standin --port 8090 --latency-ms 1500
+    GEMINI_BASE_URL=http://localhost:8090 uvicorn main:app
+
+Responses are canned JSON (a product or COA sample, picked from the prompt)
+unless --response-file is given. Latency is simulated with an async sleep, so
+one stand-in process can hold many concurrent requests open. --rpm-limit answers
+429 once more than that many requests arrived in the last minute, to exercise
+the quota governor under burst.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+PRODUCT_RESPONSE = {
+    "product_type": "single",
+    "parent_product": {
+        "brand": {"parent_brand": "Stand-in Foods", "sub_brand": "Sample"},
+        "product_name": "Sample Cookies",
+        "variant": "Classic",
+        "weight_and_size": {"net_weight": "200 g", "pack_size": "", "serving_size": "20 g", "servings_per_pack": "10"},
+        "pricing": {"mrp": 40.0, "uspf": ""},
+        "packing_format": "pouch",
+        "nutrition_table": [
+            {"nutrient_name": "Energy (kcal)", "values": {"Per 100g": "503 kcal", "Per Serve (20g)": "101 kcal", "% RDA": "5%"}},
+            {"nutrient_name": "Protein", "values": {"Per 100g": "7.2 g", "Per Serve (20g)": "1.4 g", "% RDA": "not specified"}},
+        ],
+        "ingredients": "Wheat flour, sugar, edible vegetable oil",
+        "allergen_info": "Contains wheat",
+        "claims": [],
+        "storage_instructions": "",
+        "instructions_to_use": "",
+        "manufacturer_details": [
+            {"type": "Manufactured by", "name": "Stand-in Foods Pvt Ltd", "address": "Bengaluru", "fssai": "10012345678901"}
+        ],
+        "batch_codes": {"lot_number": "", "machine_code": ""},
+        "dates": {"manufacturing_date": "01/01/2025", "expiry_date": "30/06/2025", "shelf_life": "6 months"},
+        "barcode": "",
+        "certifications": [],
+        "symbols": {"veg_nonveg": "veg", "recyclable": ""},
+        "customer_care": {"phone": [], "email": "", "website": ""},
+        "other_important_text": [],
+    },
+    "child_variants": [],
+}
+
+COA_RESPONSE = {
+    "document_type": "COA",
+    "extraction_date": "2025-01-01",
+    "ingredient_info": {
+        "ingredient_name": "Sample Whey Protein",
+        "lot_number": "B001",
+        "supplier_name": "Stand-in Labs",
+        "manufacturing_date": "01/01/2025",
+        "expiry_date": "01/01/2026",
+        "shelf_life": "12 months",
+        "storage_condition": "",
+    },
+    "nutritional_data": [
+        {"nutrient_name": "Protein", "nutrient_name_raw": "Protein (N x 6.25)", "min_value": 78.0, "max_value": 82.0,
+         "actual_value": 80.1, "unit": "g", "unit_raw": "%", "basis": "per 100g"},
+        {"nutrient_name": "Moisture", "nutrient_name_raw": "Moisture", "min_value": None, "max_value": 5.0,
+         "actual_value": 4.2, "unit": "g", "unit_raw": "%", "basis": "per 100g"},
+    ],
+    "other_parameters": [],
+    "certifications": [],
+    "additional_notes": [],
+}
+
+
+def build_app(latency_ms: float, jitter_ms: float, error_rate: float, canned: dict = None,
+              rpm_limit: int = 0) -> FastAPI:
+    app = FastAPI(title="Gemini Stand-in")
+    recent = deque()
+
+    def pick_response(body: dict) -> str:
+        if canned is not None:
+            return json.dumps(canned)
+        prompt = " ".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        return json.dumps(COA_RESPONSE if "Certificate of Analysis" in prompt else PRODUCT_RESPONSE)
+
+    def usage(body: dict, text: str) -> dict:
+        # Rough estimate: 4 bytes per token for text, 258 tokens per inline image
+        prompt_tokens = 0
+        for content in body.get("contents", []):
+            for part in content.get("parts", []):
+                if "inlineData" in part or "inline_data" in part:
+                    prompt_tokens += 258
+                else:
+                    prompt_tokens += len(part.get("text", "")) // 4
+        output_tokens = len(text) // 4
+        return {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        }
+
+    def candidate(text: str, finish: bool = True) -> dict:
+        result = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        if finish:
+            result["finishReason"] = "STOP"
+        return result
+
+    def check_rate_limit():
+        if not rpm_limit:
+            return
+        now = time.monotonic()
+        while recent and now - recent[0] > 60:
+            recent.popleft()
+        if len(recent) >= rpm_limit:
+            raise HTTPException(status_code=429, detail="Stand-in simulated RESOURCE_EXHAUSTED")
+        recent.append(now)
+
+    async def simulate_latency():
+        delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+        await asyncio.sleep(max(delay, 0) / 1000)
+        if random.random() < error_rate:
+            raise HTTPException(status_code=503, detail="Stand-in simulated overload")
+
+    @app.post("/{api_version}/models/{model_action}")
+    async def generate(api_version: str, model_action: str, request: Request):
+        model, _, action = model_action.partition(":")
+        body = await request.json()
+        text = pick_response(body)
+        check_rate_limit()
+
+        if action == "generateContent":
+            await simulate_latency()
+            return JSONResponse({
+                "candidates": [candidate(text)],
+                "usageMetadata": usage(body, text),
+                "modelVersion": model,
+            })
+
+        if action == "streamGenerateContent":
+            await simulate_latency()
+
+            async def chunks():
+                step = max(1, len(text) // 8)
+                pieces = [text[i:i + step] for i in range(0, len(text), step)]
+                for idx, piece in enumerate(pieces):
+                    last = idx == len(pieces) - 1
+                    chunk = {"candidates": [candidate(piece, finish=last)], "modelVersion": model}
+                    if last:
+                        chunk["usageMetadata"] = usage(body, text)
+                    yield f"data: {json.dumps(chunk)}\r\n\r\n"
+                    await asyncio.sleep(0.05)
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        raise HTTPException(status_code=404, detail=f"Unsupported action: {action}")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini generateContent API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=1500)
+    parser.add_argument("--jitter-ms", type=float, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="Answer 429 above this many requests per minute")
+    parser.add_argument("--response-file", help="JSON file returned as the model output for every request")
+    args = parser.parse_args()
+
+    canned = None
+    if args.response_file:
+        with open(args.response_file, "r", encoding="utf-8") as f:
+            canned = json.load(f)
+
+    app = build_app(args.latency_ms, args.jitter_ms, args.error_rate, canned, args.rpm_limit)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
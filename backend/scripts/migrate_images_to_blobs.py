@@ -0,0 +1,298 @@
+"""
+Move base64 images stored on products / COAs into the blob store
+
+Records saved before the blob store hold their images as data URLs in
+`images` (products) and `document_images` (COAs). This walks each collection
+in _id order with a batched cursor. Every data URL is decoded and written to
+the store once (identical images share one blob), and each record is rewritten
+with a targeted $set of its references and image hashes; records hashed on an
+older grid size are re-hashed. Variants are rendered unless --skip-variants is
+given.
+
+A checkpoint (the last _id done per collection) is saved after every batch, so
+an interrupted run picks up where it stopped; --restart ignores it. A record
+edited between the read and the write is re-read and migrated again; if it
+keeps changing, the checkpoint stays below it so the next run revisits it.
+--max-mb-per-second caps how fast documents are read from Mongo, and
+--pause sleeps between batches, so it can run next to production traffic. Each
+batch reports what was read from Mongo, written to the store and saved.
+
+    python -m scripts.migrate_images_to_blobs --dry-run
+    python -m scripts.migrate_images_to_blobs --batch-size 20 --max-mb-per-second 10
+    python -m scripts.migrate_images_to_blobs --collection coa --restart
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.database import Database
+from app.models.coa import COA
+from app.models.product import Product
+from app.utils.blob_store import blob_store, decode_data_url, is_data_url, parse_ref
+from app.utils.image_hash import stored_image_hashes, hash_hex_length, PRODUCT_HASH_SIZE, DOCUMENT_HASH_SIZE
+from app.utils.image_variants import image_variants
+from app.utils.uploads import sniff_content_type
+from config.settings import settings
+
+
+# collection name -> (document, image field, hash grid size)
+TARGETS = {
+    "products": (Product, "images", PRODUCT_HASH_SIZE),
+    "coa": (COA, "document_images", DOCUMENT_HASH_SIZE),
+}
+
+MB = 1024 * 1024
+
+# Re-reads of records edited between the read and the write, per batch
+MAX_CONFLICT_RETRIES = 3
+
+
+class Stats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.scanned = 0
+        self.migrated = 0
+        self.conflicts = 0
+        self.retried = 0
+        # Lowest _id that could not be migrated; the checkpoint must stay below it
+        self.held_at = None
+        self.images = 0
+        self.blobs_written = 0
+        self.blobs_reused = 0
+        self.bad_images = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.bytes_saved = 0
+
+    def line(self, name: str) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (
+            f"{name}: {self.scanned} scanned, {self.migrated} migrated, {self.retried} retried, "
+            f"{self.conflicts} still changing | "
+            f"{self.images} images -> {self.blobs_written} new blobs, {self.blobs_reused} reused, "
+            f"{self.bad_images} undecodable | read {self.bytes_read / MB:.1f} MB "
+            f"({self.bytes_read / MB / elapsed:.1f} MB/s), wrote {self.bytes_written / MB:.1f} MB, "
+            f"documents {self.bytes_saved / MB:.1f} MB smaller, {elapsed:.1f}s"
+        )
+
+
+def load_checkpoint(path: str) -> Dict[str, str]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, str]):
+    """Atomic write, so an interrupted run never leaves a half-written checkpoint"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def store_value(value: str, stats: Stats, dry_run: bool) -> str:
+    """Blob reference for one data URL; counts whether the blob was new or reused"""
+    data = decode_data_url(value)
+    if not data:
+        stats.bad_images += 1
+        return value
+    stats.images += 1
+    sha256 = hashlib.sha256(data).hexdigest()
+    if blob_store.exists(sha256):
+        stats.blobs_reused += 1
+    else:
+        stats.blobs_written += 1
+        stats.bytes_written += len(data)
+        if not dry_run:
+            blob_store.put(data)
+    return blob_store.ref(sha256, sniff_content_type(data[:16]))
+
+
+def migrate_document(doc: dict, field: str, hash_size: int, stats: Stats, dry_run: bool) -> Optional[dict]:
+    """$set for one record, or None if it has nothing to migrate"""
+    values = doc.get(field) or []
+    has_data_urls = any(is_data_url(value) for value in values)
+    hashes = doc.get("image_hashes") or []
+    # Hashes taken on a different grid size (e.g. the old 8x8 product hashes) never match new ones
+    needs_hashes = len(values) > 0 and (
+        not hashes or any(len(h) != hash_hex_length(hash_size) for h in hashes)
+    )
+    if not has_data_urls and not needs_hashes:
+        return None
+
+    refs = [store_value(value, stats, dry_run) if is_data_url(value) else value for value in values]
+    stats.bytes_saved += sum(len(v) for v in values) - sum(len(r) for r in refs)
+
+    # Hash from the original values: the bytes are already in memory, and a
+    # dry run has not written the blobs the references point to
+    update = {field: refs}
+    update.update(stored_image_hashes(values, hash_size))
+    return update
+
+
+def migrate_batch(docs: list, field: str, hash_size: int, stats: Stats, dry_run: bool) -> list:
+    """Returns [(doc, $set)] for the records in a batch that change"""
+    changes = []
+    for doc in docs:
+        update = migrate_document(doc, field, hash_size, stats, dry_run)
+        if update is not None:
+            changes.append((doc, update))
+    return changes
+
+
+async def render_variants(changes: list, field: str):
+    shas = {
+        parse_ref(value)
+        for _, update in changes
+        for value in update[field]
+        if parse_ref(value) and not value.endswith(".pdf")
+    }
+    await asyncio.gather(*(image_variants.render(sha256) for sha256 in shas))
+
+
+async def migrate_collection(name: str, args, checkpoint: Dict[str, str]):
+    document, field, hash_size = TARGETS[name]
+    collection = document.get_motor_collection()
+    stats = Stats()
+
+    query = {}
+    if checkpoint.get(name):
+        query["_id"] = {"$gt": ObjectId(checkpoint[name])}
+        print(f"[OK] {name}: resuming after {checkpoint[name]}")
+
+    cursor = collection.find(query, projection(field)).sort("_id", 1).batch_size(args.batch_size)
+
+    batch, batch_bytes = [], 0
+    async for doc in cursor:
+        batch.append(doc)
+        batch_bytes += sum(len(value) for value in doc.get(field) or [] if isinstance(value, str))
+        if len(batch) < args.batch_size:
+            continue
+        await migrate_and_save(name, batch, batch_bytes, field, hash_size, collection, stats, checkpoint, args)
+        batch, batch_bytes = [], 0
+
+    if batch:
+        await migrate_and_save(name, batch, batch_bytes, field, hash_size, collection, stats, checkpoint, args)
+
+    mode = "[OK] Dry run" if args.dry_run else "[OK] Done"
+    print(f"{mode} - {stats.line(name)}")
+    if stats.held_at is not None:
+        print(f"[WARNING] {name}: checkpoint held before {stats.held_at}; run again to retry the records that kept changing")
+
+
+def projection(field: str) -> dict:
+    return {field: 1, "image_hashes": 1, "updated_at": 1}
+
+
+async def write_changes(collection, changes: list, field: str, hash_size: int, stats: Stats) -> list:
+    """
+    Apply the $sets of a batch; returns the ids still unmigrated after retries
+
+    The filter matches updated_at, so a record edited since it was read is not
+    overwritten. Any PUT bumps updated_at, including ones that leave the images
+    alone, so such records are re-read and migrated again from their new state.
+    """
+    unresolved = []
+    for attempt in range(MAX_CONFLICT_RETRIES + 1):
+        if not changes:
+            return []
+        operations = [
+            UpdateOne({"_id": doc["_id"], "updated_at": doc.get("updated_at")}, {"$set": update})
+            for doc, update in changes
+        ]
+        result = await collection.bulk_write(operations, ordered=False)
+        stats.migrated += result.modified_count
+        if result.matched_count == len(operations):
+            return []
+
+        # The writes do not touch updated_at: a different value means the guard missed
+        expected = {doc["_id"]: doc.get("updated_at") for doc, _ in changes}
+        current = await collection.find({"_id": {"$in": list(expected)}}, {"updated_at": 1}).to_list(None)
+        unresolved = [doc["_id"] for doc in current if doc.get("updated_at") != expected[doc["_id"]]]
+        if not unresolved or attempt == MAX_CONFLICT_RETRIES:
+            break
+
+        stats.retried += len(unresolved)
+        fresh = await collection.find({"_id": {"$in": unresolved}}, projection(field)).to_list(None)
+        changes = await asyncio.to_thread(migrate_batch, fresh, field, hash_size, stats, False)
+    return unresolved
+
+
+async def migrate_and_save(name: str, batch: list, batch_bytes: int, field: str, hash_size: int,
+                           collection, stats: Stats, checkpoint: Dict[str, str], args):
+    stats.scanned += len(batch)
+    stats.bytes_read += batch_bytes
+    changes = await asyncio.to_thread(migrate_batch, batch, field, hash_size, stats, args.dry_run)
+
+    if changes and not args.dry_run:
+        unresolved = await write_changes(collection, changes, field, hash_size, stats)
+        if unresolved:
+            stats.conflicts += len(unresolved)
+            lowest = min(unresolved)
+            if stats.held_at is None or lowest < stats.held_at:
+                stats.held_at = lowest
+        if not args.skip_variants:
+            await render_variants(changes, field)
+    else:
+        stats.migrated += len(changes)
+
+    if not args.dry_run:
+        if stats.held_at is None:
+            checkpoint[name] = str(batch[-1]["_id"])
+        else:
+            # Advance only up to the record before the first one left unmigrated
+            done = [doc["_id"] for doc in batch if doc["_id"] < stats.held_at]
+            if done and (not checkpoint.get(name) or done[-1] > ObjectId(checkpoint[name])):
+                checkpoint[name] = str(done[-1])
+        save_checkpoint(args.checkpoint, checkpoint)
+    print(f"[OK] {stats.line(name)}")
+
+    # Throttle: keep the average read rate under the cap, plus a fixed pause
+    delay = args.pause
+    if args.max_mb_per_second:
+        elapsed = time.perf_counter() - stats.started
+        delay += max(0.0, stats.bytes_read / MB / args.max_mb_per_second - elapsed)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+async def run(args):
+    checkpoint = {} if args.restart else load_checkpoint(args.checkpoint)
+    await Database.connect_db()
+    try:
+        for name in TARGETS if args.collection == "all" else [args.collection]:
+            await migrate_collection(name, args, checkpoint)
+    finally:
+        image_variants.shutdown()
+        await Database.close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move base64 images on products and COAs into the blob store")
+    parser.add_argument("--collection", choices=["all", *TARGETS], default="all")
+    parser.add_argument("--batch-size", type=int, default=20,
+                        help="Records per batch; keep small, legacy records can be several MB each")
+    parser.add_argument("--max-mb-per-second", type=float, default=20,
+                        help="Cap on image data read from Mongo (0 for no cap)")
+    parser.add_argument("--pause", type=float, default=0, help="Seconds to sleep after each batch")
+    parser.add_argument("--checkpoint", default=os.path.join(settings.UPLOAD_DIR, "migrate_images_checkpoint.json"))
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning")
+    parser.add_argument("--skip-variants", action="store_true", help="Leave thumb / medium to be rendered on first use")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without writing")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Re-normalize stored COA units after TARGET_UNITS or conversion factors change
+
+Walks the coa collection in cursor batches, converts every nutrient row from its
+stored unit to the current target unit (one vectorized pass per batch), rebuilds
+master_entry and writes back only the documents that changed. Converting from
+the stored values keeps any edits made in the review form.
+
+Rows saved before raw values were kept went through the old flat table: IU was
+0.3 mcg for every vitamin, and any unit missing from it (ppm, mg/kg,
+kcal/100g...) was scaled as if it were grams. Such rows are first recovered by
+inverting the old conversion, then converted from their printed unit with the
+current engine; rows it cannot convert are flagged with unit_error.
+
+    python -m scripts.renormalize_coa_units --dry-run
+    python -m scripts.renormalize_coa_units --batch-size 500
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Optional, Tuple
+from pymongo import UpdateOne
+
+from app.database import Database
+from app.models.coa import COA
+from app.routes.coa import build_master_entry
+from app.utils.units import unit_converter, target_unit, parse_value, to_optional_float, VALUE_KEYS
+
+
+# Flat per-unit table used before conversions became nutrient-aware; units
+# missing from it got factor 1
+LEGACY_UNIT_CONVERSIONS = {
+    "kg": 1000, "g": 1, "gm": 1, "gram": 1, "grams": 1,
+    "mg": 0.001, "milligram": 0.001, "milligrams": 0.001,
+    "mcg": 0.000001, "μg": 0.000001, "µg": 0.000001, "ug": 0.000001,
+    "microgram": 0.000001, "micrograms": 0.000001,
+    "kcal": 1, "cal": 0.001, "kj": 0.239006,
+    "kilojoule": 0.239006, "kilojoules": 0.239006,
+    "iu": 0.3,
+}
+
+
+def is_legacy_row(row: dict) -> bool:
+    """Saved by the old table with a printed unit that differs from the stored one"""
+    raw_unit = (row.get("unit_raw") or "").strip().lower()
+    stored_unit = (row.get("unit") or "").strip().lower()
+    return "raw_values" not in row and bool(raw_unit) and bool(stored_unit) and raw_unit != stored_unit
+
+
+def source_values(row: dict) -> Tuple[list, Optional[str], bool]:
+    """(values, unit they are in, recovered from the legacy table) for a stored nutrient row"""
+    stored = [parse_value(row.get(key)) for key in VALUE_KEYS]
+    if not is_legacy_row(row):
+        return stored, row.get("unit") or row.get("unit_raw"), False
+
+    # Undo value * from_factor / to_factor, with the old table's default of 1
+    raw_unit = row["unit_raw"]
+    from_factor = LEGACY_UNIT_CONVERSIONS.get(raw_unit.strip().lower(), 1)
+    to_factor = LEGACY_UNIT_CONVERSIONS.get(row["unit"].strip().lower(), 1)
+    recovered = [
+        None if value is None else round(value * to_factor / from_factor, 9)
+        for value in stored
+    ]
+    return recovered, raw_unit, True
+
+
+def renormalize_row(row: dict, values: list, unit: str, recovered: bool, converted, convertible: bool) -> dict:
+    updated = dict(row)
+    for col, key in enumerate(VALUE_KEYS):
+        updated[key] = to_optional_float(converted[col])
+    if recovered:
+        updated["raw_values"] = dict(zip(VALUE_KEYS, values))
+    updated.pop("unit_error", None)
+
+    name = row.get("nutrient_name", "")
+    if convertible:
+        updated["unit"] = target_unit(name)
+    else:
+        updated["unit"] = unit
+        updated["unit_error"] = f"Cannot convert '{unit}' for {name}"
+
+    if updated["min_value"] and updated["max_value"]:
+        updated["average_value"] = round((updated["min_value"] + updated["max_value"]) / 2, 6)
+    else:
+        updated["average_value"] = None
+    return updated
+
+
+def renormalize_batch(docs: list) -> tuple:
+    """Returns (update operations, rows converted, unconvertible rows)"""
+    names, units, values, recovered, owners = [], [], [], [], []
+    for doc_idx, doc in enumerate(docs):
+        for row_idx, row in enumerate(doc.get("nutritional_data") or []):
+            row_values, unit, is_recovered = source_values(row)
+            names.append(row.get("nutrient_name", ""))
+            units.append(unit)
+            values.append(row_values)
+            recovered.append(is_recovered)
+            owners.append((doc_idx, row_idx))
+
+    converted, convertible = unit_converter.convert_rows(names, units, values)
+
+    new_rows = [list(doc.get("nutritional_data") or []) for doc in docs]
+    for i, (doc_idx, row_idx) in enumerate(owners):
+        row = new_rows[doc_idx][row_idx]
+        new_rows[doc_idx][row_idx] = renormalize_row(
+            row, values[i], units[i], recovered[i], converted[i], bool(convertible[i])
+        )
+
+    operations = []
+    for doc, rows in zip(docs, new_rows):
+        fields = SimpleNamespace(
+            ingredient_name=doc.get("ingredient_name"),
+            product_code=doc.get("product_code"),
+            lot_number=doc.get("lot_number"),
+            supplier_name=doc.get("supplier_name"),
+        )
+        master_entry = build_master_entry(fields, rows)
+        if rows != doc.get("nutritional_data") or master_entry != doc.get("master_entry"):
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"nutritional_data": rows, "master_entry": master_entry}}
+            ))
+
+    return operations, len(owners), int((~convertible).sum()) if len(owners) else 0
+
+
+async def run(batch_size: int, dry_run: bool):
+    await Database.connect_db()
+    collection = COA.get_motor_collection()
+    started = time.perf_counter()
+    scanned = changed = rows = unconvertible = 0
+
+    cursor = collection.find(
+        {},
+        {"ingredient_name": 1, "product_code": 1, "lot_number": 1, "supplier_name": 1,
+         "nutritional_data": 1, "master_entry": 1}
+    ).batch_size(batch_size)
+
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) < batch_size:
+            continue
+        result = renormalize_batch(batch)
+        changed += await apply(collection, result[0], dry_run)
+        scanned += len(batch)
+        rows += result[1]
+        unconvertible += result[2]
+        print(f"[OK] {scanned} COAs scanned, {changed} changed")
+        batch = []
+
+    if batch:
+        result = renormalize_batch(batch)
+        changed += await apply(collection, result[0], dry_run)
+        scanned += len(batch)
+        rows += result[1]
+        unconvertible += result[2]
+
+    elapsed = time.perf_counter() - started
+    mode = "would change" if dry_run else "changed"
+    print(f"[OK] Done: {scanned} COAs scanned, {changed} {mode}, {rows} nutrient rows, "
+          f"{unconvertible} unconvertible, {elapsed:.1f}s")
+    await Database.close_db()
+
+
+async def apply(collection, operations: list, dry_run: bool) -> int:
+    if not operations:
+        return 0
+    if dry_run:
+        return len(operations)
+    result = await collection.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-normalize units of stored COA nutrient data")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing")
+    args = parser.parse_args()
+    asyncio.run(run(args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import fitz
+import pytest
+from pydantic import ValidationError
+
+from app.utils.image_hash import dedupe_images, hamming, DOCUMENT_HASH_SIZE
+from app.utils.pdf_pages import render_hash_pages, samples_to_image, split_pdf_pages, text_digest
+from config.settings import Settings, settings
+
+
+def template_page(document, lot: str, values: list):
+    page = document.new_page()
+    page.insert_text((72, 60), "ACME INGREDIENTS LTD - CERTIFICATE OF ANALYSIS", fontsize=14)
+    page.insert_text((72, 84), f"Product: Whey Protein Concentrate 80    Lot: {lot}", fontsize=10)
+    for row, (name, value) in enumerate(zip(["Protein", "Fat", "Moisture", "Ash", "Lactose", "Sodium"], values)):
+        page.insert_text((72, 120 + row * 18), f"{name}    g/100g    {value}    Method ISO 8968", fontsize=10)
+    page.insert_text((72, 760), "Approved by Quality Assurance. This certificate is valid without signature.", fontsize=8)
+
+
+def build_pdf(pages: list) -> bytes:
+    document = fitz.open()
+    for lot, values in pages:
+        template_page(document, lot, values)
+    return document.tobytes()
+
+
+@pytest.fixture
+def pdf_pages():
+    content = build_pdf([
+        ("L2301", ["80.1", "6.2", "4.9", "3.1", "5.2", "0.21"]),
+        ("L2302", ["79.4", "6.8", "5.3", "2.9", "4.8", "0.19"]),
+        ("L2301", ["80.1", "6.2", "4.9", "3.1", "5.2", "0.21"]),
+    ])
+    text_pages, raster_pages = split_pdf_pages(fitz.open(stream=content, filetype="pdf"))
+    assert [page for page, _ in text_pages] == [0, 1, 2] and raster_pages == []
+    images = [samples_to_image(page) for page in render_hash_pages(content)]
+    return images, [f"text:{text_digest(text)}" for _, text in text_pages]
+
+
+def test_same_template_pages_are_all_kept(pdf_pages):
+    images, digests = pdf_pages
+    result = dedupe_images(images[:2], DOCUMENT_HASH_SIZE, names=["p1", "p2"], digests=digests[:2])
+    # The pages look alike to the perceptual hash; only their text tells them apart
+    assert hamming(result.hashes[0], result.hashes[1]) <= settings.IMAGE_DEDUP_MAX_DISTANCE
+    assert result.kept == [0, 1]
+    assert result.dropped == []
+
+
+def test_identical_text_pages_are_dropped(pdf_pages):
+    images, digests = pdf_pages
+    result = dedupe_images(images, DOCUMENT_HASH_SIZE, names=["p1", "p2", "p3"], digests=digests)
+    assert result.kept == [0, 1]
+    assert [(d["file"], d["duplicate_of_file"]) for d in result.dropped] == [("p3", "p1")]
+
+
+def test_text_digest_ignores_whitespace_and_case():
+    assert text_digest("Protein | 80.1\n  Fat | 6.2") == text_digest("PROTEIN | 80.1 Fat |   6.2")
+    assert text_digest("Protein | 80.1") != text_digest("Protein | 80.2")
+
+
+@pytest.mark.parametrize("distance", [-1, 8, 12])
+def test_dedup_distance_must_fit_the_hash_bands(distance):
+    with pytest.raises(ValidationError):
+        Settings(IMAGE_DEDUP_MAX_DISTANCE=distance)
@@ -0,0 +1,146 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import json_repair
+from app.utils.json_repair import (
+    SalvagedJSON, merge_reask, recover_model_json, response_template, salvage_json, sections_to_reask,
+    template_sections,
+)
+
+
+PROMPT = """Extract the COA.
+
+JSON STRUCTURE:
+{
+  "ingredient_info": {"ingredient_name": "", "lot_number": ""},
+  "nutritional_data": [{"nutrient_name": "", "actual_value": null, "unit": ""}],
+  "notes": ""
+}"""
+
+CONTINUE_KEYS = {("nutritional_data",): "nutrient_name"}
+
+DOCUMENT = {
+    "ingredient_info": {"ingredient_name": "Whey Protein \"WPC80\"", "lot_number": "L2301"},
+    "nutritional_data": [
+        {"nutrient_name": "Protein", "actual_value": 80.1, "unit": "g"},
+        {"nutrient_name": "Fat", "actual_value": 6.25, "unit": "g"},
+        {"nutrient_name": "Sodium", "actual_value": 210, "unit": "mg"},
+        {"nutrient_name": "Calcium", "actual_value": 480, "unit": "mg"},
+    ],
+    "notes": "Complies",
+}
+
+
+def consistent(partial, full) -> bool:
+    """Everything salvaged is exactly what the full document holds at that place"""
+    if isinstance(partial, dict):
+        return isinstance(full, dict) and all(k in full and consistent(v, full[k]) for k, v in partial.items())
+    if isinstance(partial, list):
+        # Array elements are all-or-nothing
+        return isinstance(full, list) and len(partial) <= len(full) and partial == full[:len(partial)]
+    return partial == full
+
+
+@pytest.fixture
+def sections():
+    return template_sections(response_template(PROMPT))
+
+
+def test_complete_document_is_not_cut():
+    text = "```json\n" + json.dumps(DOCUMENT) + "\n```"
+    assert salvage_json(text) == SalvagedJSON(DOCUMENT, None)
+
+
+def test_every_truncation_keeps_only_finished_values():
+    text = json.dumps(DOCUMENT, indent=2)
+    for end in range(text.index("{") + 1, len(text)):
+        salvaged = salvage_json(text[:end])
+        assert salvaged.cut_path is not None, end
+        assert isinstance(salvaged.data, dict), end
+        assert consistent(salvaged.data, DOCUMENT), (end, salvaged.data)
+
+
+def test_cut_number_is_dropped():
+    salvaged = salvage_json('{"a": 1, "b": 4.5')
+    assert salvaged.data == {"a": 1}
+    assert salvaged.cut_path == ("b",)
+
+
+def test_lenient_syntax():
+    salvaged = salvage_json('{"a": True, "b": None, "c": [1, 2,], "d": "two\nlines",}')
+    assert salvaged == SalvagedJSON({"a": True, "b": None, "c": [1, 2], "d": "two\nlines"}, None)
+
+
+def test_sections_to_reask(sections):
+    text = json.dumps(DOCUMENT)
+    cut = salvage_json(text[:text.index('"Sodium"') + 3])
+    assert cut.cut_path[:1] == ("nutritional_data",)
+    # The cut section, and the later one that never arrived
+    assert sections_to_reask(cut, sections) == [("nutritional_data",), ("notes",)]
+    assert sections_to_reask(salvage_json(text), sections) == []
+
+
+class FakeExecutor:
+    def __init__(self, text: str):
+        self.text = text
+        self.contents = None
+
+    async def generate_content(self, model, contents, report=None):
+        self.contents = contents
+        usage = SimpleNamespace(prompt_token_count=120, candidates_token_count=30)
+        return SimpleNamespace(text=self.text, usage_metadata=usage)
+
+
+def recover(monkeypatch, text: str, followup: str, sections):
+    executor = FakeExecutor(followup)
+    monkeypatch.setattr(json_repair, "gemini_executor", executor)
+    result = asyncio.run(recover_model_json(
+        text, PROMPT, ["<image>"], "model", sections, CONTINUE_KEYS
+    ))
+    return result, executor
+
+
+def test_truncated_output_is_completed_by_one_followup(monkeypatch, sections):
+    text = json.dumps(DOCUMENT)
+    truncated = text[:text.index('"Sodium"') + 3]
+    followup = json.dumps({
+        # The model repeats one entry it already returned
+        "nutritional_data": DOCUMENT["nutritional_data"][1:],
+        "notes": "Complies",
+    })
+    result, executor = recover(monkeypatch, truncated, followup, sections)
+
+    assert result.data == DOCUMENT
+    assert result.reasked == ["nutritional_data", "notes"]
+    assert result.unresolved == []
+    assert (result.prompt_tokens, result.output_tokens) == (120, 30)
+    # The follow-up keeps the inputs and names the entries already returned
+    assert executor.contents[1:] == ["<image>"]
+    assert '["Protein","Fat"]' in executor.contents[0]
+
+
+def test_cut_followup_is_reported_unresolved(monkeypatch, sections):
+    text = json.dumps(DOCUMENT)
+    truncated = text[:text.index('"Sodium"') + 3]
+    followup = json.dumps({"nutritional_data": DOCUMENT["nutritional_data"][2:]})[:-30]
+    result, _ = recover(monkeypatch, truncated, followup, sections)
+
+    assert result.data["nutritional_data"] == DOCUMENT["nutritional_data"][:3]
+    assert result.unresolved == ["nutritional_data", "notes"]
+
+
+def test_no_json_at_all(monkeypatch, sections):
+    result, executor = recover(monkeypatch, "Sorry, I cannot read this document.", "{}", sections)
+    assert result is None
+    assert executor.contents is None
+
+
+def test_merge_keeps_salvaged_value_over_a_cut_replacement():
+    data = {"ingredient_info": {"ingredient_name": "Whey"}}
+    followup = salvage_json('{"ingredient_info": {"ingredient_name": "Wh')
+    unresolved = merge_reask(data, followup, [("ingredient_info",)], {})
+    assert data == {"ingredient_info": {"ingredient_name": "Whey"}}
+    assert unresolved == ["ingredient_info"]
@@ -0,0 +1,83 @@
+import json
+import random
+
+import pytest
+
+from app.utils.json_stream import IncrementalJSONParser
+
+
+DOCUMENT = {
+    "product_name": "Oat \"Barista\" Drink\n1 L",
+    "brand": "Café \\ Co",
+    "net_weight": 1000,
+    "organic": True,
+    "discontinued": False,
+    "barcode": None,
+    "serving": {"size": 250.5, "unit": "ml", "per_pack": 4},
+    "nutrients": [
+        {"name": "Energy", "values": [46, -1.5e2], "unit": "kcal"},
+        {"name": "Fat, total", "values": [], "unit": "g"},
+        [1, [2, {"deep": "x"}]],
+    ],
+    "tags": [],
+    "notes": "",
+}
+
+
+def scalars(value, path=()):
+    """(path, value) of every scalar in document order, as the parser reports them"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from scalars(item, path + (key,))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            yield from scalars(item, path + (index,))
+    else:
+        yield path, value
+
+
+def feed_chunks(text: str, sizes) -> list:
+    parser = IncrementalJSONParser()
+    completed, start = [], 0
+    for size in sizes:
+        completed.extend(parser.feed(text[start:start + size]))
+        start += size
+    completed.extend(parser.feed(text[start:]))
+    assert parser.done
+    return completed
+
+
+@pytest.fixture
+def text():
+    return "Here is the JSON:\n```json\n" + json.dumps(DOCUMENT, indent=2) + "\n```\ntrailing prose {\"ignored\": 1}"
+
+
+def test_whole_document(text):
+    assert feed_chunks(text, []) == list(scalars(DOCUMENT))
+
+
+def test_one_character_at_a_time(text):
+    assert feed_chunks(text, [1] * len(text)) == list(scalars(DOCUMENT))
+
+
+def test_every_two_way_split(text):
+    expected = list(scalars(DOCUMENT))
+    for split in range(len(text)):
+        assert feed_chunks(text, [split]) == expected, split
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunk_sizes(text, seed):
+    rng = random.Random(seed)
+    sizes = [rng.randint(1, 12) for _ in range(len(text))]
+    assert feed_chunks(text, sizes) == list(scalars(DOCUMENT))
+
+
+def test_values_are_reported_as_soon_as_they_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"product_name": "Oat Dri') == []
+    assert parser.feed('nk", "net_weight": 10') == [(("product_name",), "Oat Drink")]
+    # A number is only complete once a delimiter follows it
+    assert parser.feed("00") == []
+    assert parser.feed(", ") == [(("net_weight",), 1000)]
+    assert not parser.done
@@ -0,0 +1,71 @@
+import pytest
+
+from app.utils.nomenclature import FuzzyIndex, NomenclatureEngine
+from config.settings import settings
+
+
+@pytest.fixture
+def engine():
+    return NomenclatureEngine(settings.NOMENCLATURE_REFRESH_SECONDS, settings.NOMENCLATURE_FUZZY_THRESHOLD)
+
+
+@pytest.mark.parametrize("raw_name", ["Energy (kJ per 100 g)", "Energy (in kJ)", "Energy (kJ)", "ENERGY (KJ)"])
+def test_product_energy_keeps_kj(engine, raw_name):
+    assert engine.standardize(raw_name, "product") == "Energy (kJ)"
+
+
+@pytest.mark.parametrize("raw_name", ["Energy", "Energy (kcal)", "Energy (kcal per serve)", "Calories"])
+def test_product_energy_defaults_to_kcal(engine, raw_name):
+    assert engine.standardize(raw_name, "product") == "Energy (kcal)"
+
+
+def test_coa_energy_has_no_unit(engine):
+    assert engine.standardize("Energy (kJ per 100 g)", "coa") == "Energy"
+
+
+@pytest.mark.parametrize("raw_name, wrong_name", [
+    ("Unsaturated Fat", "Saturated Fat"),
+    ("Unsaturated fatty acids", "Saturated Fat"),
+    ("Non saturated fat", "Saturated Fat"),
+    ("Omega 9", "Omega 3 Fatty Acid"),
+    ("Omega-9 Fatty Acids", "Omega 3 Fatty Acid"),
+    ("Iodide", "Iodine"),
+    ("Chlorine", "Chloride"),
+    ("Vitamin K2", "Vitamin K"),
+    ("Vitamin K2", "Vitamin B2"),
+])
+@pytest.mark.parametrize("profile", ["coa", "product"])
+def test_different_nutrients_are_not_fuzzy_mapped(engine, raw_name, wrong_name, profile):
+    name, confidence, method = engine.resolve(raw_name, profile)
+    assert method == "review"
+    assert confidence == 0.0
+    assert name.lower() == raw_name.lower()
+    assert (profile, raw_name) in engine.review
+
+
+@pytest.mark.parametrize("raw_name, expected", [
+    ("Protien", "Protein"),
+    ("Vit. B-12", "Vitamin B12"),
+    ("Cholestrol", "Cholesterol"),
+    ("Dietry Fibre", "Dietary Fiber"),
+    ("Saturatd Fat", "Saturated Fat"),
+    ("Omega-3 Fatty Acids", "Omega 3 Fatty Acid"),
+    ("Phosphorous", "Phosphorus"),
+])
+def test_typos_are_fuzzy_mapped(engine, raw_name, expected):
+    name, confidence, method = engine.resolve(raw_name, "coa")
+    assert (name, method) == (expected, "fuzzy")
+    assert confidence >= settings.NOMENCLATURE_FUZZY_THRESHOLD
+
+
+def test_unknown_vitamin_letter_goes_to_review(engine):
+    # "vitaminf" is one letter from Vitamin A, D, E and K alike
+    assert engine.resolve("Vitamin F", "coa")[2] == "review"
+    assert engine.pending_review()[0]["raw_name"] == "Vitamin F"
+
+
+def test_match_needs_margin_over_runner_up():
+    index = FuzzyIndex({"maltodextrin": "Maltodextrin", "maltodextran": "Dextran"}, margin=0.05)
+    match = index.match("maltodextrn", 0.8)
+    assert match is not None and not match.accepted
+    assert FuzzyIndex({"maltodextrin": "Maltodextrin"}, margin=0.05).match("maltodextrn", 0.8).accepted
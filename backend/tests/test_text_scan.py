@@ -0,0 +1,101 @@
+import random
+import re
+from datetime import datetime
+
+import pytest
+
+from app.utils.text_scan import detect_packing_format, scan_label_text
+
+
+# The separate regex passes the scanner replaced, kept as the reference
+
+def old_packing_format(text: str) -> str:
+    text_lower = text.lower()
+    formats = {
+        "sachet": ["sachet", "sachets"],
+        "bottle": ["bottle", "bottles"],
+        "pouch": ["pouch", "pouches"],
+        "jar": ["jar", "jars"],
+        "can": ["can", "cans", "tin"],
+        "tetra pack": ["tetra pack", "tetra pak"],
+        "carton": ["carton", "cartons"],
+        "box": ["box", "boxes"],
+        "pack": ["pack", "packet"],
+        "tub": ["tub", "tubs", "container"],
+    }
+    for format_name, keywords in formats.items():
+        for keyword in keywords:
+            if keyword in text_lower:
+                return format_name
+    return "not specified"
+
+
+def old_dates(text: str) -> list:
+    valid_dates = []
+    for ds in re.findall(r"\b\d{2}/\d{2}/\d{2,4}\b", text):
+        try:
+            if len(ds.split("/")[-1]) == 4:
+                valid_dates.append(datetime.strptime(ds, "%d/%m/%Y"))
+            else:
+                valid_dates.append(datetime.strptime(ds, "%d/%m/%y"))
+        except ValueError:
+            continue
+    return valid_dates
+
+
+def old_fssai(text: str) -> set:
+    return set(re.findall(r"\b\d{14}\b", text))
+
+
+def assert_same_as_old(text: str):
+    scan = scan_label_text(text)
+    assert scan.dates == old_dates(text), text
+    assert sorted(scan.fssai_numbers) == sorted(old_fssai(text)), text
+    assert len(scan.fssai_numbers) == len(set(scan.fssai_numbers))
+    assert scan.packing_format == old_packing_format(text), text
+
+
+@pytest.mark.parametrize("text", [
+    '{"dates": {"manufacturing_date": "15/03/2023", "expiry_date": "14/09/24"}}',
+    "mfg 31/02/2023 exp 01/13/2024 best before 28/02/2025",
+    "Lic. No. 10012345678901, 10012345678901 and 20012345678902",
+    "too long 100123456789012 too short 1001234567890",
+    "glued a10012345678901 _10012345678901 10012345678901b 12/05/2023x x12/05/2023",
+    "12/05/20231 112/05/2023 12/05/202 12/05/2",
+    "date/fssai mix 12/05/2310012345678901 10012345678901/05/23",
+    "unicode digits ١٢/٠٥/٢٠٢٣ and é12/05/2023 and 12/05/2023é",
+    "packed in a container inside a carton",
+    "Tetra Pak 200 ml, not a tin",
+    "no numbers at all",
+    "",
+])
+def test_known_cases_match_old_regexes(text):
+    assert_same_as_old(text)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_text_matches_old_regexes(seed):
+    rng = random.Random(seed)
+    pieces = ["0", "1", "2", "3", "9", "/", " ", "a", "_", "é", "٣", "\n", "12/05/", "2023", "1001234567890",
+              "box", "tin", "jar"]
+    for _ in range(2000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+        assert_same_as_old(text)
+
+
+def test_dates_and_fssai_in_order():
+    scan = scan_label_text("FSSAI 10012345678901 mfg 01/02/2023 FSSAI 20012345678902 exp 01/08/2024")
+    assert scan.manufacturing_date == "01/02/2023"
+    assert scan.expiry_date == "01/08/2024"
+    assert scan.fssai_numbers == ["10012345678901", "20012345678902"]
+
+
+def test_non_string_input():
+    assert scan_label_text(None) == scan_label_text("")
+    assert scan_label_text({"a": "01/02/2023"}).dates == [datetime(2023, 2, 1)]
+
+
+def test_packing_keywords_in_priority_order():
+    assert detect_packing_format("tin can in a box") == "can"
+    assert detect_packing_format("sachets in a box") == "sachet"
+    assert detect_packing_format("nothing here") == "not specified"
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from app.utils.units import UnitConverter, canonical_unit
+
+
+@pytest.fixture
+def converter():
+    return UnitConverter()
+
+
+@pytest.mark.parametrize("nutrient, unit, factor", [
+    ("Vitamin A", "IU", 0.3),       # mcg retinol per IU
+    ("Vitamin D", "IU", 0.025),     # mcg cholecalciferol per IU
+    ("Vitamin D3", "I.U.", 0.025),
+    ("Vitamin E", "iu", 0.67),      # mg d-alpha-tocopherol per IU
+])
+def test_iu_factor_depends_on_the_nutrient(converter, nutrient, unit, factor):
+    assert converter.factor(nutrient, unit) == pytest.approx(factor)
+
+
+@pytest.mark.parametrize("nutrient, unit, factor", [
+    ("Protein", "%", 1.0),
+    ("Protein", "g/100g", 1.0),
+    ("Sodium", "g", 1000.0),
+    ("Iron", "ppm", 0.1),           # mg/kg is 0.1 mg per 100 g
+    ("Iron", "mg/kg", 0.1),
+    ("Selenium", "µg", 1.0),
+    ("Vitamin B12", "ug per 100 g", 1.0),
+    ("Energy", "kJ", 0.239006),
+    ("Energy", "kcal/100g", 1.0),
+])
+def test_mass_and_energy_factors(converter, nutrient, unit, factor):
+    assert converter.factor(nutrient, unit) == pytest.approx(factor)
+
+
+@pytest.mark.parametrize("nutrient, unit", [
+    ("Vitamin C", "IU"),            # no IU definition
+    ("Calcium", "IU"),
+    ("Iron", "kcal"),               # energy for a mass nutrient
+    ("Energy", "mg"),
+    ("Protein", "CFU/g"),
+    ("Protein", None),
+    ("Protein", ""),
+])
+def test_unconvertible_units(converter, nutrient, unit):
+    assert converter.factor(nutrient, unit) is None
+
+
+def test_canonical_unit_keeps_a_bare_basis():
+    assert canonical_unit(" MG/100g ") == "mg"
+    assert canonical_unit("/100g") == "/100g"
+
+
+def test_convert_rows_keeps_unconvertible_rows(converter):
+    converted, convertible = converter.convert_rows(
+        ["Vitamin D", "Vitamin C", "Sodium"],
+        ["IU", "IU", "g"],
+        [[400.0, 800.0, np.nan], [60.0, np.nan, 75.0], [0.5, 0.7, 0.6]],
+    )
+    assert convertible.tolist() == [True, False, True]
+    np.testing.assert_allclose(converted[0], [10.0, 20.0, np.nan])
+    np.testing.assert_allclose(converted[1], [60.0, np.nan, 75.0])
+    np.testing.assert_allclose(converted[2], [500.0, 700.0, 600.0])
+
+
+def test_convert_rows_empty(converter):
+    converted, convertible = converter.convert_rows([], [], [])
+    assert converted.size == 0 and convertible.size == 0
+
+
+@pytest.mark.parametrize("row, values, unit", [
+    # Old table: ppm was unknown (factor 1), so 50 ppm was stored as 50 g = 50000 mg
+    ({"unit": "mg", "unit_raw": "ppm", "actual_value": 50000.0}, 50.0, "ppm"),
+    # IU was 0.3 in a table of grams, so 400 IU became 120 g = 1.2e8 mcg
+    ({"unit": "mcg", "unit_raw": "IU", "actual_value": 1.2e8}, 400.0, "IU"),
+    ({"unit": "g", "unit_raw": "mg", "actual_value": 0.5}, 500.0, "mg"),
+])
+def test_legacy_rows_are_recovered_in_their_printed_unit(row, values, unit):
+    from scripts.renormalize_coa_units import source_values
+    recovered, source_unit, is_recovered = source_values(row)
+    assert is_recovered and source_unit == unit
+    assert recovered[2] == pytest.approx(values)
+
+
+@pytest.mark.parametrize("row", [
+    {"unit": "mg", "unit_raw": "ppm", "actual_value": 5.0, "raw_values": {"actual_value": 50.0}},
+    {"unit": "g", "unit_raw": "G", "actual_value": 12.0},
+])
+def test_current_rows_are_not_recovered(row):
+    from scripts.renormalize_coa_units import source_values
+    assert source_values(row) == ([None, None, row["actual_value"]], row["unit"], False)
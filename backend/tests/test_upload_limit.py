@@ -0,0 +1,76 @@
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.middleware.upload_limit import UploadLimitMiddleware
+
+
+MAX_BYTES = 64 * 1024
+BOUNDARY = "testboundary"
+
+
+@pytest.fixture
+def handled():
+    return []
+
+
+@pytest.fixture
+def client(handled):
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_BYTES)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        handled.append(file.filename)
+        return {"size": len(await file.read())}
+
+    @app.post("/echo")
+    async def echo(body: dict):
+        handled.append("echo")
+        return body
+
+    return TestClient(app)
+
+
+def multipart_body(size: int) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="label.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + b"\xff" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+HEADERS = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+def test_upload_under_the_cap_reaches_the_handler(client, handled):
+    response = client.post("/upload", content=multipart_body(1024), headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json() == {"size": 1024}
+    assert handled == ["label.jpg"]
+
+
+def test_declared_oversize_body_is_refused_before_the_handler(client, handled):
+    response = client.post("/upload", content=multipart_body(MAX_BYTES * 2), headers=HEADERS)
+    assert response.status_code == 413
+    assert "Upload too large" in response.json()["detail"]
+    assert handled == []
+
+
+def test_streamed_oversize_body_is_cut_off(client, handled):
+    body = multipart_body(MAX_BYTES * 4)
+
+    def stream():
+        # No Content-Length: the cap has to be enforced on the bytes as they arrive
+        for start in range(0, len(body), 8192):
+            yield body[start:start + 8192]
+
+    response = client.post("/upload", content=stream(), headers=HEADERS)
+    assert response.status_code == 413
+    assert handled == []
+
+
+def test_other_requests_are_not_limited(client, handled):
+    response = client.post("/echo", json={"text": "x" * (MAX_BYTES * 2)})
+    assert response.status_code == 200
+    assert handled == ["echo"]
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react'
 import { X, ChevronLeft, ChevronRight } from 'lucide-react'
+import { resolveImageUrl } from '../../services/api'
 
 const ProductPreviewModal = ({ product, isOpen, onClose }) => {
   const [currentImageIndex, setCurrentImageIndex] = useState(0)
@@ -20,7 +21,10 @@ const ProductPreviewModal = ({ product, isOpen, onClose }) => {
 
   // Try to get images from rawData first, then from product.images, then use mock
   const productImages = product.rawData?.images || product.images || []
-  const images = productImages.length > 0 ? productImages : mockImages
+  // Medium variant for the main view, thumb for the strip (originals when no variants exist)
+  const variants = product.rawData?.image_variants
+  const images = productImages.length > 0 ? (variants?.medium || productImages).map(resolveImageUrl) : mockImages
+  const thumbnails = productImages.length > 0 ? (variants?.thumb || productImages).map(resolveImageUrl) : mockImages
 
   // Debug logging
   console.log('ProductPreviewModal - Product:', product.productName)
@@ -96,7 +100,7 @@ const ProductPreviewModal = ({ product, isOpen, onClose }) => {
         {/* Thumbnails - Scrollable for more than 8 images */}
         <div className="overflow-x-auto scrollbar-hide">
           <div className="flex items-center justify-center gap-2 min-w-full px-4">
-            {images.map((image, index) => (
+            {thumbnails.map((thumbnail, index) => (
               <button
                 key={index}
                 onClick={() => handleThumbnailClick(index)}
@@ -107,7 +111,7 @@ const ProductPreviewModal = ({ product, isOpen, onClose }) => {
                 }`}
               >
                 <img
-                  src={image}
+                  src={thumbnail}
                   alt={`Thumbnail ${index + 1}`}
                   className="w-full h-full object-cover"
                 />
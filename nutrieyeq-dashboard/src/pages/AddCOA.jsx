@@ -233,6 +233,7 @@ const AddCOA = () => {
         certifications: [],
         additional_notes: [],
         document_images: documentImages,
+        extraction_cost: extractionCost,
         status: 'active'
       }
       
@@ -468,6 +468,9 @@ const AddProduct = () => {
         // Images (store base64)
         images: images.filter(img => img.dataUrl).map(img => img.dataUrl),
 
+        // Extraction cost, including model retries and hedges
+        extraction_cost: extractionCost,
+
         // Status - always published by default
         status: 'published'
       }
@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react'
 import { useNavigate } from 'react-router-dom'
 import Layout from '../components/Layout/Layout'
 import { Edit, Trash2, FileText, Loader2, RefreshCw, Save, X, AlertCircle, Check, Plus, Eye, Download, ZoomIn, ZoomOut, ChevronLeft, ChevronRight, Image } from 'lucide-react'
-import { coaService } from '../services/api'
+import { coaService, resolveImageUrl, isPdfSource } from '../services/api'
 
 const COA = () => {
   const navigate = useNavigate()
@@ -71,7 +71,7 @@ const COA = () => {
       setPreviewZoom(1)
       const fullCOA = await coaService.getCOA(coa.id)
       if (fullCOA && fullCOA.document_images && fullCOA.document_images.length > 0) {
-        setPreviewImages(fullCOA.document_images)
+        setPreviewImages(fullCOA.document_images.map(resolveImageUrl))
       } else {
         setPreviewImages([])
       }
@@ -88,9 +88,9 @@ const COA = () => {
     const dataUrl = previewImages[previewIndex]
     const a = document.createElement('a')
     a.href = dataUrl
-    // Detect extension from data URL
+    // Detect extension from data URL, or from the blob reference's extension
     const match = dataUrl.match(/^data:([^;]+)/)
-    const mime = match ? match[1] : 'image/png'
+    const mime = match ? match[1] : (dataUrl.match(/\.(\w+)$/)?.[1] || 'image/png')
     const ext = mime.includes('pdf') ? 'pdf' : mime.includes('png') ? 'png' : 'jpg'
     a.download = `COA_${previewIngredientName.replace(/\s+/g, '_')}_page${previewIndex + 1}.${ext}`
     a.click()
@@ -542,7 +542,7 @@ const COA = () => {
               </div>
               <div className="flex items-center gap-2">
                 {/* Zoom Controls — only for images, PDFs have built-in zoom */}
-                {previewImages.length > 0 && !previewImages[previewIndex]?.startsWith('data:application/pdf') && (
+                {previewImages.length > 0 && !isPdfSource(previewImages[previewIndex]) && (
                   <div className="flex items-center gap-1 bg-[#f1f5f9] rounded-md px-2 py-1">
                     <button
                       onClick={() => setPreviewZoom(z => Math.max(0.25, z - 0.25))}
@@ -601,7 +601,7 @@ const COA = () => {
                   <FileText className="w-12 h-12 text-[#e1e7ef] mx-auto mb-3" />
                   <p className="text-sm font-ibm-plex text-[#65758b]">No document images available for this COA.</p>
                 </div>
-              ) : previewImages[previewIndex]?.startsWith('data:application/pdf') ? (
+              ) : isPdfSource(previewImages[previewIndex]) ? (
                 <iframe
                   src={previewImages[previewIndex]}
                   title={`COA Document Page ${previewIndex + 1}`}
@@ -5,7 +5,7 @@ import Layout from '../components/Layout/Layout'
 import NoPermissionContent from '../components/NoPermissionContent'
 import { Search, X, Table as TableIcon, BarChart3, Download, ChevronLeft, ChevronRight, Menu, Loader2, Filter, ChevronDown } from 'lucide-react'
 import { RadarChart, PolarGrid, PolarAngleAxis, Radar, ResponsiveContainer, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend } from 'recharts'
-import authService, { productService } from '../services/api'
+import authService, { productService, imageToDataUrl } from '../services/api'
 
 const Compare = () => {
   const hasPermission = authService.hasPermission('run_comparisons')
@@ -120,8 +120,9 @@ const Compare = () => {
       fssai = p.fssai_licenses[0]
     }
 
-    // Get first image
-    const firstImage = (Array.isArray(p.images) && p.images.length > 0) ? p.images[0] : null
+    // Get first image (thumbnail is plenty for the export cell)
+    const firstImage = p.image_variants?.thumb?.[0]
+      || ((Array.isArray(p.images) && p.images.length > 0) ? p.images[0] : null)
 
     return {
       id: p.id,
@@ -284,11 +285,12 @@ const Compare = () => {
 
     // Embed images into the image row
     if (imageRowNumber) {
-      selectedProducts.forEach((product, colIndex) => {
+      for (const [colIndex, product] of selectedProducts.entries()) {
         if (product.firstImage) {
           try {
-            // Extract base64 data and extension from data URL
-            const match = product.firstImage.match(/^data:image\/(png|jpeg|jpg|gif);base64,(.+)$/)
+            // Extract base64 data and extension from data URL (saved images are fetched first)
+            const dataUrl = await imageToDataUrl(product.firstImage)
+            const match = dataUrl.match(/^data:image\/(png|jpeg|jpg|gif);base64,(.+)$/)
             if (match) {
               const ext = match[1] === 'jpg' ? 'jpeg' : match[1]
               const base64Data = match[2]
@@ -302,7 +304,7 @@ const Compare = () => {
             console.warn('Could not embed image for', product.productName, e)
           }
         }
-      })
+      }
     }
 
     // ---- Sheet 2: Nutrition ----
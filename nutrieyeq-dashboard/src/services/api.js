@@ -1,4 +1,26 @@
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api'
+const API_ORIGIN = API_BASE_URL.replace(/\/api\/?$/, '')
+
+// Saved images are blob references ("/api/images/<sha256>.<ext>") served by the backend;
+// fresh uploads and records saved before the blob store are base64 data URLs
+export const resolveImageUrl = (src) =>
+  typeof src === 'string' && src.startsWith('/api/images/') ? `${API_ORIGIN}${src}` : src
+
+export const isPdfSource = (src) =>
+  typeof src === 'string' && (src.startsWith('data:application/pdf') || /\/api\/images\/[0-9a-f]+\.pdf$/.test(src))
+
+export async function imageToDataUrl(src) {
+  if (typeof src !== 'string' || src.startsWith('data:')) return src
+  const response = await fetch(resolveImageUrl(src))
+  if (!response.ok) throw new Error(`Failed to load image: ${response.status}`)
+  const blob = await response.blob()
+  return new Promise((resolve, reject) => {
+    const reader = new FileReader()
+    reader.onload = () => resolve(reader.result)
+    reader.onerror = () => reject(reader.error)
+    reader.readAsDataURL(blob)
+  })
+}
 
 const getToken = () => localStorage.getItem('access_token')
 